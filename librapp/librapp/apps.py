@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class LibrappConfig(AppConfig):
+    name = 'librapp'
+
+    def ready(self):
+        # connect signal receivers
+        from librapp import signals
@@ -0,0 +1,54 @@
+'''
+Accrues fines for overdue loans, see librapp/lib/fine_accrual.py
+GET /books/loans/ and /books/fines/ only read fines, run this periodically,
+eg: from cron, or with --loop.
+
+Usage Option 1:
+    $ cd librapp/bin
+    $ python accrue_fines.py
+    $ python accrue_fines.py --loop 3600   # run every hour
+
+Usage Option 2:
+    $ python manage.py shell
+    >>> from librapp.bin.accrue_fines import accrue_fines
+    >>> accrue_fines()
+'''
+
+import argparse
+import django
+import os
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+# librapp settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+django.setup()
+
+# do this after settings
+from librapp.lib.fine_accrual import FineAccrual
+
+
+def accrue_fines(accrual=None):
+    start = time.time()
+    run = (accrual or FineAccrual()).run()
+    print 'Fines as of {0}: {1} loans scanned, {2} created, {3} updated in {4:.2f}s'.format(
+            run.as_of.isoformat(), run.loans_scanned, run.fines_created,
+            run.fines_updated, time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Accrue fines for overdue loans')
+    parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+            help='run every SECONDS, until stopped')
+    args = parser.parse_args()
+    # one accrual for all runs, its OverdueTracker is refreshed, not rebuilt
+    accrual = FineAccrual()
+    while True:
+        accrue_fines(accrual)
+        if not args.loop:
+            break
+        time.sleep(args.loop)
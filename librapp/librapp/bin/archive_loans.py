@@ -0,0 +1,67 @@
+'''
+Moves checked in loans with paid or no fines to the archive, see librapp/lib/loan_archive.py
+Archived loans are listed by GET /books/loans/history/, run this periodically after
+accrue_fines.py, eg: from cron, or with --loop.
+Safe to stop at any time, the next run goes on from there.
+
+Usage Option 1:
+    $ cd librapp/bin
+    $ python archive_loans.py
+    $ python archive_loans.py --batch-size 200 --pause 0.5   # gentler, during business hours
+    $ python archive_loans.py --max-batches 100 --loop 600  # at most 100 batches every 10 minutes
+
+Usage Option 2:
+    $ python manage.py shell
+    >>> from librapp.bin.archive_loans import archive_loans
+    >>> archive_loans()
+'''
+
+import argparse
+import django
+import os
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+# librapp settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+django.setup()
+
+# do this after settings
+from librapp.lib.loan_archive import LoanArchive
+
+
+def archive_loans(batch_size=None, pause=None, min_age_days=None, max_batches=None):
+    start = time.time()
+    archive = LoanArchive(batch_size=batch_size, pause=pause, min_age_days=min_age_days)
+    if archive.get_archive_before() is None:
+        print 'Fines were never accrued, run accrue_fines.py first'
+        return
+    result = archive.run(max_batches=max_batches)
+    print 'Archived {0} loans, {1} fines in {2} batches in {3:.2f}s'.format(
+            result['loans'], result['fines'], result['batches'], time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Archive checked in loans with paid fines')
+    parser.add_argument('--batch-size', type=int, default=None,
+            help='loans per transaction, default: {0}'.format(LoanArchive.BATCH_SIZE))
+    parser.add_argument('--pause', type=float, default=None, metavar='SECONDS',
+            help='sleep between batches, default: {0}'.format(LoanArchive.PAUSE))
+    parser.add_argument('--min-age-days', type=int, default=None,
+            help='archive loans checked in at least this many days ago, default: {0}'.format(
+                LoanArchive.MIN_AGE_DAYS))
+    parser.add_argument('--max-batches', type=int, default=None,
+            help='stop after this many batches')
+    parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+            help='run every SECONDS, until stopped')
+    args = parser.parse_args()
+    while True:
+        archive_loans(batch_size=args.batch_size, pause=args.pause,
+                      min_age_days=args.min_age_days, max_batches=args.max_batches)
+        if not args.loop:
+            break
+        time.sleep(args.loop)
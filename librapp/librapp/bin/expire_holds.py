@@ -0,0 +1,49 @@
+'''
+Expires ready holds not picked up in time, their copies go to the next hold or back
+to the shelf, see librapp/lib/hold_queue.py. Run this periodically, eg: from cron, or with --loop.
+
+Usage Option 1:
+    $ cd librapp/bin
+    $ python expire_holds.py
+    $ python expire_holds.py --loop 600   # run every 10 minutes
+
+Usage Option 2:
+    $ python manage.py shell
+    >>> from librapp.bin.expire_holds import expire_holds
+    >>> expire_holds()
+'''
+
+import argparse
+import django
+import os
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+# librapp settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+django.setup()
+
+# do this after settings
+from librapp.lib.hold_queue import HoldQueue
+
+
+def expire_holds():
+    start = time.time()
+    count = HoldQueue().expire()
+    print 'Expired {0} holds in {1:.2f}s'.format(count, time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Expire ready holds not picked up in time')
+    parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+            help='run every SECONDS, until stopped')
+    args = parser.parse_args()
+    while True:
+        expire_holds()
+        if not args.loop:
+            break
+        time.sleep(args.loop)
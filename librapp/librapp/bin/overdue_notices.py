@@ -0,0 +1,64 @@
+'''
+Writes overdue notices, one JSON line per loan that became overdue since the last run,
+see librapp/lib/overdue_notices.py. Run this periodically, eg: from cron, or with --loop,
+and send the notices from its output.
+
+Usage Option 1:
+    $ cd librapp/bin
+    $ python overdue_notices.py                             # to stdout
+    $ python overdue_notices.py --output notices.ndjson     # appends to file
+    $ python overdue_notices.py --output notices.ndjson --loop 3600
+
+Usage Option 2:
+    $ python manage.py shell
+    >>> from librapp.bin.overdue_notices import overdue_notices
+    >>> overdue_notices()
+'''
+
+import argparse
+import django
+import json
+import os
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+# librapp settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+django.setup()
+
+# do this after settings
+from rest_framework.utils.encoders import JSONEncoder
+from librapp.lib.overdue_notices import OverdueNotices
+
+
+def overdue_notices(notices=None, output=None):
+    start = time.time()
+    out = open(output, 'a') if output else sys.stdout
+    try:
+        write = lambda notice: out.write(json.dumps(notice, cls=JSONEncoder) + '\n')
+        run = (notices or OverdueNotices()).run(write=write)
+    finally:
+        if output:
+            out.close()
+    sys.stderr.write('Overdue notices as of {0}: {1} in {2:.2f}s\n'.format(
+            run.as_of.isoformat(), run.notices, time.time() - start))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write notices for loans that became overdue')
+    parser.add_argument('--output', default=None, metavar='FILE',
+            help='append notices to FILE, default: stdout')
+    parser.add_argument('--loop', type=int, default=0, metavar='SECONDS',
+            help='run every SECONDS, until stopped')
+    args = parser.parse_args()
+    # one OverdueNotices for all runs, its OverdueTracker is refreshed, not rebuilt
+    notices = OverdueNotices()
+    while True:
+        overdue_notices(notices, args.output)
+        if not args.loop:
+            break
+        time.sleep(args.loop)
@@ -86,6 +86,7 @@ def populate_book():
         try:
             book_row = {
                 'isbn': datai[0],
+                'isbn13': datai[1],
                 'title': datai[2],
                 'cover': datai[4],
                 }
@@ -63,7 +63,7 @@ def populate_book_loan(book_count=300):
 def populate_data():
     try:
         raise Exception('Turn this exception off to run')
-        # BookLoan, fines will be auto calculated
+        # BookLoan, fines are calculated by accrue_fines.py
         print 'Populating Books Loans'
         populate_book_loan()
         print 'Done'
@@ -0,0 +1,84 @@
+'''
+Projects fines over the loan history under a fine policy, next to the current policy
+from settings.FINE_POLICY, see librapp/lib/fine_projection.py. Needs numpy.
+Nothing is written, live fines change only with settings.FINE_POLICY.
+
+Usage Option 1:
+    $ cd librapp/bin
+    $ python project_fines.py --daily-fine 0.50 --max-fine 10
+    $ python project_fines.py --grace-days 2 --branch-rate 3=0.10 --branch-rate 4=0.10
+    $ python project_fines.py --daily-fine 0.50 --active-only   # BookLoan only, no ArchivedLoan
+
+Usage Option 2:
+    $ python manage.py shell
+    >>> from librapp.bin.project_fines import project_fines
+    >>> from librapp.lib.fine_policy import FinePolicy
+    >>> project_fines(FinePolicy(daily_fine='0.50', max_fine='10'))
+'''
+
+import argparse
+import django
+import os
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+# librapp settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+django.setup()
+
+# do this after settings
+from django.utils import timezone
+from librapp.lib.fine_policy import FinePolicy
+from librapp.lib.fine_projection import FineProjection, LoanArrays
+
+
+def project_fines(policy, archived=True):
+    start = time.time()
+    loans = LoanArrays.load(archived=archived)
+    print 'Read {0} loans in {1:.2f}s'.format(len(loans), time.time() - start)
+
+    now = timezone.now()
+    results = []
+    for name, pol in [('current', FinePolicy.from_settings()), ('proposed', policy)]:
+        start = time.time()
+        results.append(FineProjection(pol).project(loans, now))
+        print '{0:<9} {1!r}, {2:.3f}s'.format(name, pol, time.time() - start)
+
+    current, proposed = results
+    print '{0:<10} {1:>10} {2:>10} {3:>14} {4:>10} {5:>14} {6:>14}'.format(
+            'branch', 'loans', 'fined', 'current', 'fined', 'proposed', 'change')
+    rows = [(_, current['branches'][_], proposed['branches'][_]) for _ in sorted(current['branches'])]
+    rows.append(('all', current, proposed))
+    for lib_branch_id, cur, pro in rows:
+        print '{0:<10} {1:>10} {2:>10} {3:>14} {4:>10} {5:>14} {6:>14}'.format(
+                lib_branch_id, cur['loans'], cur['fined'], cur['fine_amt'],
+                pro['fined'], pro['fine_amt'], pro['fine_amt'] - cur['fine_amt'])
+    return proposed
+
+
+def parse_branch_rate(value):
+    lib_branch_id, rate = value.split('=')
+    return int(lib_branch_id), rate
+
+
+if __name__ == '__main__':
+    settings_policy = FinePolicy.from_settings()
+    parser = argparse.ArgumentParser(description='Project fines over the loan history under a fine policy')
+    parser.add_argument('--daily-fine', default=settings_policy.daily_fine,
+            help='fine per day overdue, default: {0}'.format(settings_policy.daily_fine))
+    parser.add_argument('--grace-days', type=int, default=settings_policy.grace_days,
+            help='days overdue not charged, default: {0}'.format(settings_policy.grace_days))
+    parser.add_argument('--max-fine', default=settings_policy.max_fine,
+            help='fine cap per loan, default: {0}'.format(settings_policy.max_fine))
+    parser.add_argument('--branch-rate', type=parse_branch_rate, action='append', default=[],
+            metavar='LIB_BRANCH_ID=DAILY_FINE', help='daily fine of a branch, repeat for more branches')
+    parser.add_argument('--active-only', action='store_true',
+            help='BookLoan only, without archived loans')
+    args = parser.parse_args()
+    policy = FinePolicy(daily_fine=args.daily_fine, grace_days=args.grace_days, max_fine=args.max_fine,
+                        branch_rates=dict(args.branch_rate) if args.branch_rate else settings_policy.branch_rates)
+    project_fines(policy, archived=not args.active_only)
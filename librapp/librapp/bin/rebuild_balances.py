@@ -0,0 +1,49 @@
+'''
+Recomputes borrower balances from the fine ledger, see librapp/lib/fine_ledger.py.
+Balances are kept with the ledger, run this after fixing ledger entries by hand,
+or to check them: it prints the number of balances that changed.
+
+Usage Option 1:
+    $ cd librapp/bin
+    $ python rebuild_balances.py
+
+Usage Option 2:
+    $ python manage.py shell
+    >>> from librapp.bin.rebuild_balances import rebuild_balances
+    >>> rebuild_balances()
+'''
+
+import argparse
+import django
+import os
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+# librapp settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+django.setup()
+
+# do this after settings
+from librapp import models
+from librapp.lib.fine_ledger import FineLedger
+
+
+def rebuild_balances(batch_size=None):
+    start = time.time()
+    before = dict(models.BorrowerBalance.objects.values_list('card_no', 'balance').iterator())
+    count = FineLedger().rebuild(batch_size=batch_size)
+    after = dict(models.BorrowerBalance.objects.values_list('card_no', 'balance').iterator())
+    changed = sum(1 for card_no in set(before) | set(after) if before.get(card_no, 0) != after.get(card_no, 0))
+    print 'Rebuilt {0} balances, {1} changed, in {2:.2f}s'.format(count, changed, time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recompute borrower balances from the fine ledger')
+    parser.add_argument('--batch-size', type=int, default=None,
+            help='balances written per insert, default: {0}'.format(FineLedger.BATCH_SIZE))
+    args = parser.parse_args()
+    rebuild_balances(batch_size=args.batch_size)
@@ -0,0 +1,42 @@
+'''
+Rebuilds BookSearchDocument rows for all books.
+Documents are kept in sync by signals (librapp/signals.py), run this after
+loading data without signals, eg: raw sql or loaddata.
+
+Usage Option 1:
+    $ cd librapp/bin
+    $ python rebuild_search_documents.py
+
+Usage Option 2:
+    $ python manage.py shell
+    >>> from librapp.bin.rebuild_search_documents import rebuild_search_documents
+    >>> rebuild_search_documents()
+'''
+
+import django
+import os
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+# librapp settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+django.setup()
+
+# do this after settings
+from django.db import transaction
+from librapp.lib.search_documents import SearchDocumentHelper
+
+
+def rebuild_search_documents():
+    start = time.time()
+    with transaction.atomic():
+        count = SearchDocumentHelper().rebuild()
+    print 'Rebuilt {0} search documents in {1:.2f}s'.format(count, time.time() - start)
+
+
+if __name__ == '__main__':
+    rebuild_search_documents()
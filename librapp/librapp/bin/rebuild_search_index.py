@@ -0,0 +1,48 @@
+'''
+Rebuilds the in-process search index from the database and writes
+the snapshot file (SEARCH_INDEX_SNAPSHOT in settings).
+Running servers pick up the new snapshot within SEARCH_INDEX_RELOAD_INTERVAL.
+
+Run after loading or changing the Book, Author catalog.
+
+Usage Option 1:
+    $ cd librapp/bin
+    $ python rebuild_search_index.py
+
+Usage Option 2:
+    $ python manage.py shell
+    >>> from librapp.bin.rebuild_search_index import rebuild_search_index
+    >>> rebuild_search_index()
+'''
+
+import django
+import os
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+# librapp settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+django.setup()
+
+# do this after settings
+from django.conf import settings
+from librapp.lib.search_engine import SearchIndex
+
+
+def rebuild_search_index(file_path=None):
+    if file_path is None:
+        file_path = settings.SEARCH_INDEX_SNAPSHOT
+    start = time.time()
+    index = SearchIndex.from_db()
+    index.save(file_path)
+    print 'Indexed {0} books, {1} authors in {2:.2f}s'.format(
+            len(index.books), len(index.authors), time.time() - start)
+    print 'Snapshot: {0}'.format(file_path)
+
+
+if __name__ == '__main__':
+    rebuild_search_index()
@@ -0,0 +1,64 @@
+'''Borrower eligibility for checkout, with one aggregate query over the borrower's active
+loans and a primary key read of the borrower's FineLedger balance
+
+**Usage**
+    be = BorrowerEligibility()
+    eligibility = be.get_eligibility(card_no=1, book_copy_id=2)
+        {'unpaid_fines': False, 'active_loans': 1, 'has_copy_loan': False}
+    msg = be.get_reason(eligibility) # None if the borrower can checkout
+    eligibilities = be.get_eligibilities(card_nos=[1, 2]) # {card_no: eligibility}
+'''
+
+from django.db.models import Case, Count, IntegerField, Sum, Value, When
+
+from librapp import models
+from librapp.lib.fine_ledger import FineLedger
+
+
+class BorrowerEligibility(object):
+
+    MAX_ACTIVE_LOANS = 3
+    ledger = FineLedger()
+
+    @staticmethod
+    def _count(**when):
+        return Sum(Case(When(then=Value(1), **when), default=Value(0), output_field=IntegerField()))
+
+    def get_eligibility(self, card_no, book_copy_id=None):
+        '''Returns dict
+            unpaid_fines  : borrower balance > 0
+            active_loans  : count of loans not checked in
+            has_copy_loan : borrower has book_copy_id, not checked in
+        '''
+        counts = {'active_loans': Count('id')}
+        if book_copy_id is not None:
+            counts['copy_loans'] = self._count(book_id=book_copy_id)
+        result = models.BookLoan.objects.filter(card_no_id=card_no, date_in=None).aggregate(**counts)
+        return {
+            'unpaid_fines': self.ledger.get_balance(card_no) > 0,
+            'active_loans': result['active_loans'] or 0,
+            'has_copy_loan': bool(result.get('copy_loans')),
+            }
+
+    def get_eligibilities(self, card_nos):
+        '''Returns {card_no: eligibility} for many borrowers, with one grouped query and one balances query.
+        has_copy_loan is always False, copies are checked by the caller.
+        '''
+        balances = self.ledger.get_balances(card_nos)
+        result = dict((card_no, {'unpaid_fines': balances[card_no] > 0, 'active_loans': 0, 'has_copy_loan': False})
+                      for card_no in card_nos)
+        loans = models.BookLoan.objects.filter(card_no_id__in=card_nos, date_in=None).values('card_no').order_by()
+        for row in loans.annotate(active_loans=Count('id')):
+            result[row['card_no']]['active_loans'] = row['active_loans']
+        return result
+
+    def get_reason(self, eligibility):
+        '''Returns why the borrower cannot checkout, None if eligible
+        '''
+        if eligibility['has_copy_loan']:
+            return 'Cannot loan the same book twice'
+        if eligibility['unpaid_fines']:
+            return 'Unpaid fines. Cannot borrow any books at this time'
+        if eligibility['active_loans'] >= self.MAX_ACTIVE_LOANS:
+            return 'Cannot borrow more that 3 books at a time'
+        return None
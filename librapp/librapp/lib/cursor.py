@@ -0,0 +1,26 @@
+'''Opaque cursors for paginated listings
+
+**Usage**
+    cursor = encode_cursor({'o': 20})
+    values = decode_cursor(cursor) # raises ValueError if cursor is not valid
+'''
+
+import base64
+import json
+
+
+def encode_cursor(values):
+    text = json.dumps(values, sort_keys=True, separators=(',', ':'))
+    return base64.urlsafe_b64encode(text).rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        cursor = str(cursor)
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError, UnicodeEncodeError):
+        raise ValueError('Invalid cursor: {0}'.format(cursor))
+    if not isinstance(values, dict):
+        raise ValueError('Invalid cursor: {0}'.format(cursor))
+    return values
@@ -0,0 +1,145 @@
+'''Fine accrual for overdue loans, run periodically by librapp/bin/accrue_fines.py
+GET /books/loans/ and /books/fines/ only read the Fine table.
+
+**Usage**
+    accrual = FineAccrual()
+    run = accrual.run()                   # FineAccrualRun
+    as_of = FineAccrual.get_fines_as_of() # fines are up to date as of, None if never run
+
+The first run scans all overdue loans in batches of id. Later runs only read active
+overdue loans, from the OverdueTracker, and loans checked in since the last run.
+Each batch is written with one UPDATE and one INSERT, and its FineLedger entries,
+in one transaction. Fines stop growing at date_in. Paid fines are not changed.
+Fine amounts come from the FinePolicy, settings.FINE_POLICY by default.
+'''
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, Q, Value, When
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.fine_ledger import FineLedger
+from librapp.lib.fine_policy import FinePolicy
+from librapp.lib.overdue_tracker import OverdueTracker
+
+
+class FineAccrual(object):
+
+    BATCH_SIZE = 1000
+    ledger = FineLedger()
+
+    def __init__(self, tracker=None, policy=None):
+        # keep the accrual, and its tracker, between runs to refresh instead of rebuild
+        self.tracker = tracker or OverdueTracker()
+        self.policy = policy or FinePolicy.from_settings()
+
+    @staticmethod
+    def get_last_run():
+        runs = models.FineAccrualRun.objects.filter(finished_at__isnull=False)
+        return runs.order_by('-as_of').first()
+
+    @classmethod
+    def get_fines_as_of(cls):
+        last_run = cls.get_last_run()
+        if last_run is None:
+            return None
+        return last_run.as_of
+
+    @staticmethod
+    def get_loans(now, since=None):
+        '''Returns loans whose fine may have changed since the run at since
+        '''
+        loans = models.BookLoan.objects.filter(due_date__lt=now - timedelta(1))
+        if since is not None:
+            # returned loans get their final fine in the first run after date_in
+            loans = loans.filter(Q(date_in=None) | Q(date_in__gte=since))
+        return loans.exclude(fine__paid=True)
+
+    def run(self, now=None, batch_size=None):
+        '''Accrues fines up to now, returns the FineAccrualRun
+        '''
+        now = now or timezone.now()
+        batch_size = batch_size or self.BATCH_SIZE
+        last_run = self.get_last_run()
+        since = last_run.as_of if last_run is not None else None
+
+        accrual_run = models.FineAccrualRun.objects.create(as_of=now)
+        loans = self.get_loans(now, since=since).order_by('id')
+        fields = ('id', 'card_no_id', 'book__lib_branch_id', 'due_date', 'date_in', 'fine__id', 'fine__fine_amt')
+        for batch in self.get_batches(loans, now, since, batch_size, fields):
+            created, updated = self.accrue(batch, now)
+            accrual_run.loans_scanned += len(batch)
+            accrual_run.fines_created += created
+            accrual_run.fines_updated += updated
+
+        accrual_run.finished_at = timezone.now()
+        accrual_run.save()
+        return accrual_run
+
+    def get_loan_ids(self, now, since):
+        '''Returns sorted ids of active overdue loans and of loans checked in since, overdue
+        '''
+        self.tracker.refresh()
+        loan_ids = set(self.tracker.get_overdue(now - timedelta(1)))
+        returned = models.BookLoan.objects.filter(date_in__gte=since, due_date__lt=now - timedelta(1))
+        loan_ids.update(returned.values_list('id', flat=True))
+        return sorted(loan_ids)
+
+    def get_batches(self, loans, now, since, batch_size, fields):
+        '''Yields lists of loans values, batch_size loans at a time
+        '''
+        if since is None:
+            last_id = 0
+            while True:
+                batch = list(loans.filter(id__gt=last_id).values_list(*fields)[:batch_size])
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                yield batch
+            return
+        loan_ids = self.get_loan_ids(now, since)
+        for start in xrange(0, len(loan_ids), batch_size):
+            # loans still filtered, the tracker may be behind the database
+            batch = list(loans.filter(id__in=loan_ids[start:start + batch_size]).values_list(*fields))
+            if batch:
+                yield batch
+
+    def accrue(self, batch, now):
+        '''Writes fines for batch of (loan_id, card_no, lib_branch_id, due_date, date_in, fine_id, fine_amt)
+        Returns (created count, updated count)
+        '''
+        to_create = []
+        to_update = {}
+        for loan_id, card_no, lib_branch_id, due_date, date_in, fine_id, fine_amt in batch:
+            new_amt = self.policy.get_fine_amt(due_date, date_in, now, lib_branch_id=lib_branch_id)
+            if new_amt is None:
+                continue
+            if fine_id is None:
+                to_create.append(models.Fine(loan_id=loan_id, fine_amt=new_amt))
+            elif new_amt != fine_amt:
+                to_update[fine_id] = (loan_id, card_no, new_amt)
+
+        entries = []
+        with transaction.atomic():
+            if to_update:
+                # read again under lock, a payment may have paid the fine since
+                fines = models.Fine.objects.select_for_update().filter(id__in=to_update.keys(), paid=False)
+                old_amts = dict(fines.values_list('id', 'fine_amt'))
+                to_update = dict((k, v) for k, v in to_update.iteritems() if k in old_amts)
+            if to_update:
+                whens = [When(id=fine_id, then=Value(amt)) for fine_id, (_, _, amt) in to_update.iteritems()]
+                amount = Case(*whens, output_field=DecimalField(max_digits=6, decimal_places=2))
+                models.Fine.objects.filter(id__in=to_update.keys()).update(fine_amt=amount)
+                for fine_id, (loan_id, card_no, amt) in to_update.iteritems():
+                    entries.append(models.FineLedgerEntry(card_no_id=card_no, loan_id=loan_id,
+                            kind=models.FineLedgerEntry.FINE, amount=amt - old_amts[fine_id]))
+            if to_create:
+                models.Fine.objects.bulk_create(to_create)
+                card_nos = dict((_[0], _[1]) for _ in batch)
+                for fine in to_create:
+                    entries.append(models.FineLedgerEntry(card_no_id=card_nos[fine.loan_id], loan_id=fine.loan_id,
+                            kind=models.FineLedgerEntry.FINE, amount=fine.fine_amt))
+            self.ledger.add_entries(entries)
+        return len(to_create), len(to_update)
@@ -0,0 +1,158 @@
+'''Fine ledger, append only FineLedgerEntry rows with a BorrowerBalance row per borrower
+
+**Usage**
+    ledger = FineLedger()
+    try:
+        fine, change = ledger.pay(fine_id=3, amount=Decimal('2.50'))
+        allocations, change = ledger.settle(card_no=1, amount=Decimal('20.00')) # [(fine, applied)], oldest first
+    except LedgerError as e:
+        return Response({'msg': e.message}, status=e.status)
+    balance = ledger.get_balance(card_no=1)         # Decimal, unpaid fines, one primary key read
+    balances = ledger.get_balances(card_nos=[1, 2])  # {card_no: balance}
+    count = ledger.rebuild()                          # balances from the ledger, one pass
+
+    Fines accrued, by FineAccrual, in the caller's transaction:
+    ledger.add_entries([FineLedgerEntry(card_no_id=1, loan_id=12, kind=FineLedgerEntry.FINE, amount=Decimal('0.25'))])
+
+Every change of what a borrower owes is an entry: fines as they accrue, payments
+as negative amounts. Balances are kept with the entries, in the same transaction,
+so a balance is the sum of the borrower's entries. Amounts are Decimal throughout.
+'''
+
+from collections import defaultdict
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from librapp import models
+
+
+class LedgerError(Exception):
+    def __init__(self, message, status=400):
+        super(LedgerError, self).__init__(message)
+        self.status = status
+
+
+class FineLedger(object):
+
+    BATCH_SIZE = 1000
+
+    def add_entries(self, entries):
+        '''Appends FineLedgerEntry list, and adds their amounts to the borrower balances.
+        Call in a transaction, with the fine changes they record
+        '''
+        if not entries:
+            return
+        models.FineLedgerEntry.objects.bulk_create(entries)
+        deltas = defaultdict(Decimal)
+        for entry in entries:
+            deltas[entry.card_no_id] += entry.amount
+        self.add_balances(deltas)
+
+    @staticmethod
+    def add_balances(deltas):
+        '''Adds {card_no: amount} to balances, with one UPDATE, creates missing balance rows
+        '''
+        deltas = dict((card_no, amount) for card_no, amount in deltas.iteritems() if amount)
+        if not deltas:
+            return
+        now = timezone.now()
+        balances = models.BorrowerBalance.objects.filter(card_no__in=deltas.keys())
+        existing = set(balances.values_list('card_no', flat=True))
+        if existing:
+            whens = [When(card_no=card_no, then=Value(deltas[card_no])) for card_no in existing]
+            amount = Case(*whens, output_field=DecimalField(max_digits=10, decimal_places=2))
+            balances.update(balance=F('balance') + amount, updated_at=now)
+        models.BorrowerBalance.objects.bulk_create([
+            models.BorrowerBalance(card_no_id=card_no, balance=amount, updated_at=now)
+            for card_no, amount in deltas.iteritems() if card_no not in existing])
+
+    def pay(self, fine_id, amount):
+        '''Pays amount towards the fine, up to what is left of it.
+        Returns (Fine, change), change is the part of amount not used
+        '''
+        with transaction.atomic():
+            try:
+                fine = models.Fine.objects.select_for_update().select_related('loan').get(id=fine_id)
+            except models.Fine.DoesNotExist:
+                raise LedgerError('Fine: {0} does not exist'.format(fine_id))
+            if fine.paid:
+                raise LedgerError('Fine is already paid')
+            allocations, change = self.allocate([fine], amount)
+        return fine, change
+
+    def settle(self, card_no, amount):
+        '''Pays amount towards the unpaid fines of the borrower, oldest due date first,
+        each up to what is left of it. Returns ([(Fine, applied)], change), fines paid in part or in full
+        '''
+        with transaction.atomic():
+            fines = models.Fine.objects.select_for_update().select_related('loan')
+            fines = list(fines.filter(loan__card_no_id=card_no, paid=False).order_by('loan__due_date', 'id'))
+            if not fines:
+                raise LedgerError('No unpaid fines for card_no: {0}'.format(card_no))
+            return self.allocate(fines, amount)
+
+    def allocate(self, fines, amount):
+        '''Applies amount to fines in order, with one UPDATE and one PAYMENT entry per fine.
+        Call in a transaction, with fines locked. Returns ([(Fine, applied)], change)
+        '''
+        allocations = []
+        for fine in fines:
+            if not amount:
+                break
+            applied = min(amount, fine.fine_amt - fine.paid_amt)
+            amount -= applied
+            fine.paid_amt += applied
+            fine.paid = fine.paid_amt >= fine.fine_amt
+            allocations.append((fine, applied))
+        if not allocations:
+            return allocations, amount
+
+        paid_amts = [When(id=fine.id, then=Value(fine.paid_amt)) for fine, _ in allocations]
+        paid_ids = [fine.id for fine, _ in allocations if fine.paid]
+        # no When for an empty id list, IN () does not compile
+        paid = Case(When(id__in=paid_ids, then=Value(True)), default=Value(False),
+                    output_field=BooleanField()) if paid_ids else False
+        models.Fine.objects.filter(id__in=[fine.id for fine, _ in allocations]).update(
+                paid_amt=Case(*paid_amts, output_field=DecimalField(max_digits=6, decimal_places=2)), paid=paid)
+        self.add_entries([models.FineLedgerEntry(card_no_id=fine.loan.card_no_id, loan_id=fine.loan_id,
+                                                 kind=models.FineLedgerEntry.PAYMENT, amount=-applied)
+                          for fine, applied in allocations if applied])
+        return allocations, amount
+
+    @staticmethod
+    def get_balance(card_no):
+        balance = models.BorrowerBalance.objects.filter(card_no=card_no).values_list('balance', flat=True).first()
+        return balance if balance is not None else Decimal('0')
+
+    @staticmethod
+    def get_balances(card_nos):
+        result = dict((card_no, Decimal('0')) for card_no in card_nos)
+        result.update(models.BorrowerBalance.objects.filter(card_no__in=card_nos).values_list('card_no', 'balance'))
+        return result
+
+    def rebuild(self, batch_size=None):
+        '''Recomputes all balances from the ledger, reading entries once in borrower order.
+        Returns number of balances written
+        '''
+        batch_size = batch_size or self.BATCH_SIZE
+        now = timezone.now()
+        count = 0
+        with transaction.atomic():
+            models.BorrowerBalance.objects.all().delete()
+            entries = models.FineLedgerEntry.objects.order_by('card_no', 'id').values_list('card_no', 'amount')
+            balances = []
+            for card_no, card_entries in groupby(entries.iterator(), key=itemgetter(0)):
+                balance = sum((amount for _, amount in card_entries), Decimal('0'))
+                balances.append(models.BorrowerBalance(card_no_id=card_no, balance=balance, updated_at=now))
+                if len(balances) >= batch_size:
+                    models.BorrowerBalance.objects.bulk_create(balances)
+                    count += len(balances)
+                    balances = []
+            models.BorrowerBalance.objects.bulk_create(balances)
+            count += len(balances)
+        return count
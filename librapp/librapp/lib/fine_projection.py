@@ -0,0 +1,106 @@
+'''What-if fine totals for a FinePolicy over the loan history, with numpy.
+See librapp/bin/project_fines.py
+
+**Usage**
+    loans = LoanArrays.load(archived=True) # due, date_in and branch of every loan, as arrays
+    projection = FineProjection(FinePolicy(daily_fine=Decimal('0.50'), max_fine=Decimal('10.00')))
+    result = projection.project(loans, now=timezone.now())
+        {'loans': 980000, 'fined': 465000, 'fine_amt': Decimal('...'),
+         'branches': {1: {'loans': ..., 'fined': ..., 'fine_amt': Decimal('...')}, ...}}
+
+Loans are read once, in chunks, each policy is then one vectorized pass over the arrays.
+Fines are as if computed at now, for all loans, paid and archived ones included.
+'''
+
+from decimal import Decimal
+
+from librapp import models
+from librapp.lib.fine_policy import np, to_micros
+
+
+class LoanArrays(object):
+    '''due, date_in (int64 microseconds), has_date_in (bool) and branch_ids (int64) of loans
+    '''
+
+    CHUNK_SIZE = 100000
+
+    def __init__(self, due, date_in, has_date_in, branch_ids):
+        self.due = due
+        self.date_in = date_in
+        self.has_date_in = has_date_in
+        self.branch_ids = branch_ids
+
+    def __len__(self):
+        return len(self.due)
+
+    @classmethod
+    def from_rows(cls, rows):
+        '''rows : list of (due_date, date_in or None, lib_branch_id)
+        '''
+        if np is None:
+            raise ImportError('numpy is required for LoanArrays')
+        count = len(rows)
+        due = np.fromiter((to_micros(_[0]) for _ in rows), dtype=np.int64, count=count)
+        date_in = np.fromiter((to_micros(_[1]) if _[1] is not None else 0 for _ in rows), dtype=np.int64, count=count)
+        has_date_in = np.fromiter((_[1] is not None for _ in rows), dtype=bool, count=count)
+        branch_ids = np.fromiter((_[2] for _ in rows), dtype=np.int64, count=count)
+        return cls(due, date_in, has_date_in, branch_ids)
+
+    @classmethod
+    def concatenate(cls, parts):
+        if not parts:
+            return cls.from_rows([])
+        return cls(*[np.concatenate([getattr(_, name) for _ in parts])
+                     for name in ('due', 'date_in', 'has_date_in', 'branch_ids')])
+
+    @classmethod
+    def load(cls, archived=True, chunk_size=None):
+        '''Reads BookLoan, and ArchivedLoan if archived, chunk_size loans at a time by id
+        '''
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        querysets = [models.BookLoan.objects.all()]
+        if archived:
+            querysets.append(models.ArchivedLoan.objects.all())
+        parts = []
+        for loans in querysets:
+            last_id = 0
+            while True:
+                rows = list(loans.filter(id__gt=last_id).order_by('id')
+                            .values_list('id', 'due_date', 'date_in', 'book__lib_branch_id')[:chunk_size])
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                parts.append(cls.from_rows([_[1:] for _ in rows]))
+        return cls.concatenate(parts)
+
+
+class FineProjection(object):
+
+    def __init__(self, policy):
+        self.policy = policy
+
+    @staticmethod
+    def _get_amount(cents):
+        return (Decimal(int(cents)) / 100).quantize(Decimal('0.01'))
+
+    def project(self, loans, now):
+        '''Returns totals of fines under the policy, overall and by branch, for LoanArrays loans
+        '''
+        cents = self.policy.get_fine_cents(loans.due, loans.date_in, loans.has_date_in, loans.branch_ids, now)
+        result = {'loans': len(loans), 'fined': int(np.count_nonzero(cents)),
+                  'fine_amt': self._get_amount(cents.sum()), 'branches': {}}
+        if not len(loans):
+            return result
+        branch_ids, index = np.unique(loans.branch_ids, return_inverse=True)
+        counts = np.bincount(index)
+        fined = np.bincount(index, weights=cents > 0)
+        # int64 sums, float weights of bincount would round large cents totals
+        totals = np.zeros(len(branch_ids), dtype=np.int64)
+        np.add.at(totals, index, cents)
+        for i, lib_branch_id in enumerate(branch_ids):
+            result['branches'][int(lib_branch_id)] = {
+                    'loans': int(counts[i]),
+                    'fined': int(fined[i]),
+                    'fine_amt': self._get_amount(totals[i]),
+                    }
+        return result
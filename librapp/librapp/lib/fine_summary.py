@@ -0,0 +1,135 @@
+'''Fine totals for reporting, with one aggregate query grouped by branch.
+Overdue days buckets are conditional aggregates of the same query.
+
+**Usage**
+    fs = FineSummary()
+    summary = fs.get_summary(lib_branch_id=1)
+        {
+            'totals': {'count': 3, 'fine_amt': Decimal('4.50'), 'paid_count': 1, 'paid_amt': Decimal('1.25'),
+                       'unpaid_count': 2, 'unpaid_amt': Decimal('3.25')},
+            'branches': [{'lib_branch_id': 1, 'count': 3, ...}],
+            'overdue_days': [{'days': '1-7', 'count': 2, 'fine_amt': Decimal('1.50'), 'unpaid_amt': Decimal('1.50')}, ...]
+        }
+    summary = fs.get_cached_summary(lib_branch_id=1) # same, from cache for FINE_SUMMARY_CACHE_TTL seconds
+
+Overdue days of a fine are from the due date of its loan to now, checked in or not, as in an
+aging report. Buckets compare due_date with constants, no date arithmetic per row.
+unpaid_amt is what is left of unpaid fines, fine_amt - paid_amt.
+Settings: FINE_SUMMARY_CACHE_TTL (seconds), 0 for no cache. The cache is per process.
+'''
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.lru_cache import LRUCache
+
+
+class FineSummary(object):
+
+    # upper bounds of overdue days buckets, the last bucket has none
+    BUCKETS = (7, 30, 90)
+    cache = LRUCache(max_size=100, ttl=10)
+
+    @staticmethod
+    def _count(condition):
+        return Sum(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField()))
+
+    @staticmethod
+    def _amount(condition, amount):
+        return Sum(Case(When(condition, then=amount), default=Value(0),
+                        output_field=DecimalField(max_digits=12, decimal_places=2)))
+
+    @classmethod
+    def get_buckets(cls):
+        '''Returns list of (label, first day, last day or None)
+        '''
+        buckets = []
+        first = 1
+        for last in cls.BUCKETS:
+            buckets.append(('{0}-{1}'.format(first, last), first, last))
+            first = last + 1
+        buckets.append(('{0}+'.format(first), first, None))
+        return buckets
+
+    @staticmethod
+    def _overdue_between(first, last, now):
+        '''Q for fines of loans due first to last days before now. first 1 includes 0, last None is no bound
+        '''
+        condition = Q()
+        if first > 1:
+            condition &= Q(loan__due_date__lt=now - timedelta(first - 1))
+        if last is not None:
+            condition &= Q(loan__due_date__gte=now - timedelta(last))
+        return condition
+
+    def get_aggregates(self, now):
+        '''Returns aggregates for values().annotate(), all_ for totals and b<i>_ for bucket i.
+        Names are prefixed, an annotation named as a field would replace it in F()
+        '''
+        unpaid = Q(paid=False)
+        left = F('fine_amt') - F('paid_amt')
+        aggregates = {
+                'all_count': Count('id'),
+                'all_fine_amt': Sum('fine_amt'),
+                'all_paid_count': self._count(Q(paid=True)),
+                'all_paid_amt': Sum('paid_amt'),
+                'all_unpaid_count': self._count(unpaid),
+                'all_unpaid_amt': self._amount(unpaid, left),
+                }
+        for i, (label, first, last) in enumerate(self.get_buckets()):
+            condition = self._overdue_between(first, last, now)
+            aggregates['b{0}_count'.format(i)] = self._count(condition)
+            aggregates['b{0}_fine_amt'.format(i)] = self._amount(condition, F('fine_amt'))
+            aggregates['b{0}_unpaid_amt'.format(i)] = self._amount(condition & unpaid, left)
+        return aggregates
+
+    @staticmethod
+    def _get_zeros(keys):
+        return dict((key, Decimal('0.00') if key.endswith('_amt') else 0) for key in keys)
+
+    def get_summary(self, lib_branch_id=None, now=None):
+        now = now or timezone.now()
+        fines = models.Fine.objects.all()
+        if lib_branch_id is not None:
+            fines = fines.filter(loan__book__lib_branch_id=int(lib_branch_id))
+        rows = fines.values('loan__book__lib_branch_id').order_by('loan__book__lib_branch_id')
+        rows = list(rows.annotate(**self.get_aggregates(now)))
+
+        keys = ['count', 'fine_amt', 'paid_count', 'paid_amt', 'unpaid_count', 'unpaid_amt']
+        totals = self._get_zeros(keys)
+        branches = []
+        for row in rows:
+            branch = self._get_zeros(keys)
+            branch['lib_branch_id'] = row['loan__book__lib_branch_id']
+            for key in keys:
+                branch[key] += row['all_' + key] or 0
+                totals[key] += row['all_' + key] or 0
+            branches.append(branch)
+
+        overdue_days = []
+        for i, (label, first, last) in enumerate(self.get_buckets()):
+            bucket = self._get_zeros(['count', 'fine_amt', 'unpaid_amt'])
+            bucket['days'] = label
+            for row in rows:
+                for key in ['count', 'fine_amt', 'unpaid_amt']:
+                    bucket[key] += row['b{0}_{1}'.format(i, key)] or 0
+            overdue_days.append(bucket)
+        return {'totals': totals, 'branches': branches, 'overdue_days': overdue_days}
+
+    def get_cached_summary(self, lib_branch_id=None):
+        '''get_summary, cached for FINE_SUMMARY_CACHE_TTL seconds
+        '''
+        ttl = getattr(settings, 'FINE_SUMMARY_CACHE_TTL', 10)
+        if ttl <= 0:
+            return self.get_summary(lib_branch_id=lib_branch_id)
+        key = int(lib_branch_id) if lib_branch_id is not None else None
+        summary = self.cache.get(key)
+        if summary is None:
+            summary = self.get_summary(lib_branch_id=lib_branch_id)
+            self.cache.set(key, summary, ttl=ttl)
+        return summary
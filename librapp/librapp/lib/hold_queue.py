@@ -0,0 +1,196 @@
+'''Holds on a book at a branch, first come first served
+
+**Usage**
+    hq = HoldQueue()
+    try:
+        hold = hq.place(lib_branch_id=1, isbn='0151009376', card_no=1) # only when no copy is available
+        hold = hq.cancel(hold_id=hold.id)
+    except HoldError as e:
+        return Response({'msg': e.message}, status=e.status)
+    position = hq.get_position(hold) # 1 is next, None if not waiting
+
+    Returned copies go to the next waiting holds, the rest back to no_of_copies:
+    left = hq.release({book_copy_id: 1}) # {book_copy_id: copies put back}
+
+A returned copy makes the oldest waiting hold ready, and is kept for that borrower for
+HOLD_DAYS, out of no_of_copies. LoanService.checkout of that borrower fulfills the hold.
+Ready holds not picked up in time expire, see librapp/bin/expire_holds.py, and their
+copy goes to the next hold.
+The head of a queue is read from the (book, status, id) index, so handing a copy over
+does not depend on the length of the queue.
+'''
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.search_cache import search_cache
+
+
+class HoldError(Exception):
+    def __init__(self, message, status=400):
+        super(HoldError, self).__init__(message)
+        self.status = status
+
+
+class HoldQueue(object):
+
+    HOLD_DAYS = 3 # days a ready hold is kept for pickup
+    ACTIVE = (models.Hold.WAITING, models.Hold.READY)
+
+    def place(self, lib_branch_id, isbn, card_no):
+        '''Adds a hold at the end of the queue of the book at the branch, returns the Hold
+        '''
+        with transaction.atomic():
+            try:
+                # checkin hands copies to holds under the same lock
+                book_copy = models.BookCopy.objects.select_for_update().get(isbn_id=isbn, lib_branch_id=lib_branch_id)
+            except models.BookCopy.DoesNotExist:
+                raise HoldError('Could not create Hold')
+            if book_copy.no_of_copies > 0:
+                raise HoldError('Book is available, no hold needed')
+            if not models.Borrower.objects.filter(card_no=card_no).exists():
+                raise HoldError('Could not create Hold')
+            if models.BookLoan.objects.filter(book=book_copy, card_no_id=card_no, date_in=None).exists():
+                raise HoldError('Book is already loaned to the borrower')
+            if models.Hold.objects.filter(book=book_copy, card_no_id=card_no, status__in=self.ACTIVE).exists():
+                raise HoldError('Hold already placed')
+            return models.Hold.objects.create(book=book_copy, card_no_id=card_no)
+
+    def cancel(self, hold_id):
+        '''Cancels a waiting or ready hold, a ready hold passes its copy on. Returns the Hold
+        '''
+        with transaction.atomic():
+            try:
+                hold = models.Hold.objects.select_for_update().select_related('book').get(id=hold_id)
+            except models.Hold.DoesNotExist:
+                raise HoldError('Hold does not exist')
+            if hold.status not in self.ACTIVE:
+                raise HoldError('Hold is not active')
+            was_ready = hold.status == models.Hold.READY
+            hold.status = models.Hold.CANCELLED
+            hold.save(update_fields=['status'])
+            left = self.release({hold.book_id: 1}) if was_ready else {}
+        if left.get(hold.book_id):
+            search_cache.invalidate_availability(hold.book.isbn_id, hold.book.lib_branch_id)
+        return hold
+
+    def fulfill(self, lib_branch_id, isbn, card_no):
+        '''Marks the ready hold of the borrower fulfilled, returns True if there was one.
+        Its copy is already out of no_of_copies
+        '''
+        holds = models.Hold.objects.filter(book__isbn_id=isbn, book__lib_branch_id=lib_branch_id,
+                                           card_no_id=card_no, status=models.Hold.READY)
+        return bool(holds.update(status=models.Hold.FULFILLED))
+
+    def assign(self, copy_counts, now=None):
+        '''Makes the oldest waiting holds of returned copies ready, one per copy.
+        copy_counts : {book_copy_id: copies returned}
+        Returns {book_copy_id: copies left, no waiting hold}
+        '''
+        now = now or timezone.now()
+        left = dict(copy_counts)
+        pending = set(copy_id for copy_id, count in left.iteritems() if count > 0)
+        while pending:
+            heads = models.Hold.objects.filter(book_id__in=pending, status=models.Hold.WAITING)
+            heads = heads.values('book_id').annotate(head_id=Min('id')).order_by()
+            heads = dict((_['book_id'], _['head_id']) for _ in heads)
+            if not heads:
+                break
+            # locked and checked again, a hold may have been cancelled since
+            ready = models.Hold.objects.select_for_update().filter(id__in=heads.values(), status=models.Hold.WAITING)
+            ready = list(ready.values_list('id', 'book_id'))
+            if ready:
+                models.Hold.objects.filter(id__in=[_[0] for _ in ready]).update(
+                        status=models.Hold.READY, ready_at=now, expires_at=now + timedelta(self.HOLD_DAYS))
+            for hold_id, copy_id in ready:
+                left[copy_id] -= 1
+            pending = set(copy_id for copy_id in heads if left[copy_id] > 0)
+        return left
+
+    def release(self, copy_counts, now=None):
+        '''Hands returned copies to waiting holds, adds the rest to no_of_copies.
+        Returns {book_copy_id: copies added to no_of_copies}
+        '''
+        left = self.assign(copy_counts, now)
+        by_count = defaultdict(list)
+        for copy_id, count in left.iteritems():
+            if count > 0:
+                by_count[count].append(copy_id)
+        for count, copy_ids in by_count.iteritems():
+            models.BookCopy.objects.filter(id__in=copy_ids).update(no_of_copies=F('no_of_copies') + count)
+        return left
+
+    def expire(self, now=None):
+        '''Expires ready holds not picked up by expires_at, returns number of holds expired
+        '''
+        now = now or timezone.now()
+        with transaction.atomic():
+            holds = models.Hold.objects.select_for_update().filter(status=models.Hold.READY, expires_at__lt=now)
+            holds = list(holds.values_list('id', 'book_id'))
+            if not holds:
+                return 0
+            models.Hold.objects.filter(id__in=[_[0] for _ in holds]).update(status=models.Hold.EXPIRED)
+            left = self.release(Counter(_[1] for _ in holds), now)
+        copies = models.BookCopy.objects.filter(id__in=[k for k, v in left.iteritems() if v > 0])
+        for isbn, lib_branch_id in copies.values_list('isbn_id', 'lib_branch_id'):
+            search_cache.invalidate_availability(isbn, lib_branch_id)
+        return len(holds)
+
+    def get_position(self, hold):
+        '''Returns place in the queue, 1 is next, None if the hold is not waiting
+        '''
+        if hold.status != models.Hold.WAITING:
+            return None
+        return models.Hold.objects.filter(book_id=hold.book_id, status=models.Hold.WAITING, id__lte=hold.id).count()
+
+    @staticmethod
+    def get_holds(card_no=None, lib_branch_id=None, isbn=None, active=False):
+        '''Returns Hold queryset, book copy loaded with the same query, in queue order
+        '''
+        hold_filter = {}
+        if card_no is not None:
+            hold_filter['card_no_id'] = int(card_no)
+        if lib_branch_id is not None:
+            hold_filter['book__lib_branch_id'] = int(lib_branch_id)
+        if isbn is not None:
+            hold_filter['book__isbn_id'] = isbn
+        if active:
+            hold_filter['status__in'] = HoldQueue.ACTIVE
+        return models.Hold.objects.filter(**hold_filter).select_related('book').order_by('id')
+
+    def get_holds_data(self, holds):
+        '''Returns list of hold data, with positions of waiting holds from one query
+        '''
+        holds = list(holds)
+        waiting = [_ for _ in holds if _.status == models.Hold.WAITING]
+        positions = {}
+        if waiting:
+            queue = models.Hold.objects.filter(book_id__in=set(_.book_id for _ in waiting),
+                                               status=models.Hold.WAITING, id__lte=max(_.id for _ in waiting))
+            places = Counter()
+            for hold_id, copy_id in queue.order_by('id').values_list('id', 'book_id'):
+                places[copy_id] += 1
+                positions[hold_id] = places[copy_id]
+        return [self.get_hold_data(_, positions.get(_.id)) for _ in holds]
+
+    @staticmethod
+    def get_hold_data(hold, position=None):
+        expires_at = hold.expires_at
+        if expires_at is not None:
+            expires_at = expires_at.isoformat()
+        return {
+            'id': hold.id,
+            'isbn': hold.book.isbn_id,
+            'lib_branch_id': hold.book.lib_branch_id,
+            'book_copy_id': hold.book_id,
+            'card_no': hold.card_no_id,
+            'status': hold.status,
+            'position': position,
+            'created_at': hold.created_at.isoformat(),
+            'expires_at': expires_at,
+            }
@@ -0,0 +1,113 @@
+'''Moves checked in loans with no unpaid fine, and their fines, to ArchivedLoan and ArchivedFine.
+Run periodically by librapp/bin/archive_loans.py, keeps BookLoan to active and recent loans.
+
+**Usage**
+    archive = LoanArchive(batch_size=500, pause=0.1)
+    result = archive.run()                # {'loans': 1000, 'fines': 120, 'batches': 2}
+    result = archive.run(max_batches=10)  # stop early, the next run goes on from there
+
+    History of a borrower, same loan data as LoanQuery:
+    loans = archive.get_archived_loans(card_no=1)
+    page, after = LoanQuery().get_page(loans, order='id', limit=100)
+
+Each batch moves its loans in one short transaction, the rows are inserted into the archive
+and deleted from BookLoan and Fine together, so a run stopped at any point can run again.
+Runs sleep pause seconds between batches, to leave room for checkouts.
+Only loans checked in before the last FineAccrual run are archived, their fine is final.
+'''
+
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.fine_accrual import FineAccrual
+
+
+class LoanArchive(object):
+
+    BATCH_SIZE = 500
+    PAUSE = 0.1 # seconds between batches
+    MIN_AGE_DAYS = 30 # days since date_in
+
+    def __init__(self, batch_size=None, pause=None, min_age_days=None):
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.pause = self.PAUSE if pause is None else pause
+        self.min_age_days = self.MIN_AGE_DAYS if min_age_days is None else min_age_days
+
+    def get_archive_before(self, now=None):
+        '''Returns date_in before which loans can be archived, None if fines were never accrued
+        '''
+        fines_as_of = FineAccrual.get_fines_as_of()
+        if fines_as_of is None:
+            return None
+        now = now or timezone.now()
+        return min(now - timedelta(self.min_age_days), fines_as_of)
+
+    @staticmethod
+    def get_loans(before):
+        '''Returns loans checked in before, with a paid fine or no fine
+        '''
+        loans = models.BookLoan.objects.filter(date_in__lt=before)
+        return loans.exclude(fine__paid=False)
+
+    def run(self, now=None, max_batches=None):
+        '''Archives loans in batches of batch_size, returns counts
+        {'loans': loans archived, 'fines': fines archived, 'batches': batches}
+        '''
+        result = {'loans': 0, 'fines': 0, 'batches': 0}
+        before = self.get_archive_before(now)
+        if before is None:
+            return result
+        loans = self.get_loans(before).order_by('id')
+        last_id = 0
+        while max_batches is None or result['batches'] < max_batches:
+            loan_ids = list(loans.filter(id__gt=last_id).values_list('id', flat=True)[:self.batch_size])
+            if not loan_ids:
+                break
+            last_id = loan_ids[-1]
+            loan_count, fine_count = self.archive(loan_ids, before)
+            result['loans'] += loan_count
+            result['fines'] += fine_count
+            result['batches'] += 1
+            if self.pause:
+                time.sleep(self.pause)
+        return result
+
+    def archive(self, loan_ids, before):
+        '''Moves loans in loan_ids, still archivable, with their fines. Returns (loan count, fine count)
+        '''
+        fields = ('id', 'book_id', 'card_no_id', 'date_out', 'due_date', 'date_in',
+                  'fine__id', 'fine__fine_amt', 'fine__paid')
+        with transaction.atomic():
+            # checked again under lock, a loan may have changed since it was read
+            loans = self.get_loans(before).select_for_update().filter(id__in=loan_ids)
+            archived_loans = []
+            archived_fines = []
+            for loan_id, book_id, card_no, date_out, due_date, date_in, fine_id, fine_amt, paid in loans.values_list(*fields):
+                archived_loans.append(models.ArchivedLoan(id=loan_id, book_id=book_id, card_no_id=card_no,
+                                                          date_out=date_out, due_date=due_date, date_in=date_in))
+                if fine_id is not None:
+                    archived_fines.append(models.ArchivedFine(id=fine_id, loan_id=loan_id, fine_amt=fine_amt, paid=paid))
+            if not archived_loans:
+                return 0, 0
+            archived_ids = [_.id for _ in archived_loans]
+            models.ArchivedLoan.objects.bulk_create(archived_loans)
+            models.ArchivedFine.objects.bulk_create(archived_fines)
+            models.Fine.objects.filter(loan_id__in=archived_ids).delete()
+            models.BookLoan.objects.filter(id__in=archived_ids).delete()
+        return len(archived_loans), len(archived_fines)
+
+    @staticmethod
+    def get_archived_loans(card_no=None, lib_branch_id=None):
+        '''Returns ArchivedLoan queryset, book copy and fine loaded with the same query
+        '''
+        loan_filter = {}
+        if card_no is not None:
+            loan_filter['card_no_id'] = int(card_no)
+        if lib_branch_id is not None:
+            loan_filter['book__lib_branch_id'] = int(lib_branch_id)
+        loans = models.ArchivedLoan.objects.filter(**loan_filter)
+        return loans.select_related('book', 'fine').order_by('id')
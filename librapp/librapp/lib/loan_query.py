@@ -0,0 +1,164 @@
+'''Loan listing for loans and fines views, with a constant number of queries
+
+**Usage**
+    lq = LoanQuery()
+    loans = lq.get_loans(card_no=1, lib_branch_id=2, active=True)
+    result = lq.get_loans_data(loans)
+
+    Fines, read from the Fine table, same loan data for each fine:
+    fines = lq.get_fines(card_no=1, fine_type='unpaid')
+    result = lq.get_fines_data(fines)
+    page, after = lq.get_page(fines, order='due_date', limit=100, due_date='loan__due_date')
+
+    Keyset pages, ordered by id or (due_date, id):
+    page, after = lq.get_page(loans, order='due_date', limit=100)
+    page, after = lq.get_page(loans, order='due_date', after=after, limit=100) # next page, after is None on the last
+
+    All loans as NDJSON lines, one page at a time:
+    for line in lq.iter_ndjson(loans):
+        ...
+'''
+
+import json
+import operator
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from librapp import models
+from librapp.utils.date_utils import DateUtils
+
+
+class LoanQuery(object):
+
+    ORDERS = ('id', 'due_date')
+    CHUNK_SIZE = 1000
+    dutils = DateUtils()
+
+    @staticmethod
+    def get_loans(card_no=None, lib_branch_id=None, active=False, overdue=False):
+        '''Returns BookLoan queryset, book copy and fine loaded with the same query
+        '''
+        loan_filter = {}
+        if card_no is not None:
+            loan_filter['card_no_id'] = int(card_no)
+        if lib_branch_id is not None:
+            loan_filter['book__lib_branch_id'] = int(lib_branch_id)
+        if active:
+            loan_filter['date_in'] = None
+        if overdue:
+            loan_filter['date_in'] = None
+            loan_filter['due_date__lt'] = timezone.now()
+        loans = models.BookLoan.objects.filter(**loan_filter)
+        return loans.select_related('book', 'fine').order_by('id')
+
+    @staticmethod
+    def get_fines(card_no=None, lib_branch_id=None, fine_type='both'):
+        '''Returns Fine queryset, loan and book copy loaded with the same query
+        fine_type : paid, unpaid or both
+        '''
+        fine_filter = {}
+        if card_no is not None:
+            fine_filter['loan__card_no_id'] = int(card_no)
+        if lib_branch_id is not None:
+            fine_filter['loan__book__lib_branch_id'] = int(lib_branch_id)
+        if fine_type == 'paid':
+            fine_filter['paid'] = True
+        elif fine_type == 'unpaid':
+            fine_filter['paid'] = False
+        return models.Fine.objects.filter(**fine_filter).select_related('loan__book').order_by('id')
+
+    def get_page(self, loans, order='id', after=None, limit=100, due_date='due_date'):
+        '''Returns (list of loans, after for the next page or None if last page)
+        order    : id, or due_date (ties ordered by id)
+        after    : {'id': last loan id, 'd': its due_date iso}, from the previous page
+        due_date : due date field, eg: loan__due_date for fines
+        '''
+        if order == 'due_date':
+            loans = loans.order_by(due_date, 'id')
+            if after is not None:
+                after_date = self.dutils.get_dt_from_iso(after['d'])
+                loans = loans.filter(Q(**{due_date + '__gt': after_date}) |
+                                     Q(**{due_date: after_date, 'id__gt': after['id']}))
+        else:
+            loans = loans.order_by('id')
+            if after is not None:
+                loans = loans.filter(id__gt=after['id'])
+        page = list(loans[:limit + 1])
+        if len(page) <= limit:
+            return page, None
+        page = page[:limit]
+        after = {'id': page[-1].id}
+        if order == 'due_date':
+            after['d'] = operator.attrgetter(due_date.replace('__', '.'))(page[-1]).isoformat()
+        return page, after
+
+    def iter_ndjson(self, loans, order='id', after=None, fines=False):
+        '''Yields loan data json lines, reads CHUNK_SIZE loans at a time
+        fines : loans is a Fine queryset from get_fines
+        '''
+        due_date = 'loan__due_date' if fines else 'due_date'
+        get_data = self.get_fines_data if fines else self.get_loans_data
+        while True:
+            page, after = self.get_page(loans, order=order, after=after, limit=self.CHUNK_SIZE, due_date=due_date)
+            for loan_data in get_data(page):
+                yield json.dumps(loan_data, cls=JSONEncoder) + '\n'
+            if after is None:
+                break
+
+    @classmethod
+    def get_loans_data(cls, loans):
+        '''Returns list of loan data, same as ViewsHelper.get_loan_data for each loan.
+        Fines are read as written by the last FineAccrual run.
+        loans are BookLoan, or ArchivedLoan from LoanArchive.get_archived_loans
+        '''
+        result = []
+        for loan in loans:
+            date_in = loan.date_in
+            if date_in is not None:
+                date_in = date_in.isoformat()
+            loan_data = {
+                'id': loan.id,
+                'isbn': loan.book.isbn_id,
+                'lib_branch_id': loan.book.lib_branch_id,
+                'card_no': loan.card_no_id,
+                'date_out': loan.date_out.isoformat(),
+                'date_in': date_in,
+                'due_date': loan.due_date.isoformat(),
+                }
+            try:
+                fine = loan.fine
+            except ObjectDoesNotExist:
+                fine = None
+            if fine is not None:
+                # ArchivedFine has no paid_amt, archived fines are paid
+                paid_amt = fine.fine_amt if fine.paid else fine.paid_amt
+                loan_data['fine'] = {
+                        'id': fine.id,
+                        'fine_amt': fine.fine_amt,
+                        'paid_amt': paid_amt,
+                        'unpaid_amt': fine.fine_amt - paid_amt,
+                        'paid': fine.paid
+                        }
+            else:
+                loan_data['fine'] = {
+                        'id': 0,
+                        'amount': 0,
+                        'paid': 'NA'
+                        }
+            result.append(loan_data)
+        return result
+
+    @classmethod
+    def get_fines_data(cls, fines):
+        '''Returns list of loan data for fines, as get_loans_data of their loans
+        '''
+        loans = []
+        for fine in fines:
+            loan = fine.loan
+            # reverse one to one, no query for loan.fine
+            loan.fine = fine
+            loans.append(loan)
+        return cls.get_loans_data(loans)
@@ -0,0 +1,247 @@
+'''Checkout and checkin, each in one transaction
+
+**Usage**
+    ls = LoanService()
+    try:
+        loan = ls.checkout(lib_branch_id=1, isbn='0151009376', card_no=1)
+        loan = ls.checkin(loan_id=loan.id)
+    except LoanError as e:
+        return Response({'msg': e.message}, status=e.status)
+
+    Many at once, in one transaction, with a result for each item:
+    results = ls.bulk_checkout(lib_branch_id=1, items=[{'isbn': '0151009376', 'card_no': 1}])
+    results = ls.bulk_checkin(loan_ids=[1, 2])
+
+Available copies change with a conditional UPDATE (no_of_copies > 0 for checkout,
+date_in IS NULL for checkin), so concurrent requests cannot oversell a copy or
+check in a loan twice. Checkouts of one borrower are serialized by locking the
+borrower row, so the borrow limit holds under concurrency too.
+Each transaction starts with its UPDATE, so SQLite takes the write lock up front
+and waits for it, instead of failing to upgrade a read lock.
+Checked in copies go to the next hold first, see librapp/lib/hold_queue.py, and a
+borrower with a ready hold checks out the copy kept for them.
+'''
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.borrower_eligibility import BorrowerEligibility
+from librapp.lib.hold_queue import HoldQueue
+from librapp.lib.search_cache import search_cache
+
+
+class LoanError(Exception):
+    def __init__(self, message, status=400):
+        super(LoanError, self).__init__(message)
+        self.status = status
+
+
+class LoanService(object):
+
+    LOAN_DAYS = 14
+    be = BorrowerEligibility()
+    hq = HoldQueue()
+
+    def checkout(self, lib_branch_id, isbn, card_no):
+        '''Creates a BookLoan and takes one available copy, returns the BookLoan
+        '''
+        try:
+            with transaction.atomic():
+                loan = self._checkout(lib_branch_id, isbn, card_no)
+        except IntegrityError:
+            # unique (book, card_no), borrower had this copy before
+            raise LoanError('Could not create Loan Entry')
+        search_cache.invalidate_availability(isbn, lib_branch_id)
+        return loan
+
+    def _checkout(self, lib_branch_id, isbn, card_no):
+        # take a copy first, only if one is available. The copy row stays locked
+        # until commit, checks below roll it back
+        copies = models.BookCopy.objects.filter(isbn_id=isbn, lib_branch_id=lib_branch_id)
+        # a copy kept for a ready hold of the borrower is already out of no_of_copies
+        if (not self.hq.fulfill(lib_branch_id, isbn, card_no) and
+                not copies.filter(no_of_copies__gt=0).update(no_of_copies=F('no_of_copies') - 1)):
+            book_copy_id = copies.values_list('id', flat=True).first()
+            if book_copy_id is None:
+                raise LoanError('Could not create Loan Entry')
+            # borrower checks come before availability, eg: the borrower holds the only copy
+            msg = self.be.get_reason(self.be.get_eligibility(card_no, book_copy_id=book_copy_id))
+            raise LoanError(msg or 'Book is not available')
+        book_copy = copies.get()
+
+        try:
+            # lock borrower row, checkouts of one borrower run one at a time
+            models.Borrower.objects.select_for_update().get(card_no=card_no)
+        except models.Borrower.DoesNotExist:
+            raise LoanError('Could not create Loan Entry')
+
+        msg = self.be.get_reason(self.be.get_eligibility(card_no, book_copy_id=book_copy.id))
+        if msg is not None:
+            raise LoanError(msg)
+
+        book_loan_row = {
+                'book': book_copy,
+                'card_no_id': card_no,
+                'due_date': timezone.now() + timedelta(self.LOAN_DAYS)
+                }
+        return models.BookLoan.objects.create(**book_loan_row)
+
+    def checkin(self, loan_id):
+        '''Sets date_in of the BookLoan and returns its copy, to the next hold if any.
+        Returns the BookLoan
+        '''
+        with transaction.atomic():
+            now = timezone.now()
+            # only one concurrent checkin of a loan updates the row
+            if not models.BookLoan.objects.filter(id=loan_id, date_in=None).update(date_in=now):
+                if models.BookLoan.objects.filter(id=loan_id).exists():
+                    raise LoanError('Book is already checked in.')
+                raise LoanError('Could not update Loan Entry')
+            loan = models.BookLoan.objects.select_related('book').get(id=loan_id)
+            self.hq.release({loan.book_id: 1}, now)
+        search_cache.invalidate_availability(loan.book.isbn_id, loan.book.lib_branch_id)
+        return loan
+
+    @staticmethod
+    def get_loan_data(loan_id, book_copy_id, card_no, isbn):
+        return {
+            'id': loan_id,
+            'book_copy_id': book_copy_id,
+            'card_no': card_no,
+            'isbn': isbn,
+            }
+
+    @staticmethod
+    def _add_copies(copy_counts, sign=1):
+        '''Adds sign * count to no_of_copies of each copy in {book_copy_id: count},
+        one UPDATE per distinct count. Returns number of rows updated
+        '''
+        by_count = defaultdict(list)
+        for copy_id, count in copy_counts.iteritems():
+            by_count[count].append(copy_id)
+        updated = 0
+        for count, copy_ids in by_count.iteritems():
+            copies = models.BookCopy.objects.filter(id__in=copy_ids)
+            if sign < 0:
+                copies = copies.filter(no_of_copies__gte=count)
+            updated += copies.update(no_of_copies=F('no_of_copies') + sign * count)
+        return updated
+
+    def bulk_checkin(self, loan_ids):
+        '''Checks in loans in one transaction, returns a result for each loan id, in order
+            ok     : {'status': 200, 'id', 'book_copy_id', 'card_no', 'isbn'}
+            error  : {'status': 400, 'id', 'msg'}
+        '''
+        results = []
+        with transaction.atomic():
+            now = timezone.now()
+            fields = ('id', 'book_id', 'card_no_id', 'date_in', 'book__isbn_id', 'book__lib_branch_id')
+            loans = models.BookLoan.objects.select_for_update().filter(id__in=loan_ids).values_list(*fields)
+            loans = dict((_[0], _) for _ in loans)
+            checkin_ids = set()
+            copy_counts = defaultdict(int)
+            for loan_id in loan_ids:
+                loan = loans.get(loan_id)
+                if loan is None:
+                    results.append({'status': 400, 'id': loan_id, 'msg': 'Could not update Loan Entry'})
+                elif loan[3] is not None or loan_id in checkin_ids:
+                    results.append({'status': 400, 'id': loan_id, 'msg': 'Book is already checked in.'})
+                else:
+                    loan_id, book_copy_id, card_no, date_in, isbn, lib_branch_id = loan
+                    checkin_ids.add(loan_id)
+                    copy_counts[book_copy_id] += 1
+                    result = self.get_loan_data(loan_id, book_copy_id, card_no, isbn)
+                    result['status'] = 200
+                    results.append(result)
+            if checkin_ids:
+                models.BookLoan.objects.filter(id__in=checkin_ids, date_in=None).update(date_in=now)
+                self.hq.release(copy_counts, now)
+        for loan_id in checkin_ids:
+            search_cache.invalidate_availability(loans[loan_id][4], loans[loan_id][5])
+        return results
+
+    def bulk_checkout(self, lib_branch_id, items):
+        '''Checks out items [{'isbn', 'card_no'}] at a branch in one transaction.
+        Returns a result for each item, in order
+            ok     : {'status': 200, 'id', 'book_copy_id', 'card_no', 'isbn'}
+            error  : {'status': 400, 'isbn', 'card_no', 'msg'}
+        '''
+        results = []
+        with transaction.atomic():
+            isbns = set(_['isbn'] for _ in items)
+            copies = models.BookCopy.objects.select_for_update().filter(lib_branch_id=lib_branch_id, isbn_id__in=isbns)
+            copies = dict((isbn, (copy_id, no_of_copies))
+                          for copy_id, isbn, no_of_copies in copies.values_list('id', 'isbn_id', 'no_of_copies'))
+            card_nos = set(_['card_no'] for _ in items)
+            borrowers = models.Borrower.objects.select_for_update().filter(card_no__in=card_nos)
+            card_nos = set(borrowers.values_list('card_no', flat=True))
+            eligibilities = self.be.get_eligibilities(list(card_nos))
+
+            # (card_no, book_copy_id) of existing loans, unique together
+            copy_ids = [copy_id for copy_id, no_of_copies in copies.itervalues()]
+            loans = models.BookLoan.objects.filter(card_no_id__in=card_nos, book_id__in=copy_ids)
+            active, returned = set(), set()
+            for card_no, book_copy_id, date_in in loans.values_list('card_no_id', 'book_id', 'date_in'):
+                (active if date_in is None else returned).add((card_no, book_copy_id))
+            # (card_no, book_copy_id): hold id, copy kept for the borrower, out of no_of_copies
+            holds = models.Hold.objects.select_for_update().filter(
+                    card_no_id__in=card_nos, book_id__in=copy_ids, status=models.Hold.READY)
+            ready_holds = dict(((card_no, copy_id), hold_id)
+                               for hold_id, card_no, copy_id in holds.values_list('id', 'card_no_id', 'book_id'))
+            fulfilled = []
+
+            due_date = timezone.now() + timedelta(self.LOAN_DAYS)
+            new_loans = []
+            copy_counts = defaultdict(int)
+            for item in items:
+                isbn, card_no = item['isbn'], item['card_no']
+                msg = None
+                if isbn not in copies or card_no not in card_nos:
+                    msg = 'Could not create Loan Entry'
+                else:
+                    copy_id, no_of_copies = copies[isbn]
+                    eligibility = dict(eligibilities[card_no], has_copy_loan=(card_no, copy_id) in active)
+                    msg = self.be.get_reason(eligibility)
+                    if (msg is None and (card_no, copy_id) not in ready_holds and
+                            no_of_copies - copy_counts[copy_id] <= 0):
+                        msg = 'Book is not available'
+                    if msg is None and (card_no, copy_id) in returned:
+                        msg = 'Could not create Loan Entry'
+                if msg is not None:
+                    results.append({'status': 400, 'isbn': isbn, 'card_no': card_no, 'msg': msg})
+                    continue
+                active.add((card_no, copy_id))
+                eligibilities[card_no]['active_loans'] += 1
+                if (card_no, copy_id) in ready_holds:
+                    fulfilled.append(ready_holds.pop((card_no, copy_id)))
+                else:
+                    copy_counts[copy_id] += 1
+                new_loans.append(models.BookLoan(book_id=copy_id, card_no_id=card_no, due_date=due_date))
+                result = self.get_loan_data(None, copy_id, card_no, isbn)
+                result['status'] = 200
+                results.append(result)
+
+            if new_loans:
+                if self._add_copies(copy_counts, sign=-1) != len(copy_counts):
+                    # copies are locked, should not happen
+                    raise LoanError('Book is not available')
+                if fulfilled:
+                    models.Hold.objects.filter(id__in=fulfilled).update(status=models.Hold.FULFILLED)
+                models.BookLoan.objects.bulk_create(new_loans)
+                # bulk_create does not set ids on MySQL
+                created = models.BookLoan.objects.filter(
+                        card_no_id__in=[_.card_no_id for _ in new_loans],
+                        book_id__in=set(_.book_id for _ in new_loans), date_in=None)
+                loan_ids = dict(((card_no, copy_id), loan_id)
+                                for loan_id, card_no, copy_id in created.values_list('id', 'card_no_id', 'book_id'))
+                for result in results:
+                    if result['status'] == 200:
+                        result['id'] = loan_ids[(result['card_no'], result['book_copy_id'])]
+        for isbn in set(_['isbn'] for _ in results if _['status'] == 200):
+            search_cache.invalidate_availability(isbn, lib_branch_id)
+        return results
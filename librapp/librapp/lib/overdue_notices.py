@@ -0,0 +1,78 @@
+'''Overdue notices, one per loan when it becomes overdue, run periodically by librapp/bin/overdue_notices.py
+
+**Usage**
+    notices = OverdueNotices()
+    run = notices.run(write=send)  # OverdueNoticeRun, send(notice) is called for each notice
+        notice: {'loan_id', 'card_no', 'fname', 'lname', 'email', 'isbn', 'title',
+                 'lib_branch_id', 'branch_name', 'due_date', 'fine_amt'}
+
+Each run gives notices for active loans that became overdue since the last run, read
+from the OverdueTracker, the first run for all overdue loans. fine_amt is as of the
+last FineAccrual run, 0 if none yet.
+'''
+
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.overdue_tracker import OverdueTracker
+
+
+class OverdueNotices(object):
+
+    BATCH_SIZE = 500
+
+    def __init__(self, tracker=None):
+        self.tracker = tracker or OverdueTracker()
+
+    @staticmethod
+    def get_last_run():
+        runs = models.OverdueNoticeRun.objects.filter(finished_at__isnull=False)
+        return runs.order_by('-as_of').first()
+
+    def get_notices(self, loan_ids):
+        '''Returns notices for loan_ids still active, in loan_ids order
+        '''
+        fields = ('id', 'card_no_id', 'card_no__fname', 'card_no__lname', 'card_no__email',
+                  'book__isbn_id', 'book__isbn__title', 'book__lib_branch_id',
+                  'book__lib_branch__branch_name', 'due_date', 'fine__fine_amt')
+        loans = models.BookLoan.objects.filter(id__in=loan_ids, date_in=None).values_list(*fields)
+        notices = {}
+        for loan_id, card_no, fname, lname, email, isbn, title, lib_branch_id, branch_name, due_date, fine_amt in loans:
+            notices[loan_id] = {
+                    'loan_id': loan_id,
+                    'card_no': card_no,
+                    'fname': fname,
+                    'lname': lname,
+                    'email': email,
+                    'isbn': isbn,
+                    'title': title,
+                    'lib_branch_id': lib_branch_id,
+                    'branch_name': branch_name,
+                    'due_date': due_date.isoformat(),
+                    'fine_amt': fine_amt or 0,
+                    }
+        return [notices[_] for _ in loan_ids if _ in notices]
+
+    def run(self, write, now=None, batch_size=None):
+        '''Calls write(notice) for each loan that became overdue since the last run,
+        oldest due first. Returns the OverdueNoticeRun
+        '''
+        now = now or timezone.now()
+        batch_size = batch_size or self.BATCH_SIZE
+        last_run = self.get_last_run()
+        since = last_run.as_of if last_run is not None else None
+
+        notice_run = models.OverdueNoticeRun.objects.create(as_of=now)
+        self.tracker.refresh()
+        if since is None:
+            loan_ids = self.tracker.get_overdue(now)
+        else:
+            loan_ids = self.tracker.get_overdue_since(since, now)
+        for start in xrange(0, len(loan_ids), batch_size):
+            for notice in self.get_notices(loan_ids[start:start + batch_size]):
+                write(notice)
+                notice_run.notices += 1
+
+        notice_run.finished_at = timezone.now()
+        notice_run.save()
+        return notice_run
@@ -0,0 +1,132 @@
+'''In-process index of active loans ordered by due date, per branch
+
+**Usage**
+    tracker = OverdueTracker()
+    tracker.refresh()                                      # rebuilds on first use, then reads changes only
+    loan_ids = tracker.get_overdue(now)                    # due_date < now, oldest due first
+    loan_ids = tracker.get_overdue(now, lib_branch_id=1)
+    loan_ids = tracker.get_overdue_since(since, now)       # became overdue in since <= due_date < now
+
+Each branch keeps a sorted list of (due_date, loan_id), so overdue lookups are a bisect
+and a slice, without reading BookLoan. refresh reads only loans checked out or checked in
+since the last refresh, by id and the (date_in, date_out) index, and rebuilds every
+REBUILD_SECONDS to drop anything it missed, eg: deleted loans, or due_date changed in place.
+
+Used by the batch jobs, FineAccrual and OverdueNotices, which keep one tracker per process.
+Listing overdue loans in GET /books/loans/ pages through the database index instead.
+'''
+
+import bisect
+import heapq
+import threading
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from librapp import models
+
+
+class OverdueTracker(object):
+
+    REBUILD_SECONDS = 3600
+    # loans committed up to this late are still seen by the next refresh
+    REFRESH_MARGIN = timedelta(seconds=300)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._branches = {} # lib_branch_id: sorted [(due_date, loan_id)]
+            self._loans = {} # loan_id: (lib_branch_id, due_date)
+            self._max_id = 0
+            self.built_at = None
+            self.refreshed_at = None
+
+    def __len__(self):
+        return len(self._loans)
+
+    @staticmethod
+    def _get_active_loans():
+        loans = models.BookLoan.objects.filter(date_in=None)
+        return loans.values_list('id', 'book__lib_branch_id', 'due_date')
+
+    def rebuild(self):
+        now = timezone.now()
+        branches = {}
+        loans = {}
+        for loan_id, lib_branch_id, due_date in self._get_active_loans().iterator():
+            branches.setdefault(lib_branch_id, []).append((due_date, loan_id))
+            loans[loan_id] = (lib_branch_id, due_date)
+        for entries in branches.itervalues():
+            entries.sort()
+        with self._lock:
+            self._branches = branches
+            self._loans = loans
+            self._max_id = max(loans) if loans else 0
+            self.built_at = now
+            self.refreshed_at = now
+
+    def refresh(self):
+        '''Adds loans checked out and removes loans checked in since the last refresh.
+        Rebuilds if never built, or built more than REBUILD_SECONDS ago.
+        '''
+        now = timezone.now()
+        if self.built_at is None or (now - self.built_at).total_seconds() > self.REBUILD_SECONDS:
+            self.rebuild()
+            return
+        since = self.refreshed_at - self.REFRESH_MARGIN
+        # new loans by id, and by date_out for ids committed out of order, whatever their due_date
+        new_loans = self._get_active_loans().filter(Q(id__gt=self._max_id) | Q(date_out__gte=since))
+        returned = models.BookLoan.objects.filter(date_in__gte=since).values_list('id', flat=True)
+        new_loans, returned = list(new_loans), list(returned)
+        with self._lock:
+            for loan_id, lib_branch_id, due_date in new_loans:
+                self._add(loan_id, lib_branch_id, due_date)
+            for loan_id in returned:
+                self._remove(loan_id)
+            self.refreshed_at = now
+
+    def _add(self, loan_id, lib_branch_id, due_date):
+        if loan_id in self._loans:
+            return
+        self._loans[loan_id] = (lib_branch_id, due_date)
+        bisect.insort(self._branches.setdefault(lib_branch_id, []), (due_date, loan_id))
+        self._max_id = max(self._max_id, loan_id)
+
+    def _remove(self, loan_id):
+        try:
+            lib_branch_id, due_date = self._loans.pop(loan_id)
+        except KeyError:
+            return
+        entries = self._branches[lib_branch_id]
+        del entries[bisect.bisect_left(entries, (due_date, loan_id))]
+
+    def _get_range(self, since, now, lib_branch_id):
+        '''Returns [(due_date, loan_id)] with since <= due_date < now, since None for no lower bound
+        '''
+        with self._lock:
+            if lib_branch_id is not None:
+                branches = [self._branches.get(int(lib_branch_id), [])]
+            else:
+                branches = self._branches.values()
+            ranges = []
+            for entries in branches:
+                # (due_date,) sorts before any (due_date, loan_id)
+                start = bisect.bisect_left(entries, (since,)) if since is not None else 0
+                ranges.append(entries[start:bisect.bisect_left(entries, (now,))])
+        return list(heapq.merge(*ranges))
+
+    def get_overdue(self, now=None, lib_branch_id=None):
+        '''Returns ids of active loans with due_date < now, ordered by due date
+        '''
+        now = now or timezone.now()
+        return [loan_id for due_date, loan_id in self._get_range(None, now, lib_branch_id)]
+
+    def get_overdue_since(self, since, now=None, lib_branch_id=None):
+        '''Returns ids of active loans that became overdue since, since <= due_date < now
+        '''
+        now = now or timezone.now()
+        return [loan_id for due_date, loan_id in self._get_range(since, now, lib_branch_id)]
@@ -10,12 +10,15 @@
 
 import logging
 import re
+from decimal import Decimal, InvalidOperation
 from rest_framework import status
 from django.contrib.auth import authenticate, login
 
 from librapp import models
+from librapp.lib.cursor import decode_cursor
 from librapp.lib.rbac import RBAC
 from librapp.utils.date_utils import DateUtils
+from librapp.utils.isbn_utils import ISBNUtils
 
 
 class ValidationError(Exception):
@@ -40,6 +43,7 @@ class RequestValidation(object):
     '''
 
     dutils = DateUtils()
+    iutils = ISBNUtils()
     rbac = RBAC()
 
     def __init__(self, request=None, checks=None, fields=None, pk=None):
@@ -176,9 +180,20 @@ class RequestValidation(object):
             raise ValidationError(msg, self._get_http_code(400))
 
     def _is_valid_amount(self, field):
-        data = float(self._get_data(field))
-        if float < 0:
-            msg = '{0}: {1} is negative and not valid.'.format(field.name, data)
+        data = self._get_data(field)
+        msg = '{0}: {1} is not a valid amount.'.format(field.name, data)
+        try:
+            amount = Decimal(str(data))
+            # NaN and Infinity parse, but raise on compare or quantize
+            if not amount.is_finite():
+                raise ValidationError(msg, self._get_http_code(400))
+            if amount <= 0:
+                msg = '{0}: {1} is not positive and not valid.'.format(field.name, data)
+                raise ValidationError(msg, self._get_http_code(400))
+            if amount != amount.quantize(Decimal('0.01')):
+                msg = '{0}: {1} has more than 2 decimal places.'.format(field.name, data)
+                raise ValidationError(msg, self._get_http_code(400))
+        except InvalidOperation:
             raise ValidationError(msg, self._get_http_code(400))
 
     def _ssn_does_not_exist(self, field):
@@ -206,6 +221,27 @@ class RequestValidation(object):
             raise ValidationError(msg, self._get_http_code(400))
 
 
+    def _is_valid_limit(self, field):
+        data = int(self._get_data(field))
+        if data < 1:
+            msg = '{0}: {1} must be at least 1.'.format(field.name, data)
+            raise ValidationError(msg, self._get_http_code(400))
+
+    def _is_valid_offset(self, field):
+        data = int(self._get_data(field))
+        if data < 0:
+            msg = '{0}: {1} is negative and not valid.'.format(field.name, data)
+            raise ValidationError(msg, self._get_http_code(400))
+
+    def _is_valid_cursor(self, field):
+        data = self._get_data(field)
+        try:
+            decode_cursor(data)
+        except ValueError:
+            msg = '{0}: {1} is not a valid cursor.'.format(field.name, data)
+            raise ValidationError(msg, self._get_http_code(400))
+
+
     ######## Auth and User Validation ########
 
     def _login(self):
@@ -243,3 +279,49 @@ class RequestValidation(object):
         if len(data) < 4:
             msg = 'Search string must be at least 4 character long'
             raise ValidationError(msg, self._get_http_code(400))
+
+    def _check_suggest_string(self, field):
+        data = self._get_data(field)
+        if len(data.strip()) < 2:
+            msg = 'Suggest string must be at least 2 character long'
+            raise ValidationError(msg, self._get_http_code(400))
+
+    def _is_valid_isbn_list(self, field):
+        data = self._get_data(field)
+        if len(data) > 1000:
+            msg = '{0}: max 1000 ISBNs per request. Found: {1}'.format(field.name, len(data))
+            raise ValidationError(msg, self._get_http_code(400))
+        for isbn in data:
+            if not isinstance(isbn, (str, unicode)) or not self.iutils.is_isbn_shaped(isbn):
+                msg = '{0}: {1} is not an ISBN-10 or ISBN-13.'.format(field.name, isbn)
+                raise ValidationError(msg, self._get_http_code(400))
+
+    ######## Loan Validation ########
+    def _is_valid_loan_order(self, field):
+        data = self._get_data(field)
+        if data not in ('id', 'due_date'):
+            msg = '{0}: {1} is not valid. Options: id, due_date'.format(field.name, data)
+            raise ValidationError(msg, self._get_http_code(400))
+
+    def _is_valid_loan_id_list(self, field):
+        data = self._get_data(field)
+        if not data or len(data) > 500:
+            msg = '{0}: 1 to 500 loan ids per request. Found: {1}'.format(field.name, len(data))
+            raise ValidationError(msg, self._get_http_code(400))
+        for loan_id in data:
+            if not isinstance(loan_id, (int, long)) or isinstance(loan_id, bool):
+                msg = '{0}: {1} is not a loan id.'.format(field.name, loan_id)
+                raise ValidationError(msg, self._get_http_code(400))
+
+    def _is_valid_checkout_list(self, field):
+        data = self._get_data(field)
+        if not data or len(data) > 500:
+            msg = '{0}: 1 to 500 items per request. Found: {1}'.format(field.name, len(data))
+            raise ValidationError(msg, self._get_http_code(400))
+        for item in data:
+            if (not isinstance(item, dict)
+                    or not isinstance(item.get('isbn'), (str, unicode))
+                    or not isinstance(item.get('card_no'), (int, long))
+                    or isinstance(item.get('card_no'), bool)):
+                msg = '{0}: {1} must have isbn string and card_no integer.'.format(field.name, item)
+                raise ValidationError(msg, self._get_http_code(400))
@@ -0,0 +1,88 @@
+'''Search result cache
+
+Three parts, so volatile availability can be dropped without losing the rest:
+    - results      : (normalized query, lib_branch_id, fuzzy) -> ranked [(isbn, score), ...]
+    - books        : isbn -> {'isbn', 'title', 'cover', 'authors'}
+    - availability : (isbn, lib_branch_id) -> BookCopy rows
+
+Loan checkout and checkin change BookCopy.no_of_copies, and call
+invalidate_availability for that isbn and branch.
+
+**Usage**
+    from librapp.lib.search_cache import search_cache
+    ranked = search_cache.get_ranked(query, lib_branch_id)
+
+Settings: SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_CACHE_AVAILABILITY_TTL (seconds).
+The cache is per process, availability ttl bounds how long other processes can serve stale copies.
+'''
+
+from django.conf import settings
+
+from librapp.lib.lru_cache import LRUCache
+from librapp.lib.search_engine import normalize
+
+
+class SearchCache(object):
+
+    def __init__(self, max_size=None, ttl=None, availability_ttl=None):
+        if max_size is None:
+            max_size = getattr(settings, 'SEARCH_CACHE_SIZE', 1000)
+        if ttl is None:
+            ttl = getattr(settings, 'SEARCH_CACHE_TTL', 300)
+        if availability_ttl is None:
+            availability_ttl = getattr(settings, 'SEARCH_CACHE_AVAILABILITY_TTL', 30)
+        self.results = LRUCache(max_size=max_size, ttl=ttl)
+        # a result page holds many books
+        self.books = LRUCache(max_size=max_size * 20, ttl=ttl)
+        self.availability = LRUCache(max_size=max_size * 20, ttl=availability_ttl)
+
+    @staticmethod
+    def _get_query_key(query, lib_branch_id, fuzzy):
+        return (' '.join(normalize(query).split()), int(lib_branch_id or 0), bool(fuzzy))
+
+    def get_ranked(self, query, lib_branch_id=0, fuzzy=False):
+        return self.results.get(self._get_query_key(query, lib_branch_id, fuzzy))
+
+    def set_ranked(self, query, lib_branch_id, ranked, fuzzy=False):
+        self.results.set(self._get_query_key(query, lib_branch_id, fuzzy), ranked)
+
+    def get_books(self, isbns):
+        '''Returns {isbn: book data} for the cached isbns
+        '''
+        found = {}
+        for isbn in isbns:
+            book = self.books.get(isbn)
+            if book is not None:
+                found[isbn] = book
+        return found
+
+    def set_book(self, isbn, book):
+        self.books.set(isbn, book)
+
+    def get_availability(self, isbns, lib_branch_id=0):
+        '''Returns {isbn: BookCopy rows} for the cached isbns
+        '''
+        lib_branch_id = int(lib_branch_id or 0)
+        found = {}
+        for isbn in isbns:
+            copies = self.availability.get((isbn, lib_branch_id))
+            if copies is not None:
+                found[isbn] = copies
+        return found
+
+    def set_availability(self, isbn, lib_branch_id, copies):
+        self.availability.set((isbn, int(lib_branch_id or 0)), copies)
+
+    def invalidate_availability(self, isbn, lib_branch_id):
+        '''Drops cached copies of isbn in the branch, and of isbn in all branches
+        '''
+        self.availability.delete((isbn, int(lib_branch_id)))
+        self.availability.delete((isbn, 0))
+
+    def clear(self):
+        self.results.clear()
+        self.books.clear()
+        self.availability.clear()
+
+
+search_cache = SearchCache()
@@ -0,0 +1,93 @@
+'''Builds BookSearchDocument rows from Book, Author, BookAuthors
+
+**Usage**
+    helper = SearchDocumentHelper()
+    helper.update(isbns=['0380699710'])  # after a catalog change
+    helper.rebuild()                     # all books, in batches
+
+    In migrations, pass the historical models:
+    helper = SearchDocumentHelper(apps=apps)
+'''
+
+from collections import defaultdict
+
+from django.utils import timezone
+
+
+class SearchDocumentHelper(object):
+
+    def __init__(self, apps=None):
+        if apps is None:
+            from librapp import models
+            self.Book = models.Book
+            self.BookAuthors = models.BookAuthors
+            self.BookSearchDocument = models.BookSearchDocument
+        else:
+            self.Book = apps.get_model('librapp', 'Book')
+            self.BookAuthors = apps.get_model('librapp', 'BookAuthors')
+            self.BookSearchDocument = apps.get_model('librapp', 'BookSearchDocument')
+        # BookSearchDocument.AUTHOR_SEP, historical models in migrations do not have it
+        self.sep = '|'
+
+    def get_documents(self, isbns):
+        '''Returns {isbn: document fields}, with two queries
+        '''
+        books = self.Book.objects.filter(isbn__in=isbns).values_list('isbn', 'title', 'isbn13')
+        authors = defaultdict(list)
+        book_author = self.BookAuthors.objects.filter(isbn_id__in=isbns).order_by('id')
+        for isbn, name in book_author.values_list('isbn_id', 'author__name'):
+            authors[isbn].append(name)
+
+        documents = {}
+        for isbn, title, isbn13 in books:
+            names = self.sep.join(authors[isbn])
+            documents[isbn] = {
+                'title': title.lower(),
+                'authors': names,
+                'authors_norm': names.lower(),
+                'isbn13': isbn13,
+                }
+        return documents
+
+    def update(self, isbns):
+        '''Creates, updates or deletes the documents of isbns
+        '''
+        isbns = list(set(isbns))
+        if not isbns:
+            return
+        documents = self.get_documents(isbns)
+        existing = set(self.BookSearchDocument.objects.filter(book_id__in=isbns).values_list('book_id', flat=True))
+
+        new = []
+        now = timezone.now()
+        for isbn, fields in documents.iteritems():
+            if isbn in existing:
+                # update() skips auto_now, updated_at is what search index reloads check
+                self.BookSearchDocument.objects.filter(book_id=isbn).update(updated_at=now, **fields)
+            else:
+                new.append(self.BookSearchDocument(book_id=isbn, **fields))
+        if new:
+            self.BookSearchDocument.objects.bulk_create(new)
+
+        deleted = [_ for _ in existing if _ not in documents]
+        if deleted:
+            self.BookSearchDocument.objects.filter(book_id__in=deleted).delete()
+
+    def rebuild(self, batch_size=1000):
+        '''Recreates documents of all books, batch_size books at a time.
+        Returns number of documents.
+        '''
+        self.BookSearchDocument.objects.all().delete()
+        count = 0
+        last_isbn = ''
+        while True:
+            books = self.Book.objects.filter(isbn__gt=last_isbn).order_by('isbn')
+            isbns = list(books.values_list('isbn', flat=True)[:batch_size])
+            if not isbns:
+                break
+            documents = self.get_documents(isbns)
+            rows = [self.BookSearchDocument(book_id=isbn, **fields) for isbn, fields in documents.iteritems()]
+            self.BookSearchDocument.objects.bulk_create(rows)
+            count += len(rows)
+            last_isbn = isbns[-1]
+        return count
@@ -0,0 +1,475 @@
+'''Search engines for book title and author name search
+
+**Usage**
+    engine = get_search_engine()
+    title_hits, author_hits = engine.search(query)
+
+    Hits are lists of (isbn, title) tuples.
+
+**Backends**
+    Picked with SEARCH_BACKEND in settings.
+
+    ================== ==========================================================
+    name               Description
+    ================== ==========================================================
+    icontains          LIKE '%q%' query against BookSearchDocument table
+    fulltext           MySQL FULLTEXT index on BookSearchDocument (FTS5 table on
+                       SQLite), word prefix match
+    index              in-process trigram inverted index, built from the database
+                       or loaded from SEARCH_INDEX_SNAPSHOT. Uses icontains until
+                       the index is ready.
+    ================== ==========================================================
+
+    Typeahead suggestions always come from the in-process index:
+        index = get_search_engine('index').get_index()
+        if index is not None:
+            suggestions = index.suggest_index.suggest(prefix, limit=10)
+'''
+
+import bisect
+import cPickle as pickle
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max, Q
+from django.utils.encoding import force_text
+
+from librapp import models
+
+
+def normalize(text):
+    return force_text(text).lower()
+
+
+def get_trigrams(text):
+    return set(text[i:i + 3] for i in xrange(len(text) - 2))
+
+
+class SearchEngine(object):
+    '''Engines define search(query), returning (title_hits, author_hits), lists of (isbn, title)
+    '''
+    name = ''
+
+    def is_ready(self):
+        return True
+
+
+class IContainsSearchEngine(SearchEngine):
+    name = 'icontains'
+
+    def search(self, query):
+        # single table query on BookSearchDocument, title and authors are lowercase there
+        query = normalize(query)
+        doc_filter = Q(title__icontains=query) | Q(authors_norm__icontains=query)
+        docs = models.BookSearchDocument.objects.filter(doc_filter)
+        title_hits, author_hits = [], []
+        for isbn, title, authors in docs.values_list('book_id', 'title', 'authors_norm'):
+            if query in title:
+                title_hits.append((isbn, title))
+            if query in authors:
+                author_hits.append((isbn, title))
+        return title_hits, author_hits
+
+
+class FullTextSearchEngine(SearchEngine):
+    '''Database full-text search on BookSearchDocument title and authors_norm.
+
+    MySQL uses the FULLTEXT index, SQLite the FTS5 table, both added in migration 0008.
+    Every query word must match the start of a word, so unlike icontains
+    'ichard' does not find 'Richard'. Words shorter than MIN_WORD_LEN are not indexed
+    by MySQL defaults and are dropped; other databases, and queries with no word
+    left, use icontains.
+    '''
+    name = 'fulltext'
+    MIN_WORD_LEN = 3
+    FTS_TABLE = 'librapp_booksearchdocument_fts'
+
+    def __init__(self):
+        self.fallback = IContainsSearchEngine()
+
+    def is_ready(self):
+        return connection.vendor in ('mysql', 'sqlite')
+
+    def get_words(self, query):
+        words = re.findall(r'\w+', normalize(query), re.UNICODE)
+        return [_ for _ in words if len(_) >= self.MIN_WORD_LEN]
+
+    def search(self, query):
+        words = self.get_words(query)
+        if not words or not self.is_ready():
+            return self.fallback.search(query)
+        if connection.vendor == 'mysql':
+            rows = self._search_mysql(words)
+        else:
+            rows = self._search_sqlite(words)
+        title_hits, author_hits = [], []
+        for isbn, title, authors in rows:
+            if all(_ in title for _ in words):
+                title_hits.append((isbn, title))
+            else:
+                # some words only in authors
+                author_hits.append((isbn, title))
+        return title_hits, author_hits
+
+    def _search_mysql(self, words):
+        match = u' '.join(u'+{0}*'.format(_) for _ in words)
+        docs = models.BookSearchDocument.objects.extra(
+                where=['MATCH (title, authors_norm) AGAINST (%s IN BOOLEAN MODE)'], params=[match])
+        return docs.values_list('book_id', 'title', 'authors_norm')
+
+    def _search_sqlite(self, words):
+        match = u' '.join(u'"{0}"*'.format(_) for _ in words)
+        sql = 'SELECT book_id, title, authors_norm FROM {0} WHERE {0} MATCH %s'.format(self.FTS_TABLE)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [match])
+            return cursor.fetchall()
+
+
+class SuggestIndex(object):
+    '''Sorted prefix index over titles and author names, for typeahead.
+
+    Every title and name is indexed from its start, and from the start of each of its words.
+    A prefix is looked up with a binary search, completions are the following keys
+    that still start with the prefix.
+    '''
+
+    def __init__(self, books=None, authors=None):
+        '''
+        books   : list of (isbn, title)
+        authors : list of (author_id, name)
+        '''
+        # (display text, type, isbn)
+        self.items = []
+        starts, words = [], []
+        seen = set()
+        for kind, rows in (('title', books), ('author', authors)):
+            for key, text in (rows if rows else []):
+                norm = self.normalize(text)
+                if not norm or (kind, norm) in seen:
+                    continue
+                seen.add((kind, norm))
+                i = len(self.items)
+                self.items.append((text, kind, key if kind == 'title' else None))
+                starts.append((norm, i))
+                tokens = norm.split(' ')
+                for j in xrange(1, len(tokens)):
+                    words.append((' '.join(tokens[j:]), i))
+        starts.sort()
+        words.sort()
+        self.start_keys = [key for key, i in starts]
+        self.start_items = [i for key, i in starts]
+        self.word_keys = [key for key, i in words]
+        self.word_items = [i for key, i in words]
+
+    @staticmethod
+    def normalize(text):
+        return ' '.join(text.lower().split())
+
+    @staticmethod
+    def _complete(prefix, keys, items, limit):
+        found = []
+        i = bisect.bisect_left(keys, prefix)
+        while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+            found.append(items[i])
+            i += 1
+        return found
+
+    def suggest(self, prefix, limit=10):
+        '''Returns up to limit (text, type, isbn) completions.
+        Matches from the start of a title or name come before matches from a later word.
+        '''
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        found = self._complete(prefix, self.start_keys, self.start_items, limit)
+        if len(found) < limit:
+            # a title can match from several words, take extra and dedupe
+            more = self._complete(prefix, self.word_keys, self.word_items, limit * 4)
+            for i in more:
+                if i not in found:
+                    found.append(i)
+                if len(found) >= limit:
+                    break
+        return [self.items[i] for i in found]
+
+
+class SearchIndex(object):
+    '''Trigram inverted index over Book.title and Author.name.
+
+    A query matches a document when the query is a substring of it, same as icontains.
+    Posting lists of the query trigrams narrow down the candidates, and the
+    candidates are then checked for the substring.
+    '''
+
+    version = 3
+
+    def __init__(self, books=None, authors=None, book_authors=None):
+        '''
+        books        : list of (isbn, title)
+        authors      : list of (author_id, name)
+        book_authors : list of (author_id, isbn)
+        '''
+        self.books = books if books else []
+        self.authors = authors if authors else []
+        self.built_at = time.time()
+
+        self.titles = [normalize(title) for isbn, title in self.books]
+        self.names = [normalize(name) for author_id, name in self.authors]
+        self.title_grams, self.title_gram_counts = self._get_postings(self.titles)
+        self.name_grams, self.name_gram_counts = self._get_postings(self.names)
+        self.suggest_index = SuggestIndex(books=self.books, authors=self.authors)
+
+        book_index = dict((isbn, i) for i, (isbn, title) in enumerate(self.books))
+        author_index = dict((author_id, i) for i, (author_id, name) in enumerate(self.authors))
+        self.author_books = defaultdict(list)
+        for author_id, isbn in (book_authors if book_authors else []):
+            if author_id in author_index and isbn in book_index:
+                self.author_books[author_index[author_id]].append(book_index[isbn])
+
+    @staticmethod
+    def _get_postings(texts):
+        '''Returns (postings, trigram count of each text)
+        '''
+        postings = defaultdict(list)
+        counts = []
+        for i, text in enumerate(texts):
+            grams = get_trigrams(text)
+            counts.append(len(grams))
+            for gram in grams:
+                postings[gram].append(i)
+        return dict(postings), counts
+
+    @staticmethod
+    def _match(query, texts, postings):
+        grams = get_trigrams(query)
+        posting_lists = [postings.get(gram, []) for gram in grams]
+        shortest = min(posting_lists, key=len)
+        return [i for i in shortest if query in texts[i]]
+
+    @classmethod
+    def from_db(cls):
+        books = models.Book.objects.order_by('isbn').values_list('isbn', 'title')
+        authors = models.Author.objects.order_by('id').values_list('id', 'name')
+        book_authors = models.BookAuthors.objects.order_by('id').values_list('author_id', 'isbn_id')
+        return cls(books=list(books), authors=list(authors), book_authors=list(book_authors))
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, 'rb') as rf:
+            index = pickle.load(rf)
+        if getattr(index, 'version', None) != cls.version:
+            raise ValueError('Search index snapshot version mismatch: {0}'.format(file_path))
+        return index
+
+    def save(self, file_path):
+        # write and rename, so readers never see a partial snapshot
+        tmp_path = '{0}.tmp'.format(file_path)
+        with open(tmp_path, 'wb') as wf:
+            pickle.dump(self, wf, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_path, file_path)
+
+    def search(self, query):
+        '''Returns (title_hits, author_hits), or None if query is too short for trigrams
+        '''
+        query = normalize(query)
+        if len(query) < 3:
+            return None
+
+        title_hits = [self.books[i] for i in self._match(query, self.titles, self.title_grams)]
+        author_hits = []
+        for i in self._match(query, self.names, self.name_grams):
+            author_hits.extend(self.books[j] for j in self.author_books.get(i, []))
+        return title_hits, author_hits
+
+
+    @staticmethod
+    def _count_shared(grams, postings, max_postings, deadline):
+        '''Returns {doc: number of grams shared with the doc}.
+        Rarest grams are counted first. Grams in more than max_postings docs are skipped,
+        and counting stops at deadline, so a query never walks every document.
+        '''
+        shared = defaultdict(int)
+        posting_lists = sorted((postings.get(gram, []) for gram in grams), key=len)
+        for docs in posting_lists:
+            if len(docs) > max_postings or time.time() > deadline:
+                break
+            for doc in docs:
+                shared[doc] += 1
+        return shared
+
+    def fuzzy_search(self, query, limit=200, threshold=None, budget_ms=None):
+        '''Typo tolerant search by trigram similarity.
+        Returns list of (isbn, similarity), best first, deduped by isbn.
+
+        Author names are scored by trigram similarity: shared / (query + name - shared).
+        Titles are scored by the share of query trigrams found in the title,
+        as a query usually is a part of the title.
+        '''
+        if threshold is None:
+            threshold = getattr(settings, 'SEARCH_FUZZY_THRESHOLD', 0.4)
+        if budget_ms is None:
+            budget_ms = getattr(settings, 'SEARCH_FUZZY_BUDGET_MS', 50)
+        query = ' '.join(normalize(query).split())
+        grams = get_trigrams(query)
+        if not grams:
+            return []
+        n = float(len(grams))
+        deadline = time.time() + budget_ms / 1000.0
+
+        best = {}
+        max_postings = max(1000, len(self.titles) / 20)
+        shared = self._count_shared(grams, self.title_grams, max_postings, deadline)
+        for i, count in shared.iteritems():
+            similarity = count / n
+            if similarity >= threshold:
+                best[i] = similarity
+
+        max_postings = max(1000, len(self.names) / 20)
+        shared = self._count_shared(grams, self.name_grams, max_postings, deadline)
+        for i, count in shared.iteritems():
+            similarity = count / (n + self.name_gram_counts[i] - count)
+            if similarity < threshold:
+                continue
+            for j in self.author_books.get(i, []):
+                if best.get(j, 0) < similarity:
+                    best[j] = similarity
+
+        ranked = sorted(best.iteritems(), key=lambda item: (-item[1], self.titles[item[0]], item[0]))
+        return [(self.books[i][0], round(similarity, 3)) for i, similarity in ranked[:limit]]
+
+
+class InvertedIndexSearchEngine(SearchEngine):
+    '''Answers searches from an in-memory SearchIndex.
+
+    On first use the index is loaded from the snapshot file if there is one,
+    otherwise it is built from the database in a background thread.
+    Searches fall back to icontains until the index is ready.
+    Every SEARCH_INDEX_RELOAD_INTERVAL seconds, a changed snapshot is loaded again or,
+    with no snapshot, the index is built again if the catalog changed, see get_catalog_version.
+    The old index answers searches while the new one loads.
+
+    Production should write the snapshot with bin/rebuild_search_index.py, so web workers
+    do not each build the index from the database.
+    '''
+
+    name = 'index'
+
+    def __init__(self, snapshot_path=None):
+        self.snapshot_path = snapshot_path
+        self.fallback = IContainsSearchEngine()
+        self._index = None
+        self._snapshot_mtime = None
+        self._catalog_version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self._loading = False
+
+    def is_ready(self):
+        return self._index is not None
+
+    def get_index(self):
+        '''Returns SearchIndex, or None if it is not ready yet
+        '''
+        self._maybe_load()
+        return self._index
+
+    @staticmethod
+    def get_catalog_version():
+        '''Returns (document count, last updated_at) of BookSearchDocument, one indexed query.
+        Changes when a book is added, deleted, or its title or authors change
+        '''
+        docs = models.BookSearchDocument.objects.aggregate(count=Count('book_id'), updated_at=Max('updated_at'))
+        return docs['count'], docs['updated_at']
+
+    def rebuild(self):
+        '''Builds the index from the database in the calling thread
+        '''
+        version = self.get_catalog_version()
+        index = SearchIndex.from_db()
+        self._index = index
+        self._catalog_version = version
+        return index
+
+    def search(self, query):
+        index = self.get_index()
+        if index is not None:
+            hits = index.search(query)
+            if hits is not None:
+                return hits
+        return self.fallback.search(query)
+
+    def _get_snapshot_mtime(self):
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            return os.path.getmtime(self.snapshot_path)
+        return None
+
+    def _maybe_load(self):
+        now = time.time()
+        reload_interval = getattr(settings, 'SEARCH_INDEX_RELOAD_INTERVAL', 60)
+        if now - self._checked_at < reload_interval:
+            return
+        with self._lock:
+            if self._loading:
+                return
+            self._checked_at = now
+            mtime = self._get_snapshot_mtime()
+            version = None
+            if mtime is not None:
+                if self._index is not None and mtime == self._snapshot_mtime:
+                    return
+            else:
+                if not getattr(settings, 'SEARCH_INDEX_AUTOBUILD', True):
+                    return
+                version = self.get_catalog_version()
+                if self._index is not None and version == self._catalog_version:
+                    return
+            self._loading = True
+        thread = threading.Thread(target=self._load, args=(mtime, version))
+        thread.daemon = True
+        thread.start()
+
+    def _load(self, mtime, version):
+        try:
+            if mtime is not None:
+                self._index = SearchIndex.load(self.snapshot_path)
+                self._snapshot_mtime = mtime
+                self._catalog_version = None
+                logging.info('search index loaded from {0}'.format(self.snapshot_path))
+            else:
+                # version is read before the build, a change during the build is picked up next time
+                self._index = SearchIndex.from_db()
+                self._snapshot_mtime = None
+                self._catalog_version = version
+                logging.info('search index built from database')
+        except Exception as e:
+            logging.error('Could not load search index: {0}'.format(e))
+        finally:
+            self._loading = False
+            # background thread has its own db connection
+            connection.close()
+
+
+_engines = {}
+
+def get_search_engine(name=None):
+    '''Returns the search engine for name, defaults to SEARCH_BACKEND in settings
+    '''
+    if name is None:
+        name = getattr(settings, 'SEARCH_BACKEND', 'icontains')
+    if name not in _engines:
+        if name == IContainsSearchEngine.name:
+            _engines[name] = IContainsSearchEngine()
+        elif name == FullTextSearchEngine.name:
+            _engines[name] = FullTextSearchEngine()
+        elif name == InvertedIndexSearchEngine.name:
+            snapshot_path = getattr(settings, 'SEARCH_INDEX_SNAPSHOT', None)
+            _engines[name] = InvertedIndexSearchEngine(snapshot_path=snapshot_path)
+        else:
+            raise ValueError('Unknown search backend: {0}'.format(name))
+    return _engines[name]
@@ -0,0 +1,56 @@
+'''Ranks search hits
+
+**Usage**
+    ranker = SearchRanker()
+    ranked = ranker.rank(query, title_hits, author_hits)
+    # [(isbn, score), ...] best first, one entry per isbn
+
+**Score**
+    exact isbn > title prefix > title token > title substring > author match
+'''
+
+import re
+
+from librapp.lib.search_engine import normalize
+
+
+class SearchRanker(object):
+
+    SCORE_ISBN = 5
+    SCORE_TITLE_PREFIX = 4
+    SCORE_TITLE_TOKEN = 3
+    SCORE_TITLE = 2
+    SCORE_AUTHOR = 1
+
+    def score_title(self, query, title):
+        if title.startswith(query):
+            return self.SCORE_TITLE_PREFIX
+        if re.search(r'(^|\W){0}'.format(re.escape(query)), title, re.UNICODE):
+            return self.SCORE_TITLE_TOKEN
+        if query in title:
+            return self.SCORE_TITLE
+        return 0
+
+    def rank(self, query, title_hits, author_hits, isbn_hits=None):
+        '''
+        title_hits, author_hits, isbn_hits : lists of (isbn, title)
+        Returns list of (isbn, score), deduped by isbn.
+        Ties are ordered by title, then isbn, so pages are stable.
+        '''
+        query = normalize(query).strip()
+        best = {}
+
+        def add(isbn, title, score):
+            if isbn not in best or best[isbn][0] < score:
+                best[isbn] = (score, normalize(title))
+
+        for isbn, title in (isbn_hits if isbn_hits else []):
+            add(isbn, title, self.SCORE_ISBN)
+        for isbn, title in title_hits:
+            # a title hit always scores above an author match
+            add(isbn, title, max(self.score_title(query, normalize(title)), self.SCORE_TITLE))
+        for isbn, title in author_hits:
+            add(isbn, title, self.SCORE_AUTHOR)
+
+        ranked = sorted(best.iteritems(), key=lambda item: (-item[1][0], item[1][1], item[0]))
+        return [(isbn, score) for isbn, (score, title) in ranked]
@@ -1,54 +1,51 @@
-import datetime
-from librapp import models
+from decimal import Decimal
+
+from librapp.lib.cursor import decode_cursor, encode_cursor
+from librapp.lib.fine_accrual import FineAccrual
+from librapp.lib.loan_query import LoanQuery
 
 class ViewsHelper(object):
 
     @staticmethod
     def get_loan_data(loan):
-        book_copy = loan.book
-        date_in = loan.date_in
-        if date_in is not None:
-            date_in = date_in.isoformat()
-        loan_data = {
-            'id': loan.id,
-            'isbn': book_copy.isbn.isbn,
-            'lib_branch_id': book_copy.lib_branch.id,
-            'card_no': loan.card_no.card_no,
-            'date_out': loan.date_out.isoformat(),
-            'date_in': date_in,
-            'due_date': loan.due_date.isoformat(),
-            }
+        '''Loan data for a single loan, see LoanQuery.get_loans_data for lists
+        '''
+        return LoanQuery.get_loans_data([loan])[0]
+
+    @staticmethod
+    def set_fines_as_of(response):
+        '''Sets X-Fines-As-Of header, time of the last fine accrual run
+        '''
+        as_of = FineAccrual.get_fines_as_of()
+        if as_of is not None:
+            response['X-Fines-As-Of'] = as_of.isoformat()
+        return response
 
-        # TODO should not update db with GET, temp soln
-        # If overdue, Update Fines
-        now = datetime.datetime.now()
-        naive_due_date = loan.due_date.replace(tzinfo=None) # TODO temp fix
-        timediff = now - naive_due_date
-        if timediff.days > 0:
-            daily_fine = 0.25 # $0.25/day
-            fine_amt = timediff.days * daily_fine
-            fine_row = {'loan_id': loan.id}
-            try:
-                fine_obj = models.Fine.objects.get(**fine_row)
-                fine_obj.fine_amt = fine_amt
-                fine_obj.save()
-            except:
-                fine_row['fine_amt'] = fine_amt
-                fine_obj = models.Fine.objects.create(**fine_row)
+    @staticmethod
+    def get_loans_after(cursor, order):
+        '''Returns LoanQuery.get_page after for a loans cursor, None for no cursor.
+        Raises ValueError if cursor is not for order
+        '''
+        if not cursor:
+            return None
+        after = decode_cursor(cursor)
+        if after.get('o') != order or not isinstance(after.get('id'), (int, long)):
+            raise ValueError('Invalid cursor: {0}'.format(cursor))
+        if order == 'due_date' and not after.get('d'):
+            raise ValueError('Invalid cursor: {0}'.format(cursor))
+        return after
 
-        try:
-            # need to get fine again, as some fines may not exist, and need to get $0
-            fine_filter = {'loan_id': loan.id}
-            fine = models.Fine.objects.get(**fine_filter)
-            loan_data['fine'] = {
-                    'id': fine.id,
-                    'fine_amt': fine.fine_amt,
-                    'paid': fine.paid
-                    }
-        except:
-            loan_data['fine'] = {
-                    'id': 0,
-                    'amount': 0,
-                    'paid': 'NA'
-                    }
-        return loan_data
+    @staticmethod
+    def get_next_cursor(after, order):
+        '''Returns cursor for LoanQuery.get_page after, None if no next page
+        '''
+        if after is None:
+            return None
+        return encode_cursor(dict(after, o=order))
+
+    @staticmethod
+    def get_amount(value):
+        '''Returns Decimal for a request amount, a number or string, see is_valid_amount
+        '''
+        # str first, Decimal of a float keeps its binary error
+        return Decimal(str(value))
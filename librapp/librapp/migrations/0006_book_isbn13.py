@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 13:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from librapp.utils.isbn_utils import ISBNUtils
+
+
+def set_isbn13(apps, schema_editor):
+    Book = apps.get_model('librapp', 'Book')
+    iutils = ISBNUtils()
+    for isbn in Book.objects.filter(isbn13=None).values_list('isbn', flat=True).iterator():
+        isbns = iutils.parse(isbn)
+        if isbns is not None:
+            Book.objects.filter(isbn=isbn).update(isbn13=isbns[1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0005_auto_20160709_1852'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='isbn13',
+            field=models.CharField(max_length=13, null=True, unique=True),
+        ),
+        migrations.RunPython(set_isbn13, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 13:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from librapp.lib.search_documents import SearchDocumentHelper
+
+
+def build_search_documents(apps, schema_editor):
+    SearchDocumentHelper(apps=apps).rebuild()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0006_book_isbn13'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchDocument',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='librapp.Book')),
+                ('title', models.CharField(max_length=200)),
+                ('authors', models.TextField()),
+                ('authors_norm', models.TextField()),
+                ('isbn13', models.CharField(max_length=13, null=True)),
+            ],
+        ),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
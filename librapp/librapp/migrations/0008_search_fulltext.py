@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# MySQL: FULLTEXT index, InnoDB needs MySQL 5.6+
+MYSQL_FORWARD = [
+    'ALTER TABLE librapp_booksearchdocument ADD FULLTEXT INDEX booksearchdocument_fulltext (title, authors_norm)',
+]
+MYSQL_REVERSE = [
+    'ALTER TABLE librapp_booksearchdocument DROP INDEX booksearchdocument_fulltext',
+]
+
+# SQLite: FTS5 table, kept in sync with librapp_booksearchdocument by triggers
+SQLITE_FORWARD = [
+    'CREATE VIRTUAL TABLE librapp_booksearchdocument_fts USING fts5(book_id UNINDEXED, title, authors_norm)',
+    'INSERT INTO librapp_booksearchdocument_fts (book_id, title, authors_norm) '
+    'SELECT book_id, title, authors_norm FROM librapp_booksearchdocument',
+    'CREATE TRIGGER librapp_booksearchdocument_fts_ai AFTER INSERT ON librapp_booksearchdocument BEGIN '
+    'INSERT INTO librapp_booksearchdocument_fts (book_id, title, authors_norm) '
+    'VALUES (new.book_id, new.title, new.authors_norm); END',
+    'CREATE TRIGGER librapp_booksearchdocument_fts_ad AFTER DELETE ON librapp_booksearchdocument BEGIN '
+    'DELETE FROM librapp_booksearchdocument_fts WHERE book_id = old.book_id; END',
+    'CREATE TRIGGER librapp_booksearchdocument_fts_au AFTER UPDATE ON librapp_booksearchdocument BEGIN '
+    'DELETE FROM librapp_booksearchdocument_fts WHERE book_id = old.book_id; '
+    'INSERT INTO librapp_booksearchdocument_fts (book_id, title, authors_norm) '
+    'VALUES (new.book_id, new.title, new.authors_norm); END',
+]
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS librapp_booksearchdocument_fts_ai',
+    'DROP TRIGGER IF EXISTS librapp_booksearchdocument_fts_ad',
+    'DROP TRIGGER IF EXISTS librapp_booksearchdocument_fts_au',
+    'DROP TABLE IF EXISTS librapp_booksearchdocument_fts',
+]
+
+FORWARD = {'mysql': MYSQL_FORWARD, 'sqlite': SQLITE_FORWARD}
+REVERSE = {'mysql': MYSQL_REVERSE, 'sqlite': SQLITE_REVERSE}
+
+
+def run_sql(statements, schema_editor):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def add_fulltext(apps, schema_editor):
+    run_sql(FORWARD, schema_editor)
+
+
+def remove_fulltext(apps, schema_editor):
+    run_sql(REVERSE, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0007_book_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext, remove_fulltext),
+    ]
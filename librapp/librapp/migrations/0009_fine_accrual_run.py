@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 13:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0008_search_fulltext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FineAccrualRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField()),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(null=True)),
+                ('loans_scanned', models.IntegerField(default=0)),
+                ('fines_created', models.IntegerField(default=0)),
+                ('fines_updated', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 14:01
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0009_fine_accrual_run'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='bookcopy',
+            unique_together=set([('isbn', 'lib_branch')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='bookloan',
+            index_together=set([('date_in', 'due_date'), ('card_no', 'date_in')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='fine',
+            index_together=set([('paid', 'loan')]),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 14:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0010_loan_fine_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedFine',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('fine_amt', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('paid', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('date_out', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('date_in', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='librapp.BookCopy')),
+                ('card_no', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='librapp.Borrower')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedfine',
+            name='loan',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fine', to='librapp.ArchivedLoan'),
+        ),
+        migrations.AlterIndexTogether(
+            name='archivedloan',
+            index_together=set([('card_no', 'id')]),
+        ),
+    ]
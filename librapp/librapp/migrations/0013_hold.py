@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 14:15
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0012_overdue_notice_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[(b'waiting', b'Waiting'), (b'ready', b'Ready'), (b'fulfilled', b'Fulfilled'), (b'cancelled', b'Cancelled'), (b'expired', b'Expired')], default=b'waiting', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ready_at', models.DateTimeField(null=True)),
+                ('expires_at', models.DateTimeField(null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='librapp.BookCopy')),
+                ('card_no', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='librapp.Borrower')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='hold',
+            index_together=set([('status', 'expires_at'), ('card_no', 'status'), ('book', 'status', 'id')]),
+        ),
+    ]
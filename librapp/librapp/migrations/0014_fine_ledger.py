@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 14:20
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+# fine rule of FineAccrual when this migration was written, frozen here: whole days
+# from due_date to date_in (or as_of), at DAILY_FINE, no grace days, no cap
+DAILY_FINE = Decimal('0.25')
+
+
+def get_gross_fine(as_of, due_date, date_in, remainder):
+    '''Returns fine before payments, as accrued at as_of. remainder if more, or no accrual run
+    '''
+    if as_of is None:
+        return remainder
+    days = ((date_in or as_of) - due_date).days
+    fine_amt = days * DAILY_FINE if days > 0 else 0
+    return max(fine_amt, remainder)
+
+
+def open_ledger(apps, schema_editor):
+    '''Before the ledger, payments were taken off fine_amt, and fine_amt is what is left of the fine.
+    fine_amt is set back to the fine as accrued by the last FineAccrualRun, paid_amt to the difference,
+    with a fine entry and a payment entry, so the next accrual only adds days since.
+    Balances are the sum of the entries, what is left of unpaid fines.
+    '''
+    Fine = apps.get_model('librapp', 'Fine')
+    FineAccrualRun = apps.get_model('librapp', 'FineAccrualRun')
+    FineLedgerEntry = apps.get_model('librapp', 'FineLedgerEntry')
+    BorrowerBalance = apps.get_model('librapp', 'BorrowerBalance')
+    last_run = FineAccrualRun.objects.filter(finished_at__isnull=False).order_by('-as_of').first()
+    as_of = last_run.as_of if last_run is not None else None
+
+    fines = Fine.objects.filter(paid=False, fine_amt__gt=0).order_by('id')
+    fields = ('id', 'loan_id', 'loan__card_no_id', 'loan__due_date', 'loan__date_in', 'fine_amt')
+    entries = []
+    for fine_id, loan_id, card_no, due_date, date_in, remainder in fines.values_list(*fields).iterator():
+        fine_amt = get_gross_fine(as_of, due_date, date_in, remainder)
+        entries.append(FineLedgerEntry(card_no_id=card_no, loan_id=loan_id, kind='fine', amount=fine_amt))
+        if fine_amt > remainder:
+            Fine.objects.filter(id=fine_id).update(fine_amt=fine_amt, paid_amt=fine_amt - remainder)
+            entries.append(FineLedgerEntry(card_no_id=card_no, loan_id=loan_id, kind='payment',
+                                           amount=remainder - fine_amt))
+        if len(entries) >= BATCH_SIZE:
+            FineLedgerEntry.objects.bulk_create(entries)
+            entries = []
+    FineLedgerEntry.objects.bulk_create(entries)
+
+    balances = FineLedgerEntry.objects.values('card_no_id').annotate(balance=Sum('amount')).order_by()
+    BorrowerBalance.objects.bulk_create(
+            [BorrowerBalance(card_no_id=_['card_no_id'], balance=_['balance']) for _ in balances])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0013_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowerBalance',
+            fields=[
+                ('card_no', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='librapp.Borrower')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FineLedgerEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('loan_id', models.IntegerField()),
+                ('kind', models.CharField(choices=[(b'fine', b'Fine'), (b'payment', b'Payment')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('card_no', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='librapp.Borrower')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fine',
+            name='paid_amt',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterIndexTogether(
+            name='fineledgerentry',
+            index_together=set([('card_no', 'id')]),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 16:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# SQLite: adding a column copies librapp_booksearchdocument to a new table, which drops
+# the FTS5 triggers of 0008_search_fulltext. Refill the FTS5 table and add them again.
+SQLITE_FORWARD = [
+    'DELETE FROM librapp_booksearchdocument_fts',
+    'INSERT INTO librapp_booksearchdocument_fts (book_id, title, authors_norm) '
+    'SELECT book_id, title, authors_norm FROM librapp_booksearchdocument',
+    'CREATE TRIGGER librapp_booksearchdocument_fts_ai AFTER INSERT ON librapp_booksearchdocument BEGIN '
+    'INSERT INTO librapp_booksearchdocument_fts (book_id, title, authors_norm) '
+    'VALUES (new.book_id, new.title, new.authors_norm); END',
+    'CREATE TRIGGER librapp_booksearchdocument_fts_ad AFTER DELETE ON librapp_booksearchdocument BEGIN '
+    'DELETE FROM librapp_booksearchdocument_fts WHERE book_id = old.book_id; END',
+    'CREATE TRIGGER librapp_booksearchdocument_fts_au AFTER UPDATE ON librapp_booksearchdocument BEGIN '
+    'DELETE FROM librapp_booksearchdocument_fts WHERE book_id = old.book_id; '
+    'INSERT INTO librapp_booksearchdocument_fts (book_id, title, authors_norm) '
+    'VALUES (new.book_id, new.title, new.authors_norm); END',
+]
+
+
+def add_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_FORWARD:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0014_fine_ledger'),
+    ]
+
+    operations = [
+        # reverse drops the column, which drops the triggers again
+        migrations.RunPython(migrations.RunPython.noop, add_fts_triggers),
+        migrations.AddField(
+            model_name='booksearchdocument',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(add_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.1 on 2026-10-18 16:40
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('librapp', '0015_search_document_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='bookloan',
+            index_together=set([('date_in', 'due_date'), ('card_no', 'date_in'), ('date_in', 'date_out')]),
+        ),
+    ]
@@ -6,12 +6,38 @@ Refer:
 from django.db import models
 from django.contrib.auth.models import User
 
+from librapp.utils.isbn_utils import ISBNUtils
+
 
 class Book(models.Model):
     isbn = models.CharField(max_length=10, primary_key=True)
+    # unique, indexed, for lookup by ISBN-13
+    isbn13 = models.CharField(max_length=13, unique=True, null=True)
     title = models.CharField(max_length=200)
     cover = models.URLField()
 
+    def save(self, *args, **kwargs):
+        if not self.isbn13:
+            isbns = ISBNUtils().parse(self.isbn)
+            if isbns is not None:
+                self.isbn13 = isbns[1]
+        super(Book, self).save(*args, **kwargs)
+
+class BookSearchDocument(models.Model):
+    # denormalized search data of a book, one table to search and list authors from
+    # kept in sync by librapp/signals.py, rebuild with librapp/bin/rebuild_search_documents.py
+    book = models.OneToOneField(Book, primary_key=True, related_name='search_document')
+    title = models.CharField(max_length=200) # lowercase
+    authors = models.TextField() # author names, in BookAuthors order, joined by AUTHOR_SEP
+    authors_norm = models.TextField() # lowercase authors
+    isbn13 = models.CharField(max_length=13, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    AUTHOR_SEP = '|'
+
+    def get_authors(self):
+        return self.authors.split(self.AUTHOR_SEP) if self.authors else []
+
 class Author(models.Model):
     # id is assigned by default
     name = models.CharField(max_length=100)
@@ -31,6 +57,10 @@ class BookCopy(models.Model):
     lib_branch = models.ForeignKey(LibraryBranch)
     no_of_copies = models.IntegerField(default=0)
 
+    class Meta:
+        # one row per book per branch, checkout looks up by both
+        unique_together = ('isbn', 'lib_branch')
+
 class Borrower(models.Model):
     card_no = models.AutoField(primary_key=True)
     ssn = models.CharField(max_length=9, unique=True)
@@ -51,9 +81,111 @@ class BookLoan(models.Model):
     class Meta:
         # one borrower can borrow that book only once
         unique_together = ('book', 'card_no')
+        index_together = [
+            ('card_no', 'date_in'), # active loans of a borrower
+            ('date_in', 'due_date'), # overdue loans
+            ('date_in', 'date_out'), # active loans checked out since, OverdueTracker.refresh
+            ]
 
 class Fine(models.Model):
     # id is assigned by default
     loan = models.OneToOneField(BookLoan, unique=True) # same as ForeignKey, unique=True
     fine_amt = models.DecimalField(max_digits=6, decimal_places=2)
-    paid = models.BooleanField(default=False)
+    paid_amt = models.DecimalField(max_digits=6, decimal_places=2, default=0) # paid towards fine_amt
+    paid = models.BooleanField(default=False) # paid_amt >= fine_amt
+
+    class Meta:
+        # unpaid fines, with loan_id from the index
+        index_together = [('paid', 'loan')]
+
+class FineAccrualRun(models.Model):
+    # one row per run of librapp/lib/fine_accrual.py
+    as_of = models.DateTimeField() # fines computed up to this time
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+    loans_scanned = models.IntegerField(default=0)
+    fines_created = models.IntegerField(default=0)
+    fines_updated = models.IntegerField(default=0)
+
+class ArchivedLoan(models.Model):
+    # BookLoan moved here by librapp/lib/loan_archive.py, checked in and fine paid
+    id = models.IntegerField(primary_key=True) # same as BookLoan id
+    book = models.ForeignKey(BookCopy)
+    card_no = models.ForeignKey(Borrower)
+    date_out = models.DateTimeField()
+    due_date = models.DateTimeField()
+    date_in = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # loan history of a borrower
+        index_together = [('card_no', 'id')]
+
+class ArchivedFine(models.Model):
+    # Fine of an ArchivedLoan
+    id = models.IntegerField(primary_key=True) # same as Fine id
+    loan = models.OneToOneField(ArchivedLoan, related_name='fine')
+    fine_amt = models.DecimalField(max_digits=6, decimal_places=2)
+    paid = models.BooleanField(default=True)
+
+class OverdueNoticeRun(models.Model):
+    # one row per run of librapp/lib/overdue_notices.py
+    as_of = models.DateTimeField() # notices for loans due before this time
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+    notices = models.IntegerField(default=0)
+
+class Hold(models.Model):
+    # hold on a book at a branch, served first come first served, see librapp/lib/hold_queue.py
+    WAITING = 'waiting'
+    READY = 'ready' # a returned copy is kept for the borrower until expires_at
+    FULFILLED = 'fulfilled'
+    CANCELLED = 'cancelled'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = (
+            (WAITING, 'Waiting'),
+            (READY, 'Ready'),
+            (FULFILLED, 'Fulfilled'),
+            (CANCELLED, 'Cancelled'),
+            (EXPIRED, 'Expired'),
+            )
+
+    # id = queue order
+    book = models.ForeignKey(BookCopy)
+    card_no = models.ForeignKey(Borrower)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(null=True)
+    expires_at = models.DateTimeField(null=True)
+
+    class Meta:
+        index_together = [
+            ('book', 'status', 'id'), # head of the queue, queue position
+            ('card_no', 'status'), # holds of a borrower
+            ('status', 'expires_at'), # ready holds to expire
+            ]
+
+class FineLedgerEntry(models.Model):
+    # append only, fines and payments of a borrower, see librapp/lib/fine_ledger.py
+    FINE = 'fine' # fine accrued, amount > 0
+    PAYMENT = 'payment' # amount < 0
+    KIND_CHOICES = (
+            (FINE, 'Fine'),
+            (PAYMENT, 'Payment'),
+            )
+
+    card_no = models.ForeignKey(Borrower)
+    loan_id = models.IntegerField() # loan of the fine, BookLoan or ArchivedLoan id
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=8, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # entries of a borrower, in order
+        index_together = [('card_no', 'id')]
+
+class BorrowerBalance(models.Model):
+    # sum of FineLedgerEntry amounts of a borrower, unpaid fines
+    card_no = models.OneToOneField(Borrower, primary_key=True)
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
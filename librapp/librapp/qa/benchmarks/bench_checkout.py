@@ -0,0 +1,107 @@
+'''
+Parallel checkouts of one popular copy: throughput, and whether copies are oversold.
+Compares LoanService.checkout (conditional UPDATE in a transaction) with the
+previous read, check, save path.
+
+Creates its own branch, book and borrowers, and deletes them afterwards.
+Without a MySQL server, use SQLite settings, see librapp/settings_bench.py
+
+Usage:
+    $ cd librapp/qa/benchmarks
+    $ python bench_checkout.py [threads] [copies]
+'''
+
+import sys
+import threading
+import time
+from datetime import timedelta
+
+from bench_utils import setup_django
+
+setup_django()
+
+# do this after settings
+from django.db import connection
+from django.utils import timezone
+from librapp import models
+from librapp.lib.loan_service import LoanError, LoanService
+
+ISBN = '0000000000'
+
+
+def legacy_checkout(lib_branch_id, isbn, card_no):
+    '''checkout as before LoanService, no transaction
+    '''
+    book_copy = models.BookCopy.objects.get(isbn_id=isbn, lib_branch_id=lib_branch_id)
+    if book_copy.no_of_copies == 0:
+        raise LoanError('Book is not available')
+    models.BookLoan.objects.create(book_id=book_copy.id, card_no_id=card_no, due_date=timezone.now() + timedelta(14))
+    book_copy.no_of_copies -= 1
+    book_copy.save()
+
+
+def setup(threads, copies):
+    branch = models.LibraryBranch.objects.create(branch_name='Bench', address='Bench')
+    book = models.Book.objects.create(isbn=ISBN, title='Bench Book', cover='')
+    book_copy = models.BookCopy.objects.create(isbn=book, lib_branch=branch, no_of_copies=copies)
+    borrowers = [models.Borrower.objects.create(ssn='B{0:08d}'.format(i), fname='F', lname='L', address='A')
+                 for i in xrange(threads)]
+    return branch, book_copy, borrowers
+
+
+def cleanup(branch, borrowers):
+    models.BookLoan.objects.filter(book__lib_branch=branch).delete()
+    models.BookCopy.objects.filter(lib_branch=branch).delete()
+    models.Book.objects.filter(isbn=ISBN).delete()
+    models.Borrower.objects.filter(card_no__in=[_.card_no for _ in borrowers]).delete()
+    branch.delete()
+
+
+def run_checkouts(name, checkout, threads, copies):
+    branch, book_copy, borrowers = setup(threads, copies)
+    results = {'ok': 0, 'unavailable': 0, 'error': 0}
+    lock = threading.Lock()
+    start_event = threading.Event()
+
+    def worker(card_no):
+        start_event.wait()
+        try:
+            checkout(lib_branch_id=branch.id, isbn=ISBN, card_no=card_no)
+            result = 'ok'
+        except LoanError:
+            result = 'unavailable'
+        except Exception:
+            # eg: lock wait timeout
+            result = 'error'
+        finally:
+            connection.close()
+        with lock:
+            results[result] += 1
+
+    workers = [threading.Thread(target=worker, args=(_.card_no,)) for _ in borrowers]
+    for worker_thread in workers:
+        worker_thread.start()
+    start = time.time()
+    start_event.set()
+    for worker_thread in workers:
+        worker_thread.join()
+    elapsed = time.time() - start
+
+    loans = models.BookLoan.objects.filter(book=book_copy).count()
+    left = models.BookCopy.objects.get(id=book_copy.id).no_of_copies
+    print '{0:<12} {1} requests in {2:.2f}s ({3:.0f}/s) ok={4} unavailable={5} error={6} loans={7} copies left={8} oversold={9}'.format(
+            name, threads, elapsed, threads / elapsed, results['ok'], results['unavailable'],
+            results['error'], loans, left, max(0, loans - copies))
+    cleanup(branch, borrowers)
+
+
+def run(threads=50, copies=5):
+    print 'Database: {0}'.format(connection.vendor)
+    run_checkouts('legacy', legacy_checkout, threads, copies)
+    run_checkouts('atomic', LoanService().checkout, threads, copies)
+
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    run(threads=threads, copies=copies)
@@ -0,0 +1,94 @@
+'''
+Recall and latency of fuzzy (trigram similarity) search on misspelled
+author names and titles from the InitData/books.csv catalog.
+The index is built straight from the csv, no database needed.
+
+recall@10: share of misspelled queries with the intended book in the top 10.
+
+Usage:
+    $ cd librapp/qa/benchmarks
+    $ python bench_fuzzy.py [number of queries]
+'''
+
+import random
+import string
+import sys
+import time
+
+from bench_utils import setup_django, read_catalog, build_catalog_index, time_calls, print_report
+
+setup_django()
+
+
+def misspell(text, rand, edits=1):
+    for _ in xrange(edits):
+        i = rand.randrange(len(text))
+        op = rand.choice(['substitute', 'delete', 'insert', 'transpose'])
+        char = rand.choice(string.ascii_lowercase)
+        if op == 'substitute':
+            text = text[:i] + char + text[i + 1:]
+        elif op == 'delete':
+            text = text[:i] + text[i + 1:]
+        elif op == 'insert':
+            text = text[:i] + char + text[i:]
+        elif i < len(text) - 1:
+            text = text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    return text
+
+
+def get_queries(catalog, n=500, seed=7):
+    '''Returns list of (misspelled query, set of isbns searched for)
+    '''
+    author_books = {}
+    for isbn10, isbn13, title, authors in catalog:
+        for name in authors:
+            author_books.setdefault(name, set()).add(isbn10)
+
+    rand = random.Random(seed)
+    queries = []
+    while len(queries) < n:
+        isbn10, isbn13, title, authors = rand.choice(catalog)
+        isbns = set([isbn10])
+        if rand.random() < 0.5:
+            text = rand.choice(authors)
+            # any book of the author is a hit
+            isbns = author_books[text]
+        else:
+            # a few words of the title, as patrons remember it
+            words = title.split()
+            start = rand.randrange(len(words))
+            text = ' '.join(words[start:start + 3])
+        if len(text) < 6:
+            continue
+        queries.append((misspell(text, rand, edits=rand.choice([1, 1, 2])), isbns))
+    return queries
+
+
+def recall_at(index, queries, k=10, exact=False):
+    found = 0
+    for query, isbns in queries:
+        if exact:
+            hits = index.search(query) or ([], [])
+            results = [_[0] for _ in (hits[0] + hits[1])]
+        else:
+            results = [_[0] for _ in index.fuzzy_search(query, limit=k)]
+        if isbns.intersection(results):
+            found += 1
+    return found / float(len(queries))
+
+
+def run(n=500):
+    catalog = read_catalog()
+    start = time.time()
+    index = build_catalog_index(catalog)
+    print 'Index build: {0:.2f}s'.format(time.time() - start)
+
+    queries = get_queries(catalog, n=n)
+    print 'exact search recall (any rank): {0:.3f}'.format(recall_at(index, queries, exact=True))
+    print 'fuzzy search recall@10:         {0:.3f}'.format(recall_at(index, queries))
+    print_report('fuzzy', time_calls(index.fuzzy_search, [(query,) for query, isbns in queries]))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    run(n=n)
@@ -0,0 +1,98 @@
+'''
+Latency of the loan and fine hot path queries with the composite indexes of
+migration 0010_loan_fine_indexes and without them (migrated back to 0009).
+Migrates to the latest migration again at the end.
+
+Needs the database populated with librapp/bin/populate_init_db_data.py,
+adds loans until there are [number of loans], and accrues fines if there are none.
+Without a MySQL server, use SQLite settings, see librapp/settings_bench.py
+
+Usage:
+    $ cd librapp/qa/benchmarks
+    $ python bench_loan_indexes.py [number of loans] [number of calls]
+'''
+
+import random
+import sys
+import time
+
+from bench_utils import setup_django, create_loans, time_calls, print_report
+
+setup_django()
+
+# do this after settings
+from django.core.management import call_command
+from librapp import models
+from librapp.lib.borrower_eligibility import BorrowerEligibility
+from librapp.lib.fine_accrual import FineAccrual
+from librapp.lib.loan_query import LoanQuery
+
+be = BorrowerEligibility()
+lq = LoanQuery()
+
+
+def get_copy(isbn, lib_branch_id):
+    return list(models.BookCopy.objects.filter(isbn_id=isbn, lib_branch_id=lib_branch_id)
+                .values_list('id', 'no_of_copies'))
+
+
+def get_active_loans(card_no):
+    return lq.get_loans_data(lq.get_loans(card_no=card_no, active=True))
+
+
+def get_overdue_page(lib_branch_id):
+    return lq.get_page(lq.get_loans(overdue=True, lib_branch_id=lib_branch_id), order='due_date', limit=100)
+
+
+def get_unpaid_fines(loan_id):
+    return list(models.Fine.objects.filter(paid=False, loan_id__gte=loan_id).order_by('loan_id')[:100])
+
+
+def get_args(n, seed=7):
+    rand = random.Random(seed)
+    copies = list(models.BookCopy.objects.values_list('isbn_id', 'lib_branch_id'))
+    card_nos = list(models.Borrower.objects.values_list('card_no', flat=True))
+    branch_ids = list(models.LibraryBranch.objects.values_list('id', flat=True))
+    max_loan_id = models.BookLoan.objects.order_by('-id').values_list('id', flat=True)[0]
+    return [
+        ('checkout copy', get_copy, [rand.choice(copies) for _ in xrange(n)]),
+        ('eligibility', be.get_eligibility, [(rand.choice(card_nos),) for _ in xrange(n)]),
+        ('active loans', get_active_loans, [(rand.choice(card_nos),) for _ in xrange(n)]),
+        ('overdue page', get_overdue_page, [(rand.choice(branch_ids),) for _ in xrange(n)]),
+        ('unpaid fines page', get_unpaid_fines, [(rand.randint(1, max_loan_id),) for _ in xrange(n)]),
+        ]
+
+
+def time_queries(calls):
+    for name, func, args_list in calls:
+        print_report(name, time_calls(func, args_list))
+
+
+def run(n=1000000, calls=200):
+    start = time.time()
+    count = create_loans(n)
+    if not models.Fine.objects.exists():
+        FineAccrual().run()
+    print 'Loans: {0}, fines: {1}, setup {2:.2f}s'.format(
+            count, models.Fine.objects.count(), time.time() - start)
+    args = get_args(calls)
+
+    call_command('migrate', 'librapp', verbosity=0)
+    print 'with indexes (latest migration)'
+    time_queries(args)
+
+    start = time.time()
+    call_command('migrate', 'librapp', '0009', verbosity=0)
+    print 'without indexes (0009), migrate back {0:.2f}s'.format(time.time() - start)
+    try:
+        time_queries(args)
+    finally:
+        start = time.time()
+        call_command('migrate', 'librapp', verbosity=0)
+        print 'migrate to latest {0:.2f}s'.format(time.time() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    run(n=n, calls=calls)
@@ -0,0 +1,95 @@
+'''
+Throughput of bulk checkout and checkin endpoints against the per-item API,
+through the Django test client, on the same books and borrowers.
+
+Creates its own branch, books and borrowers, and deletes them afterwards.
+Without a MySQL server, use SQLite settings, see librapp/settings_bench.py
+
+Usage:
+    $ cd librapp/qa/benchmarks
+    $ python bench_loans_bulk.py [number of loans]
+'''
+
+import sys
+import time
+
+from bench_utils import setup_django
+
+setup_django()
+
+# do this after settings
+from django.test.utils import setup_test_environment
+from rest_framework.test import APIClient
+from librapp import models
+
+ISBN_PREFIX = 'X'
+LOANS_PER_BORROWER = 3
+
+
+def setup(n):
+    branch = models.LibraryBranch.objects.create(branch_name='Bench', address='Bench')
+    isbns = []
+    for i in xrange(n):
+        book = models.Book.objects.create(isbn='{0}{1:09d}'.format(ISBN_PREFIX, i), title='Bench Book', cover='')
+        models.BookCopy.objects.create(isbn=book, lib_branch=branch, no_of_copies=1)
+        isbns.append(book.isbn)
+    borrowers = [models.Borrower.objects.create(ssn='B{0:08d}'.format(i), fname='F', lname='L', address='A')
+                 for i in xrange((n + LOANS_PER_BORROWER - 1) / LOANS_PER_BORROWER)]
+    items = [{'isbn': isbn, 'card_no': borrowers[i / LOANS_PER_BORROWER].card_no} for i, isbn in enumerate(isbns)]
+    return branch, borrowers, items
+
+
+def cleanup(branch, borrowers):
+    models.BookLoan.objects.filter(book__lib_branch=branch).delete()
+    models.BookCopy.objects.filter(lib_branch=branch).delete()
+    models.Book.objects.filter(isbn__startswith=ISBN_PREFIX).delete()
+    models.Borrower.objects.filter(card_no__in=[_.card_no for _ in borrowers]).delete()
+    branch.delete()
+
+
+def report(name, n, elapsed):
+    print '{0:<24} {1} loans in {2:.2f}s ({3:.0f} loans/s)'.format(name, n, elapsed, n / elapsed)
+
+
+def run_per_item(client, branch, items):
+    start = time.time()
+    loan_ids = []
+    for item in items:
+        data = dict(item, lib_branch_id=branch.id)
+        loan_ids.append(client.post('/books/loans/', data, format='json').data['id'])
+    report('per-item checkout', len(items), time.time() - start)
+
+    start = time.time()
+    for loan_id in loan_ids:
+        assert client.put('/books/loans/{0}/'.format(loan_id), {}, format='json').status_code == 200
+    report('per-item checkin', len(items), time.time() - start)
+
+
+def run_bulk(client, branch, items):
+    start = time.time()
+    data = {'lib_branch_id': branch.id, 'items': items}
+    results = client.post('/books/loans/bulk-checkout/', data, format='json').data['results']
+    report('bulk checkout', len(items), time.time() - start)
+
+    start = time.time()
+    data = {'loan_ids': [_['id'] for _ in results]}
+    response = client.post('/books/loans/bulk-checkin/', data, format='json')
+    assert response.data['count'] == len(items)
+    report('bulk checkin', len(items), time.time() - start)
+
+
+def run(n=300):
+    setup_test_environment()
+    client = APIClient()
+    # unique (book, card_no), separate data for each run
+    for func in [run_per_item, run_bulk]:
+        branch, borrowers, items = setup(n)
+        try:
+            func(client, branch, items)
+        finally:
+            cleanup(branch, borrowers)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    run(n=n)
@@ -0,0 +1,49 @@
+'''
+Memory and time of listing all loans: the whole list at once, as before keyset paging,
+and the NDJSON export, which reads LoanQuery.CHUNK_SIZE loans at a time.
+Peak RSS only grows, so the export runs first.
+
+Needs the database populated with librapp/bin/populate_init_db_data.py,
+adds loans until there are [number of loans].
+Without a MySQL server, use SQLite settings, see librapp/settings_bench.py
+
+Usage:
+    $ cd librapp/qa/benchmarks
+    $ python bench_loans_export.py [number of loans]
+'''
+
+import sys
+import time
+
+from bench_utils import setup_django, create_loans, get_max_rss_mb
+
+setup_django()
+
+# do this after settings
+from librapp.lib.loan_query import LoanQuery
+
+
+def run(n=200000):
+    start = time.time()
+    count = create_loans(n)
+    print 'Loans: {0}, setup {1:.2f}s'.format(count, time.time() - start)
+    lq = LoanQuery()
+    base_rss = get_max_rss_mb()
+    print 'peak rss before: {0:.1f}MB'.format(base_rss)
+
+    start = time.time()
+    size = 0
+    for line in lq.iter_ndjson(lq.get_loans()):
+        size += len(line)
+    print 'export (ndjson)          {0:.2f}s {1:.1f}MB written, peak rss +{2:.1f}MB'.format(
+            time.time() - start, size / 1048576.0, get_max_rss_mb() - base_rss)
+
+    start = time.time()
+    result = lq.get_loans_data(lq.get_loans())
+    print 'whole list               {0:.2f}s {1} loans, peak rss +{2:.1f}MB'.format(
+            time.time() - start, len(result), get_max_rss_mb() - base_rss)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    run(n=n)
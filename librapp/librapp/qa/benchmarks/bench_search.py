@@ -0,0 +1,56 @@
+'''
+Compares p50/p99 latency of the search backends, icontains (LIKE), fulltext
+(MySQL FULLTEXT, FTS5 on SQLite) and the in-process inverted index, on the same
+queries drawn from InitData/books.csv.
+Also reports how often fulltext returns the same books as icontains, fulltext
+matches word prefixes and icontains any substring.
+
+Needs the database populated with librapp/bin/populate_init_db_data.py
+Without a MySQL server, use SQLite settings, see librapp/settings_bench.py
+
+Usage:
+    $ cd librapp/qa/benchmarks
+    $ python bench_search.py [number of queries]
+    $ DJANGO_SETTINGS_MODULE=librapp.settings_bench python bench_search.py [number of queries]
+'''
+
+import sys
+import time
+
+from bench_utils import setup_django, read_catalog, get_query_corpus, time_calls, print_report
+
+setup_django()
+
+# do this after settings
+from django.db import connection
+from librapp.lib.search_engine import FullTextSearchEngine, IContainsSearchEngine, SearchIndex
+
+
+def get_isbns(hits):
+    title_hits, author_hits = hits
+    return set(isbn for isbn, title in title_hits + author_hits)
+
+
+def run(n=500):
+    catalog = read_catalog()
+    queries = [(_,) for _ in get_query_corpus(catalog, n=n)]
+    print 'Database: {0}'.format(connection.vendor)
+
+    start = time.time()
+    index = SearchIndex.from_db()
+    print 'Index build: {0:.2f}s, {1} books, {2} authors'.format(
+            time.time() - start, len(index.books), len(index.authors))
+
+    icontains = IContainsSearchEngine()
+    fulltext = FullTextSearchEngine()
+    print_report('icontains', time_calls(icontains.search, queries))
+    print_report('fulltext', time_calls(fulltext.search, queries))
+    print_report('index', time_calls(index.search, queries))
+
+    same = sum(1 for query, in queries if get_isbns(fulltext.search(query)) == get_isbns(icontains.search(query)))
+    print 'fulltext same books as icontains: {0}/{1}'.format(same, len(queries))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    run(n=n)
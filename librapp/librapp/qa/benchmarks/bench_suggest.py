@@ -0,0 +1,57 @@
+'''
+Typeahead suggestion latency on the full InitData/books.csv catalog.
+The index is built straight from the csv, no database needed.
+
+Usage:
+    $ cd librapp/qa/benchmarks
+    $ python bench_suggest.py [number of prefixes]
+'''
+
+import random
+import sys
+import time
+
+from bench_utils import setup_django, read_catalog, time_calls, print_report
+
+setup_django()
+
+# do this after settings
+from librapp.lib.search_engine import SuggestIndex
+
+
+def get_prefixes(catalog, n=2000, seed=7):
+    '''Prefixes of 2 to 8 chars, as typed, of title and author words
+    '''
+    rand = random.Random(seed)
+    prefixes = []
+    while len(prefixes) < n:
+        isbn10, isbn13, title, authors = rand.choice(catalog)
+        text = title if rand.random() < 0.7 else rand.choice(authors)
+        words = text.split()
+        if not words:
+            continue
+        word = ' '.join(words[rand.randrange(len(words)):])
+        prefixes.append(word[:rand.randint(2, 8)])
+    return prefixes
+
+
+def run(n=2000):
+    catalog = read_catalog()
+    books = [(isbn10, title) for isbn10, isbn13, title, authors in catalog]
+    names = sorted(set(name for isbn10, isbn13, title, authors in catalog for name in authors))
+    authors = list(enumerate(names))
+
+    start = time.time()
+    index = SuggestIndex(books=books, authors=authors)
+    print 'Suggest index build: {0:.2f}s, {1} titles and names, {2} keys'.format(
+            time.time() - start, len(index.items), len(index.start_keys) + len(index.word_keys))
+
+    prefixes = get_prefixes(catalog, n=n)
+    for limit in [10, 50]:
+        args = [(_, limit) for _ in prefixes]
+        print_report('suggest limit={0}'.format(limit), time_calls(index.suggest, args))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    run(n=n)
@@ -0,0 +1,118 @@
+import os
+import random
+import sys
+import time
+
+# path to BASE_DIR
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+INIT_DATA_PATH = os.path.join(BASE_DIR, 'librapp', 'bin', 'InitData')
+
+
+def setup_django():
+    sys.path.append(BASE_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "librapp.settings")
+    import django
+    django.setup()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0
+    k = int(round((len(values) - 1) * pct / 100.0))
+    return values[k]
+
+
+def time_calls(func, args_list):
+    '''Calls func(*args) for each args in args_list.
+    Returns list of latencies in ms
+    '''
+    latencies = []
+    for args in args_list:
+        start = time.time()
+        func(*args)
+        latencies.append((time.time() - start) * 1000)
+    return latencies
+
+
+def print_report(name, latencies):
+    print '{0:<24} n={1:<6} p50={2:8.3f}ms p99={3:8.3f}ms max={4:8.3f}ms'.format(
+            name, len(latencies), percentile(latencies, 50),
+            percentile(latencies, 99), max(latencies) if latencies else 0)
+
+
+def read_catalog():
+    '''Returns list of (isbn10, isbn13, title, [authors]) from InitData/books.csv
+    '''
+    from librapp.lib.file_helper import FileHelper
+    data = FileHelper().read(file_path=os.path.join(INIT_DATA_PATH, 'books.csv'), sep='\t')
+    catalog = []
+    for datai in data:
+        authors = [_.strip().lower().title() for _ in datai[3].split(',')]
+        catalog.append((datai[0], datai[1], datai[2], authors))
+    return catalog
+
+
+def get_query_corpus(catalog, n=500, seed=7):
+    '''Words of 4+ chars and two word phrases from titles and author names
+    '''
+    rand = random.Random(seed)
+    queries = []
+    while len(queries) < n:
+        isbn10, isbn13, title, authors = rand.choice(catalog)
+        text = title if rand.random() < 0.7 else rand.choice(authors)
+        words = [_ for _ in text.split() if len(_) >= 4]
+        if not words:
+            continue
+        i = rand.randrange(len(words))
+        query = ' '.join(words[i:i + rand.choice([1, 1, 2])])
+        queries.append(query)
+    return queries
+
+
+def build_catalog_index(catalog):
+    '''SearchIndex built straight from the csv catalog, no database needed
+    '''
+    from librapp.lib.search_engine import SearchIndex
+    books = [(isbn10, title) for isbn10, isbn13, title, authors in catalog]
+    names = sorted(set(name for isbn10, isbn13, title, authors in catalog for name in authors))
+    author_ids = dict((name, i) for i, name in enumerate(names))
+    book_authors = [(author_ids[name], isbn10) for isbn10, isbn13, title, authors in catalog for name in authors]
+    return SearchIndex(books=books, authors=list(enumerate(names)), book_authors=book_authors)
+
+
+def create_loans(n, active_ratio=0.1, seed=7, batch_size=5000):
+    '''Adds BookLoan rows until there are n, spread over all copies and borrowers.
+    Due dates spread over the last 2 years, active_ratio of the loans are not checked in.
+    Needs the database populated with librapp/bin/populate_init_db_data.py
+    '''
+    from datetime import timedelta
+    from django.db import transaction
+    from django.utils import timezone
+    from librapp import models
+
+    rand = random.Random(seed)
+    start = models.BookLoan.objects.count()
+    copy_ids = list(models.BookCopy.objects.order_by('id').values_list('id', flat=True))
+    card_nos = list(models.Borrower.objects.order_by('card_no').values_list('card_no', flat=True))
+    now = timezone.now()
+    for batch_start in xrange(start, n, batch_size):
+        loans = []
+        for i in xrange(batch_start, min(n, batch_start + batch_size)):
+            # unique (book, card_no): loan i gets copy i % copies and a different borrower each round
+            copy_id = copy_ids[i % len(copy_ids)]
+            card_no = card_nos[(i % len(copy_ids) + i / len(copy_ids)) % len(card_nos)]
+            due_date = now - timedelta(days=rand.randint(-14, 730), seconds=rand.randint(0, 86400))
+            date_in = None
+            if rand.random() >= active_ratio:
+                date_in = due_date + timedelta(days=rand.randint(-13, 10))
+            loans.append(models.BookLoan(book_id=copy_id, card_no_id=card_no, due_date=due_date, date_in=date_in))
+        with transaction.atomic():
+            models.BookLoan.objects.bulk_create(loans)
+    return models.BookLoan.objects.count()
+
+
+def get_max_rss_mb():
+    import resource
+    # kB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
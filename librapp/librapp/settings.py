@@ -100,6 +100,35 @@ REST_FRAMEWORK = {
 	'TEST_REQUEST_DEFAULT_FORMAT': 'json',
 }
 
+# Book search
+# options: icontains, fulltext, index. See librapp/lib/search_engine.py
+SEARCH_BACKEND = 'index'
+# written by librapp/bin/rebuild_search_index.py, reloaded when it changes
+SEARCH_INDEX_SNAPSHOT = os.path.join(BASE_DIR, 'search_index.snapshot')
+SEARCH_INDEX_RELOAD_INTERVAL = 60 # seconds
+# build index from database when there is no snapshot, again when the catalog changed
+# production should write the snapshot with bin/rebuild_search_index.py
+SEARCH_INDEX_AUTOBUILD = True
+# fuzzy=true search: min trigram similarity, and time budget per query
+SEARCH_FUZZY_THRESHOLD = 0.4
+SEARCH_FUZZY_BUDGET_MS = 50
+# POST /search/bulk/ with more ISBNs than this streams the response
+SEARCH_BULK_STREAM_THRESHOLD = 200
+# search result cache, per process. See librapp/lib/search_cache.py
+SEARCH_CACHE_SIZE = 1000 # queries
+SEARCH_CACHE_TTL = 300 # seconds
+# checkout/checkin invalidate this process' entries, ttl bounds staleness in other processes
+SEARCH_CACHE_AVAILABILITY_TTL = 30 # seconds
+# GET /books/fines/summary/ cache, per process. See librapp/lib/fine_summary.py
+FINE_SUMMARY_CACHE_TTL = 10 # seconds, 0 for no cache
+# fines of overdue loans, see librapp/lib/fine_policy.py. Amounts in dollars, whole cents
+FINE_POLICY = {
+    'daily_fine': '0.25',
+    'grace_days': 0,
+    'max_fine': None, # no cap
+    'branch_rates': {}, # {lib_branch_id: daily_fine}
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
@@ -0,0 +1,19 @@
+'''
+Settings for running benchmarks without a MySQL server, SQLite stands in for the database.
+The fulltext search backend uses an FTS5 table on SQLite, see migration 0008.
+
+Usage:
+    $ export DJANGO_SETTINGS_MODULE=librapp.settings_bench
+    $ python manage.py migrate
+    $ cd librapp/bin && python populate_init_db_data.py
+    $ cd librapp/qa/benchmarks && python bench_search.py
+'''
+
+from librapp.settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'bench.sqlite3'),
+    }
+}
@@ -0,0 +1,20 @@
+'''
+Settings for running the tests without a MySQL server, on SQLite.
+The test database is a file, not in memory, so the threads of CheckoutConcurrencyTest
+share it through their own connections.
+
+Usage:
+    $ python manage.py test librapp --settings=librapp.settings_test_sqlite
+'''
+
+from librapp.settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'librapp.sqlite3'),
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_librapp.sqlite3'),
+        },
+    }
+}
@@ -0,0 +1,47 @@
+'''Keeps BookSearchDocument in sync with Book, Author, BookAuthors.
+Connected in LibrappConfig.ready
+'''
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from librapp import models
+from librapp.lib.search_cache import search_cache
+from librapp.lib.search_documents import SearchDocumentHelper
+
+
+def update_search_documents(isbns):
+    SearchDocumentHelper().update(isbns)
+    # cached results may no longer match, book data may have changed
+    search_cache.results.clear()
+    for isbn in isbns:
+        search_cache.books.delete(isbn)
+
+
+@receiver(post_save, sender=models.Book)
+def book_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_search_documents([instance.isbn])
+
+
+@receiver(post_delete, sender=models.Book)
+def book_deleted(sender, instance, **kwargs):
+    # cascade of BookAuthors runs update_search_documents before the book row is gone,
+    # which can recreate the document
+    models.BookSearchDocument.objects.filter(book_id=instance.isbn).delete()
+    search_cache.results.clear()
+    search_cache.books.delete(instance.isbn)
+
+
+@receiver(post_save, sender=models.Author)
+def author_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        isbns = models.BookAuthors.objects.filter(author_id=instance.id).values_list('isbn_id', flat=True)
+        update_search_documents(list(isbns))
+
+
+@receiver(post_save, sender=models.BookAuthors)
+@receiver(post_delete, sender=models.BookAuthors)
+def book_authors_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        update_search_documents([instance.isbn_id])
@@ -0,0 +1,84 @@
+'''unittests for borrower eligibility
+
+run as:
+    $ python manage.py test librapp.tests.test_borrower_eligibility
+'''
+
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.borrower_eligibility import BorrowerEligibility
+from librapp.lib.loan_service import LoanService
+from librapp.tests.test_fine_ledger import add_fine
+
+
+class BorrowerEligibilityTest(TestCase):
+
+    def setUp(self):
+        self.be = BorrowerEligibility()
+        self.branch = models.LibraryBranch.objects.create(branch_name='Oak Lawn', address='4100 Cedar Springs Road')
+        self.borrower = models.Borrower.objects.create(ssn='000000001', fname='F', lname='L', address='A')
+        self.card_no = self.borrower.card_no
+
+    def create_loans(self, start, count, returned=True, fine_amt=None, paid=False):
+        loans = []
+        for i in xrange(start, start + count):
+            book = models.Book.objects.create(isbn='{0:010d}'.format(i), title='Book', cover='')
+            book_copy = models.BookCopy.objects.create(isbn=book, lib_branch=self.branch, no_of_copies=1)
+            loan = models.BookLoan.objects.create(book=book_copy, card_no=self.borrower, due_date=timezone.now(),
+                                                  date_in=timezone.now() if returned else None)
+            if fine_amt is not None:
+                add_fine(loan, fine_amt, paid=paid)
+            loans.append(loan)
+        return loans
+
+    def get_eligibility(self, book_copy_id=None):
+        with CaptureQueriesContext(connection) as ctx:
+            eligibility = self.be.get_eligibility(self.card_no, book_copy_id=book_copy_id)
+        # active loans aggregate and the balance row
+        self.assertEqual(len(ctx.captured_queries), 2)
+        return eligibility
+
+    def test_no_loans(self):
+        eligibility = self.get_eligibility(book_copy_id=1)
+        self.assertEqual(eligibility, {'unpaid_fines': False, 'active_loans': 0, 'has_copy_loan': False})
+        self.assertEqual(self.be.get_reason(eligibility), None)
+
+    def test_long_history_query_count(self):
+        self.create_loans(1, 30, fine_amt=Decimal('1.00'), paid=True)
+        self.create_loans(100, 5, fine_amt=Decimal('0'))
+        active = self.create_loans(200, 2, returned=False)
+        eligibility = self.get_eligibility(book_copy_id=active[0].book_id)
+        self.assertEqual(eligibility, {'unpaid_fines': False, 'active_loans': 2, 'has_copy_loan': True})
+        self.assertEqual(self.be.get_reason(eligibility), 'Cannot loan the same book twice')
+
+    def test_unpaid_fines(self):
+        self.create_loans(1, 1, fine_amt=Decimal('0.25'))
+        eligibility = self.get_eligibility()
+        self.assertTrue(eligibility['unpaid_fines'])
+        self.assertEqual(self.be.get_reason(eligibility), 'Unpaid fines. Cannot borrow any books at this time')
+
+    def test_borrow_limit(self):
+        self.create_loans(1, 3, returned=False)
+        self.assertEqual(self.be.get_reason(self.get_eligibility()), 'Cannot borrow more that 3 books at a time')
+
+    def test_checkout_query_count_is_constant(self):
+        ls = LoanService()
+        self.create_loans(1, 2)
+        book = models.Book.objects.create(isbn='0380699710', title='Book', cover='')
+        models.BookCopy.objects.create(isbn=book, lib_branch=self.branch, no_of_copies=2)
+        with CaptureQueriesContext(connection) as ctx:
+            loan = ls.checkout(self.branch.id, '0380699710', self.card_no)
+        few = len(ctx.captured_queries)
+        ls.checkin(loan.id)
+        loan.delete()
+
+        self.create_loans(100, 40, fine_amt=Decimal('1.00'), paid=True)
+        with CaptureQueriesContext(connection) as ctx:
+            ls.checkout(self.branch.id, '0380699710', self.card_no)
+        self.assertEqual(len(ctx.captured_queries), few)
@@ -0,0 +1,95 @@
+'''unittests for fine accrual
+
+run as:
+    $ python manage.py test librapp.tests.test_fine_accrual
+'''
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.fine_accrual import FineAccrual
+from librapp.tests.test_loans import LoanTestMixin
+
+
+class FineAccrualTest(LoanTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_branches()
+        self.accrual = FineAccrual()
+
+    def get_fine_amt(self, loan):
+        return models.Fine.objects.get(loan_id=loan.id).fine_amt
+
+    def test_create_and_update(self):
+        loan = self.create_loans(1, 1, days_overdue=2)[0]
+        not_due = self.create_loans(2, 1)[0]
+        run = self.accrual.run()
+        self.assertEqual((run.loans_scanned, run.fines_created, run.fines_updated), (1, 1, 0))
+        self.assertEqual(self.get_fine_amt(loan), Decimal('0.50'))
+        self.assertFalse(models.Fine.objects.filter(loan_id=not_due.id).exists())
+
+        run = self.accrual.run(now=timezone.now() + timedelta(3))
+        self.assertEqual(run.fines_updated, 1)
+        self.assertEqual(self.get_fine_amt(loan), Decimal('1.25'))
+        self.assertEqual(self.get_fine_amt(not_due), Decimal('0.75'))
+
+    def test_stops_at_date_in(self):
+        loan = self.create_loans(1, 1, days_overdue=4)[0]
+        self.accrual.run()
+        # checkin after the run
+        loan.date_in = timezone.now()
+        loan.save()
+        run = self.accrual.run(now=timezone.now() + timedelta(1))
+        self.assertEqual(run.loans_scanned, 1)
+        self.assertEqual(self.get_fine_amt(loan), Decimal('1.00'))
+        # final, no longer scanned
+        run = self.accrual.run(now=timezone.now() + timedelta(5))
+        self.assertEqual(run.loans_scanned, 0)
+        self.assertEqual(self.get_fine_amt(loan), Decimal('1.00'))
+
+    def test_paid_fine_unchanged(self):
+        loan = self.create_loans(1, 1, days_overdue=4)[0]
+        models.Fine.objects.create(loan=loan, fine_amt=Decimal('0'), paid=True)
+        run = self.accrual.run()
+        self.assertEqual(run.loans_scanned, 0)
+        self.assertEqual(self.get_fine_amt(loan), Decimal('0'))
+
+    def test_batch_query_count_is_constant(self):
+        self.create_loans(1, 10, days_overdue=3)
+        self.accrual.run(batch_size=100)
+        self.accrual.tracker.refresh()
+        self.create_loans(20, 1, days_overdue=4)
+        with CaptureQueriesContext(connection) as ctx:
+            run = self.accrual.run(now=timezone.now() + timedelta(1), batch_size=100)
+        self.assertEqual((run.fines_created, run.fines_updated), (1, 10))
+        few = len(ctx.captured_queries)
+        self.create_loans(100, 50, days_overdue=5)
+        with CaptureQueriesContext(connection) as ctx:
+            run = self.accrual.run(now=timezone.now() + timedelta(2), batch_size=100)
+        self.assertEqual((run.fines_created, run.fines_updated), (50, 11))
+        self.assertEqual(len(ctx.captured_queries), few)
+
+    def test_tracker_refresh(self):
+        loans = self.create_loans(1, 2, days_overdue=3)
+        self.accrual.run()
+        loans[0].date_in = timezone.now()
+        loans[0].save()
+        late = self.create_loans(10, 1, days_overdue=2)[0]
+        run = self.accrual.run(now=timezone.now() + timedelta(1))
+        self.assertEqual(len(self.accrual.tracker), 2)
+        self.assertEqual((run.loans_scanned, run.fines_created, run.fines_updated), (3, 1, 1))
+        self.assertEqual(self.get_fine_amt(loans[0]), Decimal('0.75'))
+        self.assertEqual(self.get_fine_amt(loans[1]), Decimal('1.00'))
+        self.assertEqual(self.get_fine_amt(late), Decimal('0.75'))
+
+    def test_fines_as_of(self):
+        self.assertEqual(FineAccrual.get_fines_as_of(), None)
+        now = timezone.now()
+        self.accrual.run(now=now)
+        self.assertEqual(FineAccrual.get_fines_as_of(), now)
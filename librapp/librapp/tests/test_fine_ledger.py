@@ -0,0 +1,203 @@
+'''unittests for fine ledger and borrower balances
+
+run as:
+    $ python manage.py test librapp.tests.test_fine_ledger
+'''
+
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.fine_accrual import FineAccrual
+from librapp.lib.fine_ledger import FineLedger, LedgerError
+from librapp.tests.test_loans import LoanTestMixin
+
+
+def add_fine(loan, fine_amt, paid=False):
+    '''Creates a Fine and its ledger entry, as FineAccrual does
+    '''
+    fine = models.Fine.objects.create(loan=loan, fine_amt=fine_amt, paid=paid, paid_amt=fine_amt if paid else 0)
+    if not paid:
+        FineLedger().add_entries([models.FineLedgerEntry(card_no_id=loan.card_no_id, loan_id=loan.id,
+                                                         kind=models.FineLedgerEntry.FINE, amount=fine_amt)])
+    return fine
+
+
+class FineLedgerTest(LoanTestMixin, APITestCase):
+
+    def setUp(self):
+        self.create_branches()
+        self.ledger = FineLedger()
+
+    def get_entries(self, card_no):
+        entries = models.FineLedgerEntry.objects.filter(card_no_id=card_no).order_by('id')
+        return list(entries.values_list('kind', 'amount'))
+
+    def test_accrual_entries(self):
+        loan = self.create_loans(1, 1, days_overdue=2)[0]
+        FineAccrual().run()
+        self.assertEqual(self.ledger.get_balance(loan.card_no_id), Decimal('0.50'))
+        FineAccrual().run(now=timezone.now() + timedelta(2))
+        self.assertEqual(self.get_entries(loan.card_no_id), [('fine', Decimal('0.50')), ('fine', Decimal('0.50'))])
+        self.assertEqual(self.ledger.get_balance(loan.card_no_id), Decimal('1.00'))
+
+    def test_pay(self):
+        loan = self.create_loans(1, 1)[0]
+        fine = add_fine(loan, Decimal('1.10'))
+        fine, change = self.ledger.pay(fine.id, Decimal('0.30'))
+        self.assertEqual((fine.paid_amt, fine.paid, change), (Decimal('0.30'), False, Decimal('0')))
+        self.assertEqual(self.ledger.get_balance(loan.card_no_id), Decimal('0.80'))
+
+        fine, change = self.ledger.pay(fine.id, Decimal('1.00'))
+        self.assertEqual((fine.paid_amt, fine.paid, change), (Decimal('1.10'), True, Decimal('0.20')))
+        fine = models.Fine.objects.get(id=fine.id)
+        self.assertEqual((fine.fine_amt, fine.paid_amt, fine.paid), (Decimal('1.10'), Decimal('1.10'), True))
+        self.assertEqual(self.ledger.get_balance(loan.card_no_id), Decimal('0'))
+        self.assertEqual(self.get_entries(loan.card_no_id),
+                         [('fine', Decimal('1.10')), ('payment', Decimal('-0.30')), ('payment', Decimal('-0.80'))])
+
+        with self.assertRaises(LedgerError):
+            self.ledger.pay(fine.id, Decimal('1.00'))
+        with self.assertRaises(LedgerError):
+            self.ledger.pay(0, Decimal('1.00'))
+
+    def test_accrual_after_partial_payment(self):
+        loan = self.create_loans(1, 1, days_overdue=2)[0]
+        FineAccrual().run()
+        fine = models.Fine.objects.get(loan_id=loan.id)
+        self.ledger.pay(fine.id, Decimal('0.25'))
+        FineAccrual().run(now=timezone.now() + timedelta(1))
+        fine = models.Fine.objects.get(id=fine.id)
+        self.assertEqual((fine.fine_amt, fine.paid_amt), (Decimal('0.75'), Decimal('0.25')))
+        self.assertEqual(self.ledger.get_balance(loan.card_no_id), Decimal('0.50'))
+
+    def test_rebuild(self):
+        loans = self.create_loans(1, 3)
+        for i, loan in enumerate(loans):
+            add_fine(loan, Decimal(i + 1))
+        self.ledger.pay(models.Fine.objects.get(loan_id=loans[0].id).id, Decimal('1'))
+        expected = self.ledger.get_balances([_.card_no_id for _ in loans])
+        models.BorrowerBalance.objects.filter(card_no_id=loans[1].card_no_id).update(balance=Decimal('99'))
+        models.BorrowerBalance.objects.create(card_no_id=models.Borrower.objects.create(
+                ssn='999999999', fname='F', lname='L', address='A').card_no, balance=Decimal('5'))
+
+        self.assertEqual(self.ledger.rebuild(batch_size=2), 3)
+        self.assertEqual(self.ledger.get_balances([_.card_no_id for _ in loans]), expected)
+        self.assertEqual(expected[loans[0].card_no_id], Decimal('0'))
+        self.assertEqual(models.BorrowerBalance.objects.count(), 3)
+
+    def test_pay_view(self):
+        loan = self.create_loans(1, 1)[0]
+        fine = add_fine(loan, Decimal('1.10'))
+        path = '/books/fines/{0}/'.format(fine.id)
+        response = self.client.put(path, {'paid_amt': '0.10'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['paid_amt'], response.data['paid'], response.data['change']),
+                         (Decimal('0.10'), False, Decimal('0')))
+        response = self.client.put(path, {'paid_amt': 2}, format='json')
+        self.assertEqual((response.data['paid'], response.data['change']), (True, Decimal('1.00')))
+        self.assertEqual(response.data['balance'], Decimal('0'))
+        response = self.client.put(path, {'paid_amt': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(path, {'paid_amt': '-1'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/books/fines/balance/', {'card_no': loan.card_no_id})
+        self.assertEqual(response.data, {'card_no': loan.card_no_id, 'balance': Decimal('0')})
+
+    def create_fines(self, amounts, start=1):
+        '''Creates a fine for each amount, on loans of one borrower, the first due the earliest
+        '''
+        loans = self.create_loans(start, len(amounts))
+        card_no = loans[0].card_no_id
+        fines = []
+        for i, (loan, fine_amt) in enumerate(zip(loans, amounts)):
+            loan.card_no_id = card_no
+            loan.due_date = timezone.now() - timedelta(len(amounts) - i)
+            loan.save()
+            fines.append(add_fine(loan, fine_amt))
+        return card_no, fines
+
+    def test_settle(self):
+        card_no, fines = self.create_fines([Decimal('1.00'), Decimal('2.00'), Decimal('3.00')])
+        allocations, change = self.ledger.settle(card_no, Decimal('2.50'))
+        self.assertEqual([(fine.id, applied) for fine, applied in allocations],
+                         [(fines[0].id, Decimal('1.00')), (fines[1].id, Decimal('1.50'))])
+        self.assertEqual(change, Decimal('0'))
+        self.assertEqual([(_.paid_amt, _.paid) for _ in models.Fine.objects.order_by('id')],
+                         [(Decimal('1.00'), True), (Decimal('1.50'), False), (Decimal('0'), False)])
+        self.assertEqual(self.ledger.get_balance(card_no), Decimal('3.50'))
+
+        allocations, change = self.ledger.settle(card_no, Decimal('10.00'))
+        self.assertEqual([applied for fine, applied in allocations], [Decimal('0.50'), Decimal('3.00')])
+        self.assertEqual(change, Decimal('6.50'))
+        self.assertFalse(models.Fine.objects.filter(paid=False).exists())
+        self.assertEqual(self.ledger.get_balance(card_no), Decimal('0'))
+        with self.assertRaises(LedgerError):
+            self.ledger.settle(card_no, Decimal('1.00'))
+
+    def test_settle_query_count_is_constant(self):
+        card_no, fines = self.create_fines([Decimal('1.00')] * 2)
+        with CaptureQueriesContext(connection) as ctx:
+            self.ledger.settle(card_no, Decimal('5.00'))
+        few = len(ctx.captured_queries)
+        card_no, fines = self.create_fines([Decimal('1.00')] * 20, start=100)
+        with CaptureQueriesContext(connection) as ctx:
+            allocations, change = self.ledger.settle(card_no, Decimal('15.00'))
+        self.assertEqual(len(ctx.captured_queries), few)
+        self.assertEqual(len(allocations), 15)
+
+    def test_settle_view(self):
+        card_no, fines = self.create_fines([Decimal('0.75'), Decimal('1.00')])
+        path = '/books/fines/settle/'
+        response = self.client.post(path, {'card_no': card_no, 'amount': '2.00'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['applied'], response.data['change'], response.data['balance']),
+                         (Decimal('1.75'), Decimal('0.25'), Decimal('0')))
+        self.assertEqual([(_['id'], _['applied'], _['paid']) for _ in response.data['fines']],
+                         [(fines[0].id, Decimal('0.75'), True), (fines[1].id, Decimal('1.00'), True)])
+        response = self.client.post(path, {'card_no': card_no, 'amount': '2.00'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(path, {'card_no': card_no, 'amount': '0.001'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_amounts(self):
+        card_no, fines = self.create_fines([Decimal('1.00')])
+        for amount in ['NaN', 'sNaN', 'Infinity', '-Infinity', '1e400', 'abc']:
+            response = self.client.put('/books/fines/{0}/'.format(fines[0].id), {'paid_amt': amount}, format='json')
+            self.assertEqual(response.status_code, 400, msg=amount)
+            self.assertIn('paid_amt', response.data['msg'])
+            response = self.client.post('/books/fines/settle/', {'card_no': card_no, 'amount': amount}, format='json')
+            self.assertEqual(response.status_code, 400, msg=amount)
+            self.assertIn('amount', response.data['msg'])
+        self.assertEqual(self.ledger.get_balance(card_no), Decimal('1.00'))
+
+    def test_open_ledger_after_payments(self):
+        '''Migration 0014 backfill, of a fine with 0.60 taken off fine_amt by a payment before the ledger
+        '''
+        loan = self.create_loans(1, 1, days_overdue=4)[0]
+        FineAccrual().run()
+        models.FineLedgerEntry.objects.all().delete()
+        models.BorrowerBalance.objects.all().delete()
+        models.Fine.objects.filter(loan_id=loan.id).update(fine_amt=Decimal('0.40'), paid_amt=0)
+
+        # the migration has its own copy of the fine rule, settings do not change it
+        with override_settings(FINE_POLICY={'daily_fine': '9.00', 'grace_days': 2}):
+            import_module('librapp.migrations.0014_fine_ledger').open_ledger(apps, None)
+        fine = models.Fine.objects.get(loan_id=loan.id)
+        self.assertEqual((fine.fine_amt, fine.paid_amt, fine.paid), (Decimal('1.00'), Decimal('0.60'), False))
+        self.assertEqual(self.get_entries(loan.card_no_id), [('fine', Decimal('1.00')), ('payment', Decimal('-0.60'))])
+        self.assertEqual(self.ledger.get_balance(loan.card_no_id), Decimal('0.40'))
+
+        # the next accrual only adds the day since
+        FineAccrual().run(now=timezone.now() + timedelta(1))
+        self.assertEqual(models.Fine.objects.get(loan_id=loan.id).fine_amt, Decimal('1.25'))
+        self.assertEqual(self.ledger.get_balance(loan.card_no_id), Decimal('0.65'))
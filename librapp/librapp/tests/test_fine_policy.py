@@ -0,0 +1,95 @@
+'''unittests for fine policy and fine projection
+
+run as:
+    $ python manage.py test librapp.tests.test_fine_policy
+'''
+
+from unittest import skipUnless
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.fine_accrual import FineAccrual
+from librapp.lib.fine_policy import FinePolicy, np
+from librapp.lib.fine_projection import FineProjection, LoanArrays
+from librapp.tests.test_loans import LoanTestMixin
+
+
+class FinePolicyTest(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def get_fine_amt(self, policy, days_overdue, returned_after=None, lib_branch_id=None):
+        due_date = self.now - timedelta(days_overdue)
+        date_in = due_date + timedelta(returned_after) if returned_after is not None else None
+        return policy.get_fine_amt(due_date, date_in, self.now, lib_branch_id=lib_branch_id)
+
+    def test_default(self):
+        policy = FinePolicy()
+        self.assertEqual(self.get_fine_amt(policy, 3), Decimal('0.75'))
+        self.assertEqual(self.get_fine_amt(policy, 3, returned_after=1), Decimal('0.25'))
+        self.assertEqual(self.get_fine_amt(policy, 0.5), None)
+        self.assertEqual(self.get_fine_amt(policy, 3, returned_after=-1), None)
+
+    def test_grace_cap_and_branch_rates(self):
+        policy = FinePolicy(daily_fine='0.50', grace_days=2, max_fine='2.00', branch_rates={3: '0.10'})
+        self.assertEqual(self.get_fine_amt(policy, 2), None)
+        self.assertEqual(self.get_fine_amt(policy, 3), Decimal('0.50'))
+        self.assertEqual(self.get_fine_amt(policy, 30), Decimal('2.00'))
+        self.assertEqual(self.get_fine_amt(policy, 5, lib_branch_id=3), Decimal('0.30'))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, FinePolicy, daily_fine='0.255')
+        self.assertRaises(ValueError, FinePolicy, max_fine='-1')
+        self.assertRaises(ValueError, FinePolicy, grace_days=-1)
+
+    @override_settings(FINE_POLICY={'daily_fine': '1.00', 'grace_days': 1})
+    def test_from_settings(self):
+        policy = FinePolicy.from_settings()
+        self.assertEqual((policy.daily_fine, policy.grace_days, policy.max_fine), (Decimal('1.00'), 1, None))
+
+    @skipUnless(np is not None, 'numpy is not installed')
+    def test_vectorized_same_as_scalar(self):
+        policy = FinePolicy(daily_fine='0.50', grace_days=1, max_fine='3.00', branch_rates={2: '0.10'})
+        rows = []
+        for days_overdue in [-2, 0, 0.99, 1, 1.000001, 2, 3.5, 7, 40]:
+            for returned_after in [None, -1, 0.5, 2, 6.999999]:
+                for lib_branch_id in [1, 2]:
+                    due_date = self.now - timedelta(days_overdue)
+                    date_in = due_date + timedelta(returned_after) if returned_after is not None else None
+                    rows.append((due_date, date_in, lib_branch_id))
+        loans = LoanArrays.from_rows(rows)
+        cents = policy.get_fine_cents(loans.due, loans.date_in, loans.has_date_in, loans.branch_ids, self.now)
+        expected = [policy.get_fine_amt(d, i, self.now, lib_branch_id=b) or 0 for d, i, b in rows]
+        self.assertEqual([Decimal(int(_)) / 100 for _ in cents], expected)
+
+
+@skipUnless(np is not None, 'numpy is not installed')
+class FineProjectionTest(LoanTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_branches()
+        self.create_loans(1, 2, days_overdue=4)
+        self.create_loans(10, 1, branch=self.other_branch, days_overdue=40)
+        self.create_loans(20, 2)
+
+    def test_project(self):
+        loans = LoanArrays.load(chunk_size=2)
+        self.assertEqual(len(loans), 5)
+        result = FineProjection(FinePolicy(max_fine='5.00')).project(loans, timezone.now())
+        self.assertEqual((result['loans'], result['fined'], result['fine_amt']), (5, 3, Decimal('7.00')))
+        self.assertEqual(result['branches'][self.branch.id], {'loans': 4, 'fined': 2, 'fine_amt': Decimal('2.00')})
+        self.assertEqual(result['branches'][self.other_branch.id]['fine_amt'], Decimal('5.00'))
+
+    @override_settings(FINE_POLICY={'daily_fine': '0.25', 'max_fine': '5.00'})
+    def test_accrual_uses_same_policy(self):
+        now = timezone.now()
+        FineAccrual().run(now=now)
+        result = FineProjection(FinePolicy.from_settings()).project(LoanArrays.load(), now)
+        fines = models.Fine.objects.all()
+        self.assertEqual(sum(_.fine_amt for _ in fines), result['fine_amt'])
+        self.assertEqual(len(fines), result['fined'])
@@ -0,0 +1,79 @@
+'''unittests for fine summary
+
+run as:
+    $ python manage.py test librapp.tests.test_fine_summary
+'''
+
+from decimal import Decimal
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from librapp.lib.fine_ledger import FineLedger
+from librapp.lib.fine_summary import FineSummary
+from librapp.tests.test_fine_ledger import add_fine
+from librapp.tests.test_loans import LoanTestMixin
+
+
+class FineSummaryTest(LoanTestMixin, APITestCase):
+
+    def setUp(self):
+        self.create_branches()
+        self.fs = FineSummary()
+        self.fs.cache.clear()
+        self.path = '/books/fines/summary/'
+        # 2 fines at branch, due 3 and 20 days ago, 1 at other branch due 100 days ago
+        loans = self.create_loans(1, 1, days_overdue=3) + self.create_loans(2, 1, days_overdue=20)
+        self.fines = [add_fine(loans[0], Decimal('0.75')), add_fine(loans[1], Decimal('5.00'))]
+        add_fine(self.create_loans(3, 1, branch=self.other_branch, days_overdue=100)[0], Decimal('25.00'), paid=True)
+        FineLedger().pay(self.fines[1].id, Decimal('1.25'))
+        self.create_loans(10, 2)
+
+    def get_summary(self, lib_branch_id=None):
+        with CaptureQueriesContext(connection) as ctx:
+            summary = self.fs.get_summary(lib_branch_id=lib_branch_id)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        return summary
+
+    def test_totals(self):
+        summary = self.get_summary()
+        self.assertEqual(summary['totals'], {
+                'count': 3, 'fine_amt': Decimal('30.75'),
+                'paid_count': 1, 'paid_amt': Decimal('26.25'),
+                'unpaid_count': 2, 'unpaid_amt': Decimal('4.50')})
+        self.assertEqual([(_['lib_branch_id'], _['count'], _['unpaid_amt']) for _ in summary['branches']],
+                         [(self.branch.id, 2, Decimal('4.50')), (self.other_branch.id, 1, Decimal('0'))])
+
+    def test_overdue_days(self):
+        summary = self.get_summary()
+        self.assertEqual([(_['days'], _['count'], _['fine_amt'], _['unpaid_amt']) for _ in summary['overdue_days']], [
+                ('1-7', 1, Decimal('0.75'), Decimal('0.75')),
+                ('8-30', 1, Decimal('5.00'), Decimal('3.75')),
+                ('31-90', 0, Decimal('0'), Decimal('0')),
+                ('91+', 1, Decimal('25.00'), Decimal('0'))])
+
+    def test_branch_filter(self):
+        summary = self.get_summary(lib_branch_id=self.other_branch.id)
+        self.assertEqual(summary['totals']['count'], 1)
+        self.assertEqual([_['count'] for _ in summary['overdue_days']], [0, 0, 0, 1])
+
+    def test_view_cache(self):
+        response = self.client.get(self.path, {'lib_branch_id': self.branch.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['unpaid_amt'], Decimal('4.50'))
+        FineLedger().pay(self.fines[0].id, Decimal('0.75'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.path, {'lib_branch_id': self.branch.id})
+        self.assertEqual(response.data['totals']['unpaid_amt'], Decimal('4.50'))
+        self.assertEqual(len([_ for _ in ctx.captured_queries if 'librapp_fine"' in _['sql']]), 0)
+        response = self.client.get(self.path, {'lib_branch_id': self.branch.id, 'cache': 'false'})
+        self.assertEqual(response.data['totals']['unpaid_amt'], Decimal('3.75'))
+
+    @override_settings(FINE_SUMMARY_CACHE_TTL=0)
+    def test_no_cache(self):
+        self.client.get(self.path)
+        FineLedger().pay(self.fines[0].id, Decimal('0.75'))
+        response = self.client.get(self.path)
+        self.assertEqual(response.data['totals']['unpaid_count'], 1)
@@ -0,0 +1,164 @@
+'''unittests for holds
+
+run as:
+    $ python manage.py test librapp.tests.test_holds
+'''
+
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.hold_queue import HoldError, HoldQueue
+from librapp.lib.loan_service import LoanError, LoanService
+from librapp.tests.test_loan_service import LoanServiceTestMixin
+
+
+class HoldQueueTest(LoanServiceTestMixin, APITestCase):
+
+    def setUp(self):
+        self.create_data(no_of_copies=1, borrowers=4)
+        self.ls = LoanService()
+        self.hq = HoldQueue()
+        self.card_nos = [_.card_no for _ in self.borrowers]
+        self.loan = self.ls.checkout(self.branch.id, '0380699710', self.card_nos[0])
+
+    def place(self, card_no):
+        return self.hq.place(self.branch.id, '0380699710', card_no)
+
+    def get_hold(self, hold):
+        return models.Hold.objects.get(id=hold.id)
+
+    def assertHoldError(self, msg, func, *args, **kwargs):
+        with self.assertRaises(HoldError) as ctx:
+            func(*args, **kwargs)
+        self.assertEqual(ctx.exception.message, msg)
+
+    def test_place(self):
+        self.assertHoldError('Book is already loaned to the borrower', self.place, self.card_nos[0])
+        hold = self.place(self.card_nos[1])
+        self.assertHoldError('Hold already placed', self.place, self.card_nos[1])
+        self.assertHoldError('Could not create Hold', self.place, 0)
+        self.assertHoldError('Could not create Hold', self.hq.place, self.branch.id, '0000000000', self.card_nos[1])
+        self.assertEqual(self.hq.get_position(hold), 1)
+        self.assertEqual(self.hq.get_position(self.place(self.card_nos[2])), 2)
+
+        self.ls.checkin(self.loan.id)
+        self.assertHoldError('Hold already placed', self.place, self.card_nos[1])
+        self.ls.checkout(self.branch.id, '0380699710', self.card_nos[1])
+        models.BookCopy.objects.filter(id=self.copy.id).update(no_of_copies=1)
+        self.assertHoldError('Book is available, no hold needed', self.place, self.card_nos[3])
+
+    def test_checkin_hands_copy_to_next_hold(self):
+        first = self.place(self.card_nos[1])
+        second = self.place(self.card_nos[2])
+        self.ls.checkin(self.loan.id)
+        self.assertEqual(self.get_copies(), 0)
+        first = self.get_hold(first)
+        self.assertEqual(first.status, models.Hold.READY)
+        self.assertTrue(first.expires_at > timezone.now())
+        self.assertEqual(self.hq.get_position(self.get_hold(second)), 1)
+
+        # the copy is kept for the first hold
+        with self.assertRaises(LoanError):
+            self.ls.checkout(self.branch.id, '0380699710', self.card_nos[3])
+        loan = self.ls.checkout(self.branch.id, '0380699710', self.card_nos[1])
+        self.assertEqual(self.get_hold(first).status, models.Hold.FULFILLED)
+        self.assertEqual(self.get_copies(), 0)
+
+        self.ls.checkin(loan.id)
+        self.assertEqual(self.get_hold(second).status, models.Hold.READY)
+        self.assertEqual(self.get_copies(), 0)
+
+    def test_checkin_query_count_does_not_depend_on_queue(self):
+        self.place(self.card_nos[1])
+        with CaptureQueriesContext(connection) as ctx:
+            self.ls.checkin(self.loan.id)
+        few = len(ctx.captured_queries)
+
+        for card_no in self.card_nos[1:]:
+            models.Hold.objects.create(book=self.copy, card_no_id=card_no)
+        loan = self.ls.checkout(self.branch.id, '0380699710', self.card_nos[1])
+        with CaptureQueriesContext(connection) as ctx:
+            self.ls.checkin(loan.id)
+        self.assertEqual(len(ctx.captured_queries), few)
+
+    def test_cancel(self):
+        first = self.place(self.card_nos[1])
+        second = self.place(self.card_nos[2])
+        self.assertEqual(self.hq.cancel(first.id).status, models.Hold.CANCELLED)
+        self.assertHoldError('Hold is not active', self.hq.cancel, first.id)
+        self.assertHoldError('Hold does not exist', self.hq.cancel, 0)
+        self.assertEqual(self.hq.get_position(self.get_hold(second)), 1)
+
+        self.ls.checkin(self.loan.id)
+        self.hq.cancel(second.id)
+        # no hold waiting, back to the shelf
+        self.assertEqual(self.get_copies(), 1)
+
+    def test_expire(self):
+        first = self.place(self.card_nos[1])
+        second = self.place(self.card_nos[2])
+        self.ls.checkin(self.loan.id)
+        self.assertEqual(self.hq.expire(), 0)
+        self.assertEqual(self.hq.expire(now=timezone.now() + timedelta(HoldQueue.HOLD_DAYS + 1)), 1)
+        self.assertEqual(self.get_hold(first).status, models.Hold.EXPIRED)
+        self.assertEqual(self.get_hold(second).status, models.Hold.READY)
+        self.assertEqual(self.get_copies(), 0)
+
+    def test_bulk(self):
+        other = models.Book.objects.create(isbn='0151009376', title='Other', cover='')
+        other_copy = models.BookCopy.objects.create(isbn=other, lib_branch=self.branch, no_of_copies=1)
+        other_loan = self.ls.checkout(self.branch.id, '0151009376', self.card_nos[0])
+        first = self.place(self.card_nos[1])
+        second = self.place(self.card_nos[2])
+        results = self.ls.bulk_checkin([self.loan.id, other_loan.id])
+        self.assertEqual([_['status'] for _ in results], [200, 200])
+        self.assertEqual(self.get_hold(first).status, models.Hold.READY)
+        self.assertEqual(self.get_hold(second).status, models.Hold.WAITING)
+        self.assertEqual(models.BookCopy.objects.get(id=other_copy.id).no_of_copies, 1)
+
+        items = [{'isbn': '0380699710', 'card_no': self.card_nos[3]},
+                 {'isbn': '0380699710', 'card_no': self.card_nos[1]}]
+        results = self.ls.bulk_checkout(self.branch.id, items)
+        self.assertEqual([_['status'] for _ in results], [400, 200])
+        self.assertEqual(self.get_hold(first).status, models.Hold.FULFILLED)
+        self.assertEqual(self.get_copies(), 0)
+
+
+class HoldsViewTest(LoanServiceTestMixin, APITestCase):
+
+    def setUp(self):
+        self.create_data(no_of_copies=0, borrowers=3)
+        self.path = '/books/holds/'
+        self.card_nos = [_.card_no for _ in self.borrowers]
+
+    def place(self, card_no):
+        return self.client.post(self.path, {'lib_branch_id': self.branch.id, 'isbn': '0380699710', 'card_no': card_no})
+
+    def test_place_query_cancel(self):
+        response = self.place(self.card_nos[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['position']), ('waiting', 1))
+        first_id = response.data['id']
+        response = self.place(self.card_nos[1])
+        self.assertEqual(response.data['position'], 2)
+        second_id = response.data['id']
+        response = self.place(self.card_nos[1])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['msg'], 'Hold already placed')
+
+        response = self.client.get(self.path, {'isbn': '0380699710', 'active': 'true'})
+        self.assertEqual([(_['id'], _['position']) for _ in response.data['holds']], [(first_id, 1), (second_id, 2)])
+
+        response = self.client.delete('{0}{1}/'.format(self.path, first_id))
+        self.assertEqual(response.data['status'], 'cancelled')
+        response = self.client.get('{0}{1}/'.format(self.path, second_id))
+        self.assertEqual(response.data['position'], 1)
+        response = self.client.get(self.path, {'card_no': self.card_nos[0], 'active': 'true'})
+        self.assertEqual(response.data['holds'], [])
+        response = self.client.get('{0}0/'.format(self.path))
+        self.assertEqual(response.status_code, 400)
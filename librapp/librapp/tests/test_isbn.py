@@ -0,0 +1,69 @@
+'''unittests for ISBN normalization and lookup
+
+run as:
+    $ python manage.py test librapp.tests.test_isbn
+'''
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.search_cache import search_cache
+from librapp.utils.isbn_utils import ISBNUtils
+
+
+class ISBNUtilsTest(TestCase):
+
+    def setUp(self):
+        self.iutils = ISBNUtils()
+
+    def test_parse(self):
+        self.assertEqual(self.iutils.parse('0380699710'), ('0380699710', '9780380699711'))
+        self.assertEqual(self.iutils.parse('0-380-69971-0'), ('0380699710', '9780380699711'))
+        self.assertEqual(self.iutils.parse('978-0-380-69971-1'), ('0380699710', '9780380699711'))
+        self.assertEqual(self.iutils.parse('080442957x'), ('080442957X', '9780804429573'))
+        self.assertEqual(self.iutils.parse('9791032305690'), (None, '9791032305690'))
+
+    def test_parse_invalid(self):
+        self.assertEqual(self.iutils.parse('0380699711'), None)
+        self.assertEqual(self.iutils.parse('9780380699712'), None)
+        self.assertEqual(self.iutils.parse('rich and'), None)
+
+    def test_is_isbn_shaped(self):
+        self.assertTrue(self.iutils.is_isbn_shaped('0380699711'))
+        self.assertTrue(self.iutils.is_isbn_shaped('978 0380699711'))
+        self.assertFalse(self.iutils.is_isbn_shaped('rich and'))
+        self.assertFalse(self.iutils.is_isbn_shaped('1984'))
+
+    def test_book_save_sets_isbn13(self):
+        book = models.Book.objects.create(isbn='0380699710', title='The Rich And The Mighty', cover='')
+        self.assertEqual(models.Book.objects.get(isbn=book.isbn).isbn13, '9780380699711')
+
+
+@override_settings(SEARCH_BACKEND='icontains')
+class ISBNSearchTest(APITestCase):
+
+    def setUp(self):
+        self.path = '/search/'
+        search_cache.clear()
+        models.Book.objects.create(isbn='0380699710', title='The Rich And The Mighty', cover='')
+
+    def _search(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.path, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        sqls = [_['sql'] for _ in ctx.captured_queries]
+        self.assertFalse(any('LIKE' in _ for _ in sqls), msg=sqls)
+        return response
+
+    def test_list_isbn_forms(self):
+        for query in ['0380699710', '0-380-69971-0', '9780380699711', '978-0-380-69971-1']:
+            response = self._search(query)
+            self.assertEqual(response.data['count'], 1, msg=query)
+            self.assertEqual(response.data['books'][0]['isbn'], '0380699710')
+
+    def test_list_isbn_not_found(self):
+        response = self._search('9780553273281')
+        self.assertEqual(response.data['count'], 0)
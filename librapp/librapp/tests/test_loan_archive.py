@@ -0,0 +1,128 @@
+'''unittests for loan archive
+
+run as:
+    $ python manage.py test librapp.tests.test_loan_archive
+'''
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.fine_accrual import FineAccrual
+from librapp.lib.loan_archive import LoanArchive
+from librapp.lib.loan_service import LoanService
+from librapp.tests.test_loans import LoanTestMixin
+
+
+class LoanArchiveTest(LoanTestMixin, APITestCase):
+
+    def setUp(self):
+        self.create_branches()
+        self.archive = LoanArchive(batch_size=2, pause=0, min_age_days=0)
+
+    def checkin(self, loans, days_ago=40):
+        date_in = timezone.now() - timedelta(days_ago)
+        models.BookLoan.objects.filter(id__in=[_.id for _ in loans]).update(date_in=date_in)
+
+    def test_archive_returned_and_paid(self):
+        returned = self.create_loans(1, 2)
+        late = self.create_loans(10, 2, days_overdue=45)
+        active = self.create_loans(20, 1)
+        self.checkin(returned + late)
+        FineAccrual().run()
+        models.Fine.objects.filter(loan_id=late[0].id).update(paid=True)
+        fine = models.Fine.objects.get(loan_id=late[0].id)
+
+        result = self.archive.run()
+        self.assertEqual((result['loans'], result['fines']), (3, 1))
+        archived_ids = [returned[0].id, returned[1].id, late[0].id]
+        self.assertEqual(sorted(models.ArchivedLoan.objects.values_list('id', flat=True)), archived_ids)
+        self.assertEqual(sorted(models.BookLoan.objects.values_list('id', flat=True)), [late[1].id, active[0].id])
+        archived_fine = models.ArchivedFine.objects.get()
+        self.assertEqual((archived_fine.id, archived_fine.loan_id, archived_fine.fine_amt, archived_fine.paid),
+                         (fine.id, late[0].id, Decimal('1.25'), True))
+        self.assertFalse(models.Fine.objects.filter(id=fine.id).exists())
+
+        archived = models.ArchivedLoan.objects.get(id=returned[0].id)
+        self.assertEqual((archived.book_id, archived.card_no_id, archived.due_date),
+                         (returned[0].book_id, returned[0].card_no_id, returned[0].due_date))
+
+    def test_nothing_before_fine_accrual(self):
+        self.checkin(self.create_loans(1, 2, days_overdue=45))
+        self.assertEqual(self.archive.run()['loans'], 0)
+
+        # checked in after the last run, fine not final yet
+        FineAccrual().run(now=timezone.now() - timedelta(50))
+        self.assertEqual(self.archive.run()['loans'], 0)
+        FineAccrual().run()
+        self.assertEqual(models.Fine.objects.count(), 2)
+        self.assertEqual(self.archive.run()['loans'], 0)
+
+    def test_min_age(self):
+        loans = self.create_loans(1, 2)
+        self.checkin(loans[:1], days_ago=40)
+        self.checkin(loans[1:], days_ago=10)
+        FineAccrual().run()
+        result = LoanArchive(pause=0, min_age_days=30).run()
+        self.assertEqual(result['loans'], 1)
+        self.assertEqual(models.ArchivedLoan.objects.get().id, loans[0].id)
+
+    def test_restart(self):
+        loans = self.create_loans(1, 5)
+        self.checkin(loans)
+        FineAccrual().run()
+        result = self.archive.run(max_batches=1)
+        self.assertEqual((result['loans'], result['batches']), (2, 1))
+        result = self.archive.run()
+        self.assertEqual((result['loans'], result['batches']), (3, 2))
+        self.assertEqual(models.ArchivedLoan.objects.count(), 5)
+        self.assertFalse(models.BookLoan.objects.exists())
+        self.assertEqual(self.archive.run()['loans'], 0)
+
+    def test_archive_changed_loan(self):
+        loans = self.create_loans(1, 2, days_overdue=45)
+        self.checkin(loans)
+        FineAccrual().run()
+        models.Fine.objects.update(paid=True)
+        before = self.archive.get_archive_before()
+        # fine refunded after the batch was read
+        models.Fine.objects.filter(loan_id=loans[1].id).update(paid=False)
+        self.assertEqual(self.archive.archive([_.id for _ in loans], before), (1, 1))
+        self.assertEqual(models.BookLoan.objects.get().id, loans[1].id)
+
+    def test_checkout_same_copy_after_archive(self):
+        loan = self.create_loans(1, 1)[0]
+        self.checkin([loan])
+        FineAccrual().run()
+        self.archive.run()
+        models.BookCopy.objects.filter(id=loan.book_id).update(no_of_copies=1)
+        new_loan = LoanService().checkout(self.branch.id, loan.book.isbn_id, loan.card_no_id)
+        self.assertEqual(new_loan.book_id, loan.book_id)
+
+    def test_history(self):
+        loans = self.create_loans(1, 3, days_overdue=45)
+        self.create_loans(10, 1, branch=self.other_branch)
+        self.checkin(loans)
+        FineAccrual().run()
+        models.Fine.objects.update(paid=True)
+        models.BookLoan.objects.filter(id=loans[2].id).update(card_no=loans[0].card_no_id)
+        self.archive.run()
+
+        response = self.client.get('/books/loans/history/', {'card_no': loans[0].card_no_id, 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([_['id'] for _ in response.data['books_loans']], [loans[0].id])
+        fine = response.data['books_loans'][0]['fine']
+        self.assertEqual((fine['paid'], fine['unpaid_amt']), (True, Decimal('0')))
+        self.assertEqual(fine['paid_amt'], fine['fine_amt'])
+        cursor = response['X-Next-Cursor']
+        response = self.client.get('/books/loans/history/', {'card_no': loans[0].card_no_id, 'cursor': cursor})
+        self.assertEqual([_['id'] for _ in response.data['books_loans']], [loans[2].id])
+        self.assertEqual(response.data['next_cursor'], None)
+
+        response = self.client.get('/books/loans/history/', {'lib_branch_id': self.branch.id})
+        self.assertEqual(len(response.data['books_loans']), 3)
+        response = self.client.get('/books/loans/', {'card_no': loans[0].card_no_id})
+        self.assertEqual(response.data['books_loans'], [])
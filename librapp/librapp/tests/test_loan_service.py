@@ -0,0 +1,180 @@
+'''unittests for checkout and checkin
+
+run as:
+    $ python manage.py test librapp.tests.test_loan_service
+'''
+
+import threading
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.loan_service import LoanError, LoanService
+from librapp.tests.test_fine_ledger import add_fine
+
+
+class LoanServiceTestMixin(object):
+
+    def create_data(self, no_of_copies=1, borrowers=1):
+        self.branch = models.LibraryBranch.objects.create(branch_name='Oak Lawn', address='4100 Cedar Springs Road')
+        self.book = models.Book.objects.create(isbn='0380699710', title='The Rich And The Mighty', cover='')
+        self.copy = models.BookCopy.objects.create(isbn=self.book, lib_branch=self.branch, no_of_copies=no_of_copies)
+        self.borrowers = [models.Borrower.objects.create(ssn='{0:09d}'.format(i), fname='F', lname='L', address='A')
+                          for i in xrange(borrowers)]
+
+    def get_copies(self):
+        return models.BookCopy.objects.get(id=self.copy.id).no_of_copies
+
+
+class LoanServiceTest(LoanServiceTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_data(no_of_copies=1, borrowers=2)
+        self.ls = LoanService()
+        self.card_no = self.borrowers[0].card_no
+
+    def checkout(self, card_no=None, isbn='0380699710'):
+        return self.ls.checkout(lib_branch_id=self.branch.id, isbn=isbn, card_no=card_no or self.card_no)
+
+    def assertLoanError(self, msg, func, *args, **kwargs):
+        with self.assertRaises(LoanError) as ctx:
+            func(*args, **kwargs)
+        self.assertEqual(ctx.exception.message, msg)
+
+    def test_checkout_checkin(self):
+        loan = self.checkout()
+        self.assertEqual(self.get_copies(), 0)
+        self.assertEqual(loan.book_id, self.copy.id)
+        loan = self.ls.checkin(loan.id)
+        self.assertNotEqual(loan.date_in, None)
+        self.assertEqual(self.get_copies(), 1)
+        self.assertLoanError('Book is already checked in.', self.ls.checkin, loan.id)
+        self.assertEqual(self.get_copies(), 1)
+
+    def test_not_available(self):
+        self.checkout()
+        self.assertLoanError('Book is not available', self.checkout, card_no=self.borrowers[1].card_no)
+        self.assertEqual(models.BookLoan.objects.count(), 1)
+
+    def test_same_book_twice(self):
+        self.copy.no_of_copies = 2
+        self.copy.save()
+        self.checkout()
+        self.assertLoanError('Cannot loan the same book twice', self.checkout)
+
+    def test_same_book_twice_only_copy(self):
+        # borrower checks come before availability, as in the view before LoanService
+        self.checkout()
+        self.assertLoanError('Cannot loan the same book twice', self.checkout)
+        self.assertEqual(self.get_copies(), 0)
+
+    def test_unpaid_fine_not_available(self):
+        book = models.Book.objects.create(isbn='0000000001', title='Book', cover='')
+        models.BookCopy.objects.create(isbn=book, lib_branch=self.branch, no_of_copies=1)
+        add_fine(self.checkout(card_no=self.borrowers[1].card_no, isbn=book.isbn), Decimal('0.25'))
+        self.checkout()
+        self.assertLoanError('Unpaid fines. Cannot borrow any books at this time',
+                             self.checkout, card_no=self.borrowers[1].card_no)
+
+    def test_failed_loan_create_keeps_copy(self):
+        loan = self.checkout()
+        self.ls.checkin(loan.id)
+        # unique (book, card_no)
+        self.assertLoanError('Could not create Loan Entry', self.checkout)
+        self.assertEqual(self.get_copies(), 1)
+
+    def test_unpaid_fine(self):
+        loan = self.checkout()
+        self.ls.checkin(loan.id)
+        add_fine(loan, Decimal('0.25'))
+        self.assertLoanError('Unpaid fines. Cannot borrow any books at this time', self.checkout)
+
+    def test_borrow_limit(self):
+        for i in xrange(3):
+            book = models.Book.objects.create(isbn='000000000{0}'.format(i), title='Book', cover='')
+            models.BookCopy.objects.create(isbn=book, lib_branch=self.branch, no_of_copies=1)
+            self.checkout(isbn=book.isbn)
+        self.assertLoanError('Cannot borrow more that 3 books at a time', self.checkout)
+        self.assertEqual(self.get_copies(), 1)
+
+    def test_unknown(self):
+        self.assertLoanError('Could not create Loan Entry', self.checkout, isbn='0000000000')
+        self.assertLoanError('Could not update Loan Entry', self.ls.checkin, 1000)
+
+
+class LoanViewTest(LoanServiceTestMixin, APITestCase):
+
+    def setUp(self):
+        self.path = '/books/loans/'
+        self.create_data(no_of_copies=1, borrowers=2)
+
+    def test_create_update(self):
+        data = {'lib_branch_id': self.branch.id, 'isbn': '0380699710', 'card_no': self.borrowers[0].card_no}
+        response = self.client.post(self.path, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['book_copy_id'], self.copy.id)
+        self.assertEqual(response.data['isbn'], '0380699710')
+        loan_id = response.data['id']
+
+        data['card_no'] = self.borrowers[1].card_no
+        response = self.client.post(self.path, data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['msg'], 'Book is not available')
+
+        response = self.client.put('{0}{1}/'.format(self.path, loan_id), {})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.put('{0}{1}/'.format(self.path, loan_id), {})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['msg'], 'Book is already checked in.')
+
+
+def allows_parallel_connections():
+    '''True if connections of other threads see the test database: MySQL, or SQLite with a file
+    test database, see settings_test_sqlite.py. In memory SQLite is one database per connection
+    '''
+    if connection.features.test_db_allows_multiple_connections:
+        return True
+    test_name = connection.settings_dict.get('TEST', {}).get('NAME')
+    return connection.vendor == 'sqlite' and bool(test_name) and test_name != ':memory:'
+
+
+@skipUnless(allows_parallel_connections(), 'needs a test database shared by connections, MySQL or SQLite file')
+class CheckoutConcurrencyTest(LoanServiceTestMixin, TransactionTestCase):
+    '''Parallel checkouts of one copy, from separate connections
+    '''
+
+    COPIES = 5
+    THREADS = 40
+
+    def setUp(self):
+        self.create_data(no_of_copies=self.COPIES, borrowers=self.THREADS)
+
+    def test_no_oversell(self):
+        results = []
+        start = threading.Event()
+
+        def checkout(card_no):
+            start.wait()
+            try:
+                LoanService().checkout(lib_branch_id=self.branch.id, isbn='0380699710', card_no=card_no)
+                results.append(True)
+            except LoanError:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(_.card_no,)) for _ in self.borrowers]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.THREADS)
+        self.assertEqual(results.count(True), self.COPIES)
+        self.assertEqual(self.get_copies(), 0)
+        self.assertEqual(models.BookLoan.objects.count(), self.COPIES)
@@ -0,0 +1,249 @@
+'''unittests for book loans listing
+
+run as:
+    $ python manage.py test librapp.tests.test_loans
+'''
+
+import json
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.fine_accrual import FineAccrual
+from librapp.lib.fine_ledger import FineLedger
+from librapp.lib.loan_query import LoanQuery
+
+
+class LoanTestMixin(object):
+
+    def create_branches(self):
+        self.branch = models.LibraryBranch.objects.create(branch_name='Oak Lawn', address='4100 Cedar Springs Road')
+        self.other_branch = models.LibraryBranch.objects.create(branch_name='Park Forest', address='3421 Forest Lane')
+
+    def create_loans(self, start, count, branch=None, days_overdue=0):
+        '''Creates count loans, one book and borrower each
+        '''
+        branch = branch or self.branch
+        loans = []
+        for i in xrange(start, start + count):
+            isbn = '{0:010d}'.format(i)
+            book = models.Book.objects.create(isbn=isbn, title='Book {0}'.format(i), cover='')
+            book_copy = models.BookCopy.objects.create(isbn=book, lib_branch=branch, no_of_copies=1)
+            borrower = models.Borrower.objects.create(ssn='{0:09d}'.format(i), fname='F', lname='L', address='A')
+            due_date = timezone.now() - timedelta(days_overdue)
+            loans.append(models.BookLoan.objects.create(book=book_copy, card_no=borrower, due_date=due_date))
+        return loans
+
+
+class LoansListTest(LoanTestMixin, APITestCase):
+
+    def setUp(self):
+        self.path = '/books/loans/'
+        self.create_branches()
+
+    def _list(self, params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['books_loans'], len(ctx.captured_queries)
+
+    def test_branch_filter(self):
+        self.create_loans(1, 2)
+        self.create_loans(100, 3, branch=self.other_branch)
+        loans, _ = self._list({'lib_branch_id': self.branch.id})
+        self.assertEqual([_['isbn'] for _ in loans], ['0000000001', '0000000002'])
+        loans, _ = self._list({})
+        self.assertEqual(len(loans), 5)
+
+    def test_branch_active_query_count_is_constant(self):
+        loans = self.create_loans(1, 2, days_overdue=3)
+        self.create_loans(10, 2)
+        models.Fine.objects.create(loan=loans[0], fine_amt=Decimal('0.75'))
+        params = {'lib_branch_id': self.branch.id, 'active': 'true'}
+        loans, few = self._list(params)
+        self.assertEqual(len(loans), 4)
+
+        loans = self.create_loans(100, 20, days_overdue=3)
+        self.create_loans(200, 20)
+        for loan in loans[:10]:
+            models.Fine.objects.create(loan=loan, fine_amt=Decimal('0.75'))
+        loans, many = self._list(params)
+        self.assertEqual(len(loans), 44)
+        self.assertEqual(few, many)
+
+    def test_loan_data(self):
+        loan = self.create_loans(1, 1, days_overdue=4)[0]
+        self.create_loans(2, 1)
+        FineAccrual().run()
+        loans, _ = self._list({'card_no': loan.card_no_id})
+        self.assertEqual(len(loans), 1)
+        self.assertEqual(loans[0]['id'], loan.id)
+        self.assertEqual(loans[0]['isbn'], '0000000001')
+        self.assertEqual(loans[0]['lib_branch_id'], self.branch.id)
+        self.assertEqual(loans[0]['card_no'], loan.card_no_id)
+        self.assertEqual(loans[0]['date_in'], None)
+        fine = models.Fine.objects.get(loan_id=loan.id)
+        self.assertEqual(loans[0]['fine'], {'id': fine.id, 'fine_amt': Decimal('1.00'), 'paid_amt': Decimal('0'),
+                                            'unpaid_amt': Decimal('1.00'), 'paid': False})
+
+        loans, _ = self._list({'card_no': loan.card_no_id + 1})
+        self.assertEqual(loans[0]['fine'], {'id': 0, 'amount': 0, 'paid': 'NA'})
+
+    def test_overdue(self):
+        overdue = self.create_loans(1, 1, days_overdue=2)
+        self.create_loans(10, 1, days_overdue=-2)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            loans, _ = self._list({'overdue': 'true'})
+        self.assertEqual([_['id'] for _ in loans], [overdue[0].id])
+        # aware now, no naive datetime warning from the due_date filter
+        self.assertFalse([_ for _ in caught if 'naive datetime' in str(_.message)])
+
+    def test_list_does_not_write(self):
+        self.create_loans(1, 2, days_overdue=2)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.path)
+        self.assertFalse([_ for _ in ctx.captured_queries if not _['sql'].startswith('SELECT')])
+        self.assertFalse(models.Fine.objects.exists())
+        self.assertNotIn('X-Fines-As-Of', response)
+
+    def test_fines_as_of_header(self):
+        run = FineAccrual().run()
+        response = self.client.get(self.path)
+        self.assertEqual(response['X-Fines-As-Of'], run.as_of.isoformat())
+
+
+class FinesListTest(LoanTestMixin, APITestCase):
+
+    def setUp(self):
+        self.path = '/books/fines/'
+        self.create_branches()
+
+    def test_branch_and_fine_type(self):
+        loans = self.create_loans(1, 2, days_overdue=2)
+        self.create_loans(100, 1, branch=self.other_branch, days_overdue=2)
+        models.Fine.objects.create(loan=loans[1], fine_amt=Decimal('0.50'), paid=True)
+        FineAccrual().run()
+        response = self.client.get(self.path, {'lib_branch_id': self.branch.id, 'fine_type': 'unpaid'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([_['id'] for _ in response.data], [loans[0].id])
+        response = self.client.get(self.path, {'lib_branch_id': self.branch.id})
+        self.assertEqual(len(response.data), 2)
+        response = self.client.get(self.path, {'card_no': loans[1].card_no_id, 'fine_type': 'paid'})
+        self.assertEqual([_['fine']['fine_amt'] for _ in response.data], [Decimal('0.50')])
+
+    def test_partial_payment(self):
+        loan = self.create_loans(1, 1, days_overdue=5)[0]
+        FineAccrual().run()
+        FineLedger().pay(models.Fine.objects.get(loan_id=loan.id).id, Decimal('0.50'))
+        response = self.client.get(self.path)
+        fine = response.data[0]['fine']
+        self.assertEqual((fine['fine_amt'], fine['paid_amt'], fine['unpaid_amt'], fine['paid']),
+                         (Decimal('1.25'), Decimal('0.50'), Decimal('0.75'), False))
+        response = self.client.get('/books/loans/', {'card_no': loan.card_no_id})
+        self.assertEqual(response.data['books_loans'][0]['fine']['unpaid_amt'], Decimal('0.75'))
+
+    def test_loans_without_fine_not_listed(self):
+        loans = self.create_loans(1, 3)
+        models.Fine.objects.create(loan=loans[1], fine_amt=Decimal('0.50'))
+        response = self.client.get(self.path)
+        self.assertEqual([_['id'] for _ in response.data], [loans[1].id])
+        self.assertEqual(response.data[0]['isbn'], loans[1].book.isbn_id)
+
+    def test_query_count_is_constant(self):
+        loans = self.create_loans(1, 2)
+        models.Fine.objects.create(loan=loans[0], fine_amt=Decimal('0.50'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.path, {'fine_type': 'unpaid'})
+        few = len(ctx.captured_queries)
+        for loan in self.create_loans(100, 20):
+            models.Fine.objects.create(loan=loan, fine_amt=Decimal('0.50'))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.path, {'fine_type': 'unpaid'})
+        self.assertEqual(len(response.data), 21)
+        self.assertEqual(len(ctx.captured_queries), few)
+
+
+class LoansPaginationTest(LoanTestMixin, APITestCase):
+
+    def setUp(self):
+        self.path = '/books/loans/'
+        self.create_branches()
+        # due dates out of id order, two with the same due date
+        self.loans = []
+        for i, days in enumerate([3, 1, 2, 1, 5]):
+            self.loans.extend(self.create_loans(i + 1, 1, days_overdue=days))
+        due_date = self.loans[1].due_date
+        models.BookLoan.objects.filter(id=self.loans[3].id).update(due_date=due_date)
+
+    def get_all(self, path, params):
+        ids = []
+        cursor = None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(path, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.data['books_loans'] if 'books_loans' in response.data else response.data
+            self.assertTrue(len(data) <= params['limit'])
+            ids.extend(_['id'] for _ in data)
+            cursor = response.get('X-Next-Cursor')
+            if not cursor:
+                return ids
+
+    def test_pages_by_id(self):
+        ids = self.get_all(self.path, {'limit': 2})
+        self.assertEqual(ids, [_.id for _ in self.loans])
+
+    def test_pages_by_due_date(self):
+        ids = self.get_all(self.path, {'limit': 2, 'order_by': 'due_date'})
+        expected = sorted(self.loans, key=lambda _: (models.BookLoan.objects.get(id=_.id).due_date, _.id))
+        self.assertEqual(ids, [_.id for _ in expected])
+        self.assertEqual(ids[:2], [self.loans[4].id, self.loans[0].id])
+
+    def test_fines_pages(self):
+        for loan in self.loans:
+            models.Fine.objects.create(loan=loan, fine_amt=Decimal('0.50'))
+        ids = self.get_all('/books/fines/', {'limit': 3})
+        self.assertEqual(ids, [_.id for _ in self.loans])
+        ids = self.get_all('/books/fines/', {'limit': 2, 'order_by': 'due_date'})
+        expected = sorted(self.loans, key=lambda _: (models.BookLoan.objects.get(id=_.id).due_date, _.id))
+        self.assertEqual(ids, [_.id for _ in expected])
+
+        response = self.client.get('/books/fines/', {'export': 'true', 'order_by': 'due_date'})
+        lines = ''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(_)['id'] for _ in lines], [_.id for _ in expected])
+
+    def test_next_cursor_in_body(self):
+        response = self.client.get(self.path, {'limit': 4})
+        self.assertEqual(response.data['next_cursor'], response['X-Next-Cursor'])
+        response = self.client.get(self.path, {'limit': 5})
+        self.assertEqual(response.data['next_cursor'], None)
+        self.assertNotIn('X-Next-Cursor', response)
+
+    def test_cursor_order_mismatch(self):
+        response = self.client.get(self.path, {'limit': 2})
+        response = self.client.get(self.path, {'cursor': response['X-Next-Cursor'], 'order_by': 'due_date'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.path, {'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.path, {'order_by': 'isbn'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_ndjson(self):
+        LoanQuery.CHUNK_SIZE = 2
+        try:
+            response = self.client.get(self.path, {'export': 'true', 'order_by': 'due_date'})
+            lines = ''.join(response.streaming_content).splitlines()
+        finally:
+            LoanQuery.CHUNK_SIZE = 1000
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        ids = [json.loads(_)['id'] for _ in lines]
+        self.assertEqual(sorted(ids), sorted(_.id for _ in self.loans))
+        self.assertEqual(ids[0], self.loans[4].id)
@@ -0,0 +1,124 @@
+'''unittests for bulk checkout and checkin
+
+run as:
+    $ python manage.py test librapp.tests.test_loans_bulk
+'''
+
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.tests.test_fine_ledger import add_fine
+
+
+class LoansBulkTest(APITestCase):
+
+    def setUp(self):
+        self.checkout_path = '/books/loans/bulk-checkout/'
+        self.checkin_path = '/books/loans/bulk-checkin/'
+        self.branch = models.LibraryBranch.objects.create(branch_name='Oak Lawn', address='4100 Cedar Springs Road')
+        self.borrowers = [models.Borrower.objects.create(ssn='{0:09d}'.format(i), fname='F', lname='L', address='A')
+                          for i in xrange(4)]
+        self.copies = {}
+        for i, no_of_copies in enumerate([1, 2, 5, 1]):
+            book = models.Book.objects.create(isbn='{0:010d}'.format(i), title='Book', cover='')
+            self.copies[book.isbn] = models.BookCopy.objects.create(isbn=book, lib_branch=self.branch,
+                                                                    no_of_copies=no_of_copies)
+
+    def get_copies(self, isbn):
+        return models.BookCopy.objects.get(id=self.copies[isbn].id).no_of_copies
+
+    def checkout(self, items):
+        data = {'lib_branch_id': self.branch.id, 'items': items}
+        response = self.client.post(self.checkout_path, data)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_bulk_checkout(self):
+        card_nos = [_.card_no for _ in self.borrowers]
+        items = [
+            {'isbn': '0000000000', 'card_no': card_nos[0]},
+            {'isbn': '0000000000', 'card_no': card_nos[2]}, # 1 copy only
+            {'isbn': '0000000000', 'card_no': card_nos[0]}, # same book twice, the only copy
+            {'isbn': '0000000000', 'card_no': card_nos[1]}, # unpaid fine, before availability
+            {'isbn': '0000000001', 'card_no': card_nos[0]},
+            {'isbn': '0000000001', 'card_no': card_nos[0]}, # same book twice
+            {'isbn': '9999999999', 'card_no': card_nos[0]}, # no copy
+            {'isbn': '0000000002', 'card_no': 1000},        # no borrower
+            {'isbn': '0000000002', 'card_no': card_nos[0]},
+            {'isbn': '0000000002', 'card_no': card_nos[1]},
+            ]
+        # a returned loan with unpaid fine for borrower 1
+        loan = models.BookLoan.objects.create(book=self.copies['0000000001'], card_no=self.borrowers[1],
+                                              due_date=timezone.now(), date_in=timezone.now())
+        add_fine(loan, Decimal('0.25'))
+
+        data = self.checkout(items)
+        msgs = [_.get('msg') for _ in data['results']]
+        self.assertEqual(msgs, [
+            None,
+            'Book is not available',
+            'Cannot loan the same book twice',
+            'Unpaid fines. Cannot borrow any books at this time',
+            None,
+            'Cannot loan the same book twice',
+            'Could not create Loan Entry',
+            'Could not create Loan Entry',
+            None,
+            'Unpaid fines. Cannot borrow any books at this time',
+            ])
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([_['status'] for _ in data['results']], [200, 400, 400, 400, 200, 400, 400, 400, 200, 400])
+        self.assertEqual(self.get_copies('0000000000'), 0)
+        self.assertEqual(self.get_copies('0000000001'), 1)
+        self.assertEqual(self.get_copies('0000000002'), 4)
+        loan_ids = [_['id'] for _ in data['results'] if _['status'] == 200]
+        loans = models.BookLoan.objects.filter(id__in=loan_ids, card_no=self.borrowers[0], date_in=None)
+        self.assertEqual(loans.count(), 3)
+
+        # borrow limit
+        data = self.checkout([{'isbn': '0000000003', 'card_no': card_nos[0]}])
+        self.assertEqual(data['results'][0]['msg'], 'Cannot borrow more that 3 books at a time')
+
+    def test_bulk_checkin(self):
+        card_nos = [_.card_no for _ in self.borrowers]
+        items = [{'isbn': '0000000002', 'card_no': _} for _ in card_nos] + [{'isbn': '0000000001', 'card_no': card_nos[0]}]
+        loan_ids = [_['id'] for _ in self.checkout(items)['results']]
+        self.assertEqual(self.get_copies('0000000002'), 1)
+
+        response = self.client.post(self.checkin_path, {'loan_ids': loan_ids[:3] + [loan_ids[0], 100000]})
+        self.assertEqual(response.status_code, 200)
+        msgs = [_.get('msg') for _ in response.data['results']]
+        self.assertEqual(msgs, [None, None, None, 'Book is already checked in.', 'Could not update Loan Entry'])
+        self.assertEqual(response.data['results'][0]['isbn'], '0000000002')
+        self.assertEqual(self.get_copies('0000000002'), 4)
+
+        response = self.client.post(self.checkin_path, {'loan_ids': loan_ids[3:]})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.get_copies('0000000002'), 5)
+        self.assertEqual(self.get_copies('0000000001'), 2)
+        self.assertFalse(models.BookLoan.objects.filter(date_in=None).exists())
+
+    def test_bulk_checkin_query_count_is_constant(self):
+        card_nos = [_.card_no for _ in self.borrowers]
+        few_ids = [_['id'] for _ in self.checkout([{'isbn': '0000000002', 'card_no': card_nos[0]}])['results']]
+        items = [{'isbn': '0000000002', 'card_no': _} for _ in card_nos[1:]]
+        items += [{'isbn': '0000000001', 'card_no': _} for _ in card_nos[1:3]]
+        many_ids = [_['id'] for _ in self.checkout(items)['results']]
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(self.checkin_path, {'loan_ids': few_ids})
+        few = len(ctx.captured_queries)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.post(self.checkin_path, {'loan_ids': many_ids})
+        # one more grouped increment, copies 0000000002 +3 and 0000000001 +2
+        self.assertEqual(len(ctx.captured_queries), few + 1)
+
+    def test_validation(self):
+        response = self.client.post(self.checkin_path, {'loan_ids': ['a']})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.checkout_path, {'lib_branch_id': self.branch.id, 'items': [{'isbn': 1}]})
+        self.assertEqual(response.status_code, 400)
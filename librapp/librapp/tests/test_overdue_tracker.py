@@ -0,0 +1,111 @@
+'''unittests for overdue tracker and overdue notices
+
+run as:
+    $ python manage.py test librapp.tests.test_overdue_tracker
+'''
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.overdue_notices import OverdueNotices
+from librapp.lib.overdue_tracker import OverdueTracker
+from librapp.tests.test_loans import LoanTestMixin
+
+
+class OverdueTrackerTest(LoanTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_branches()
+        self.tracker = OverdueTracker()
+
+    def test_overdue_by_due_date(self):
+        late = self.create_loans(1, 1, days_overdue=2)[0]
+        later = self.create_loans(2, 1, days_overdue=5)[0]
+        other = self.create_loans(3, 1, branch=self.other_branch, days_overdue=3)[0]
+        self.create_loans(4, 1, days_overdue=-3)
+        self.tracker.refresh()
+        self.assertEqual(len(self.tracker), 4)
+
+        now = timezone.now()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tracker.get_overdue(now), [later.id, other.id, late.id])
+            self.assertEqual(self.tracker.get_overdue(now, lib_branch_id=self.branch.id), [later.id, late.id])
+            self.assertEqual(self.tracker.get_overdue(now, lib_branch_id=0), [])
+            self.assertEqual(self.tracker.get_overdue_since(now - timedelta(4), now), [other.id, late.id])
+            self.assertEqual(self.tracker.get_overdue(now - timedelta(4)), [later.id])
+
+    def test_refresh(self):
+        loans = self.create_loans(1, 2, days_overdue=3)
+        self.tracker.refresh()
+        built_at = self.tracker.built_at
+        new_loan = self.create_loans(10, 1, days_overdue=1)[0]
+        loans[0].date_in = timezone.now()
+        loans[0].save()
+        self.tracker.refresh()
+        self.assertEqual(self.tracker.built_at, built_at)
+        self.assertEqual(self.tracker.get_overdue(), [loans[1].id, new_loan.id])
+
+    def test_refresh_out_of_order(self):
+        '''A loan committed after the refresh with a lower id, and due in 3 days not LOAN_DAYS
+        '''
+        late, loan = self.create_loans(1, 2, days_overdue=1)
+        late_id = late.id
+        late.delete()
+        self.tracker.refresh()
+        late = models.BookLoan.objects.create(id=late_id, book=late.book, card_no=late.card_no,
+                                              due_date=timezone.now() - timedelta(3))
+        self.tracker.refresh()
+        self.assertEqual(self.tracker.get_overdue(), [late.id, loan.id])
+
+    def test_rebuild_drops_deleted(self):
+        loans = self.create_loans(1, 2, days_overdue=3)
+        self.tracker.refresh()
+        loans[0].delete()
+        self.tracker.refresh()
+        self.assertEqual(len(self.tracker), 2)
+        self.tracker.built_at -= timedelta(seconds=OverdueTracker.REBUILD_SECONDS + 1)
+        self.tracker.refresh()
+        self.assertEqual(self.tracker.get_overdue(), [loans[1].id])
+
+
+class OverdueNoticesTest(LoanTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_branches()
+        self.notices = OverdueNotices()
+
+    def run_notices(self, now=None):
+        result = []
+        run = self.notices.run(write=result.append, now=now)
+        self.assertEqual(run.notices, len(result))
+        return result
+
+    def test_notice_once(self):
+        late = self.create_loans(1, 1, days_overdue=4)[0]
+        soon = self.create_loans(2, 1, days_overdue=-1)[0]
+        self.create_loans(3, 1, days_overdue=-5)
+        models.Fine.objects.create(loan=late, fine_amt=Decimal('0.75'))
+
+        notices = self.run_notices()
+        self.assertEqual(len(notices), 1)
+        self.assertEqual(notices[0]['loan_id'], late.id)
+        self.assertEqual(notices[0]['card_no'], late.card_no_id)
+        self.assertEqual(notices[0]['title'], 'Book 1')
+        self.assertEqual(notices[0]['branch_name'], 'Oak Lawn')
+        self.assertEqual(notices[0]['fine_amt'], Decimal('0.75'))
+
+        notices = self.run_notices(now=timezone.now() + timedelta(2))
+        self.assertEqual([_['loan_id'] for _ in notices], [soon.id])
+        self.assertEqual(notices[0]['fine_amt'], 0)
+        self.assertEqual(self.run_notices(now=timezone.now() + timedelta(2)), [])
+
+    def test_no_notice_after_checkin(self):
+        loan = self.create_loans(1, 1, days_overdue=-1)[0]
+        self.run_notices()
+        loan.date_in = timezone.now()
+        loan.save()
+        self.assertEqual(self.run_notices(now=timezone.now() + timedelta(2)), [])
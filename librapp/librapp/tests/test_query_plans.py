@@ -0,0 +1,106 @@
+'''EXPLAIN based tests, hot loan and fine queries must use an index and not scan the table
+
+run as:
+    $ python manage.py test librapp.tests.test_query_plans
+'''
+
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from librapp import models
+from librapp.lib.borrower_eligibility import BorrowerEligibility
+from librapp.lib.loan_query import LoanQuery
+
+
+def explain(sql, params=()):
+    '''Returns list of (table, index, detail) for each table access in the plan.
+    index is None for a full table scan.
+    '''
+    cursor = connection.cursor()
+    plan = []
+    if connection.vendor == 'sqlite':
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        for row in cursor.fetchall():
+            detail = row[-1]
+            words = detail.split()
+            if words[0] not in ('SCAN', 'SEARCH'):
+                continue
+            # SCAN TABLE t before sqlite 3.36, SCAN t after
+            table = words[2] if words[1] == 'TABLE' else words[1]
+            index = None
+            if words[0] == 'SEARCH' or ' USING ' in detail:
+                index = detail.split(' USING ', 1)[-1]
+            plan.append((table, index, detail))
+    else:
+        cursor.execute('EXPLAIN ' + sql, params)
+        names = [_[0] for _ in cursor.description]
+        for row in cursor.fetchall():
+            row = dict(zip(names, row))
+            # a small test table may still be read in full, only fail if no index could be used
+            index = row['key'] or row['possible_keys']
+            if row['type'] == 'ALL' and not row['possible_keys']:
+                index = None
+            plan.append((row['table'], index, str(row)))
+    return plan
+
+
+@skipUnless(connection.vendor in ('sqlite', 'mysql'), 'EXPLAIN output parsed for sqlite and mysql')
+class QueryPlanTest(TestCase):
+
+    def assertIndexed(self, queryset, columns=None):
+        '''No table in the query is read without index.
+        On sqlite, the first table is searched by an index on all columns.
+        '''
+        sql, params = queryset.query.sql_with_params()
+        self.assertPlanIndexed(explain(sql, params), columns)
+
+    def assertPlanIndexed(self, plan, columns=None):
+        for table, index, detail in plan:
+            self.assertNotEqual(index, None, msg='full table scan: {0}'.format(detail))
+        if columns and connection.vendor == 'sqlite':
+            table, index, detail = plan[0]
+            for column in columns:
+                self.assertIn(column, index, msg='{0} not in index: {1}'.format(column, detail))
+
+    def test_active_loans_of_borrower(self):
+        loans = models.BookLoan.objects.filter(card_no_id=1, date_in=None)
+        self.assertIndexed(loans, columns=['card_no_id=', 'date_in='])
+        self.assertIndexed(LoanQuery.get_loans(card_no=1, active=True), columns=['card_no_id=', 'date_in='])
+
+    def test_overdue_loans(self):
+        loans = models.BookLoan.objects.filter(date_in=None, due_date__lt=timezone.now())
+        self.assertIndexed(loans, columns=['date_in=', 'due_date<'])
+        self.assertIndexed(LoanQuery.get_loans(overdue=True, lib_branch_id=1), columns=['date_in=', 'due_date<'])
+
+    def test_checkout_copy(self):
+        copies = models.BookCopy.objects.filter(isbn_id='0380699710', lib_branch_id=1)
+        self.assertIndexed(copies, columns=['isbn_id=', 'lib_branch_id='])
+
+    def test_unpaid_fines(self):
+        self.assertIndexed(models.Fine.objects.filter(paid=False), columns=['paid='])
+
+    def test_fines_list(self):
+        self.assertIndexed(LoanQuery.get_fines(fine_type='unpaid'), columns=['paid='])
+        self.assertIndexed(LoanQuery.get_fines(card_no=1, fine_type='paid'))
+        self.assertIndexed(LoanQuery.get_fines(lib_branch_id=1))
+
+    def test_borrower_eligibility(self):
+        be = BorrowerEligibility()
+        with CaptureQueriesContext(connection) as ctx:
+            be.get_eligibility(1, book_copy_id=2)
+            be.get_eligibilities([1, 2])
+        for query in ctx.captured_queries:
+            # only integer params, captured sql runs as is
+            if 'librapp_borrowerbalance' in query['sql']:
+                # balance rows are read by primary key
+                self.assertPlanIndexed(explain(query['sql']))
+            else:
+                self.assertPlanIndexed(explain(query['sql']), columns=['card_no_id'])
+
+    def test_full_scan_detected(self):
+        plan = explain(*models.BookLoan.objects.filter(date_out__lt=timezone.now()).query.sql_with_params())
+        self.assertEqual(plan[0][1], None)
@@ -0,0 +1,69 @@
+'''unittests for bulk ISBN lookup
+
+run as:
+    $ python manage.py test librapp.tests.test_search_bulk
+'''
+
+import json
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.utils.isbn_utils import ISBNUtils
+
+
+class SearchBulkTest(APITestCase):
+
+    def setUp(self):
+        self.path = '/search/bulk/'
+        self.iutils = ISBNUtils()
+        self.branch = models.LibraryBranch.objects.create(branch_name='Oak Lawn', address='4100 Cedar Springs Road')
+        author = models.Author.objects.create(name='Vera Cowie')
+        self.isbns = []
+        for i in xrange(1, 41):
+            # valid ISBN-10 from a 9 digit body
+            isbn = self.iutils.to_isbn10(self.iutils.to_isbn13('{0:09d}0'.format(i)))
+            book = models.Book.objects.create(isbn=isbn, title='Book {0}'.format(i), cover='')
+            models.BookAuthors.objects.create(isbn=book, author=author)
+            models.BookCopy.objects.create(isbn=book, lib_branch=self.branch, no_of_copies=1)
+            self.isbns.append(isbn)
+
+    def _post(self, isbns):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.path, {'isbns': isbns, 'lib_branch_id': self.branch.id})
+        return response, len(ctx.captured_queries)
+
+    def test_bulk_query_count_is_constant(self):
+        response, few = self._post(self.isbns[:2])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        response, many = self._post(self.isbns)
+        self.assertEqual(response.data['count'], 40)
+        self.assertEqual(few, many)
+
+    def test_bulk_isbn_forms_and_not_found(self):
+        isbn13 = self.iutils.to_isbn13(self.isbns[1])
+        isbn13 = '{0}-{1}'.format(isbn13[:3], isbn13[3:])
+        response, _ = self._post([self.isbns[0], isbn13, '9791032305690', self.isbns[0]])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([_['isbn'] for _ in response.data['books']], self.isbns[:2])
+        self.assertEqual(response.data['books'][0]['authors'], ['Vera Cowie'])
+        self.assertEqual(response.data['books'][0]['availability'][0]['no_of_copies'], 1)
+        self.assertEqual(response.data['not_found'], ['9791032305690'])
+
+    def test_bulk_invalid(self):
+        response, _ = self._post(['rich and'])
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(SEARCH_BULK_STREAM_THRESHOLD=10)
+    def test_bulk_streamed(self):
+        response, _ = self._post(self.isbns + ['9791032305690'])
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        data = json.loads(''.join(response.streaming_content))
+        self.assertEqual(data['count'], 40)
+        self.assertEqual([_['isbn'] for _ in data['books']], self.isbns)
+        self.assertEqual(data['not_found'], ['9791032305690'])
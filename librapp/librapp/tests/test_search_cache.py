@@ -0,0 +1,83 @@
+'''unittests for search result cache
+
+run as:
+    $ python manage.py test librapp.tests.test_search_cache
+'''
+
+import time
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.lru_cache import LRUCache
+from librapp.lib.search_cache import search_cache
+
+
+class LRUCacheTest(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_ttl(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1, ttl=-1)
+        self.assertEqual(cache.get('a'), None)
+
+
+@override_settings(SEARCH_BACKEND='icontains')
+class SearchCacheTest(APITestCase):
+
+    def setUp(self):
+        self.path = '/search/'
+        search_cache.clear()
+        self.branch = models.LibraryBranch.objects.create(branch_name='Oak Lawn', address='4100 Cedar Springs Road')
+        self.borrower = models.Borrower.objects.create(ssn='123456789', fname='Robi', lname='Bobi', address='123 way')
+        self.book = models.Book.objects.create(isbn='0380699710', title='The Rich And The Mighty', cover='')
+        models.BookCopy.objects.create(isbn=self.book, lib_branch=self.branch, no_of_copies=1)
+
+    def _search(self, **params):
+        params['q'] = 'rich and'
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.path, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def _copies(self, response):
+        return response.data['books'][0]['availability'][0]['no_of_copies']
+
+    def test_list_cached(self):
+        self._search()
+        response, num_queries = self._search()
+        self.assertEqual(num_queries, 0)
+        self.assertEqual(self._copies(response), 1)
+
+    def test_checkout_checkin_invalidates_availability(self):
+        self._search(lib_branch_id=self.branch.id)
+        self._search()
+
+        data = {'lib_branch_id': self.branch.id, 'isbn': self.book.isbn, 'card_no': self.borrower.card_no}
+        response = self.client.post('/books/loans/', data)
+        self.assertEqual(response.status_code, 200)
+        loan_id = response.data['id']
+
+        response, num_queries = self._search(lib_branch_id=self.branch.id)
+        self.assertEqual(self._copies(response), 0)
+        # only availability is loaded again
+        self.assertEqual(num_queries, 1)
+        response, num_queries = self._search()
+        self.assertEqual(self._copies(response), 0)
+
+        response = self.client.put('/books/loans/{0}/'.format(loan_id), {})
+        self.assertEqual(response.status_code, 200)
+        response, num_queries = self._search(lib_branch_id=self.branch.id)
+        self.assertEqual(self._copies(response), 1)
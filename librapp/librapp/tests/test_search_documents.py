@@ -0,0 +1,73 @@
+'''unittests for BookSearchDocument sync and single table search
+
+run as:
+    $ python manage.py test librapp.tests.test_search_documents
+'''
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from librapp import models
+from librapp.lib.search_documents import SearchDocumentHelper
+from librapp.lib.search_engine import IContainsSearchEngine
+
+
+class SearchDocumentSyncTest(TestCase):
+
+    def setUp(self):
+        self.book = models.Book.objects.create(isbn='0380699710', title='The Rich And The Mighty', cover='')
+        self.author = models.Author.objects.create(name='Vera Cowie')
+        models.BookAuthors.objects.create(isbn=self.book, author=self.author)
+
+    def get_document(self):
+        return models.BookSearchDocument.objects.get(book_id='0380699710')
+
+    def test_created_with_book(self):
+        doc = self.get_document()
+        self.assertEqual(doc.title, 'the rich and the mighty')
+        self.assertEqual(doc.get_authors(), ['Vera Cowie'])
+        self.assertEqual(doc.authors_norm, 'vera cowie')
+        self.assertEqual(doc.isbn13, '9780380699711')
+
+    def test_book_title_change(self):
+        self.book.title = 'The Poor'
+        self.book.save()
+        self.assertEqual(self.get_document().title, 'the poor')
+
+    def test_author_rename(self):
+        self.author.name = 'Vera Cowie Smith'
+        self.author.save()
+        self.assertEqual(self.get_document().get_authors(), ['Vera Cowie Smith'])
+
+    def test_book_authors_add_remove(self):
+        author = models.Author.objects.create(name='Barney Leason')
+        book_author = models.BookAuthors.objects.create(isbn=self.book, author=author)
+        self.assertEqual(self.get_document().get_authors(), ['Vera Cowie', 'Barney Leason'])
+        book_author.delete()
+        self.assertEqual(self.get_document().get_authors(), ['Vera Cowie'])
+
+    def test_book_delete(self):
+        self.book.delete()
+        self.assertFalse(models.BookSearchDocument.objects.exists())
+
+    def test_rebuild(self):
+        models.BookSearchDocument.objects.all().delete()
+        self.assertEqual(SearchDocumentHelper().rebuild(batch_size=1), 1)
+        self.assertEqual(self.get_document().authors_norm, 'vera cowie')
+
+
+class IContainsDocumentSearchTest(TestCase):
+
+    def setUp(self):
+        book = models.Book.objects.create(isbn='0380699710', title='The Rich And The Mighty', cover='')
+        models.BookAuthors.objects.create(isbn=book, author=models.Author.objects.create(name='Vera Cowie'))
+        book = models.Book.objects.create(isbn='0002005018', title='Clara Callan', cover='')
+        models.BookAuthors.objects.create(isbn=book, author=models.Author.objects.create(name='Richard Wright'))
+
+    def test_single_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            title_hits, author_hits = IContainsSearchEngine().search('RICH')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual([_[0] for _ in title_hits], ['0380699710'])
+        self.assertEqual([_[0] for _ in author_hits], ['0002005018'])
@@ -0,0 +1,222 @@
+'''unittests for search engines
+
+run as:
+    $ python manage.py test librapp.tests.test_search_engine
+'''
+
+import os
+import tempfile
+import threading
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.search_cache import search_cache
+from librapp.lib.search_engine import IContainsSearchEngine, InvertedIndexSearchEngine, SearchIndex, get_search_engine
+
+
+class SearchEngineTestMixin(object):
+
+    books = [
+        ('0380699710', 'The Rich And The Mighty', ['Vera Cowie']),
+        ('0553273280', 'Rich And Reckless', ['Barney Leason']),
+        ('0195153448', 'Classical Mythology', ['Mark P. O. Morford', 'Robert J. Lenardon']),
+        ('0002005018', 'Clara Callan: A Novel', ['Richard Bruce Wright']),
+        ]
+
+    def create_books(self):
+        for isbn, title, authors in self.books:
+            book = models.Book.objects.create(isbn=isbn, title=title, cover='http://foo.com/c.jpg')
+            for name in authors:
+                author = models.Author.objects.get_or_create(name=name)[0]
+                models.BookAuthors.objects.create(isbn=book, author=author)
+
+
+class SearchIndexTest(SearchEngineTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_books()
+        self.index = SearchIndex.from_db()
+
+    def assertSameHits(self, query):
+        expected = IContainsSearchEngine().search(query)
+        found = self.index.search(query)
+        # icontains returns the normalized title, ranking only uses isbn and normalized title
+        for found_hits, expected_hits in zip(found, expected):
+            self.assertEqual(sorted(_[0] for _ in found_hits), sorted(_[0] for _ in expected_hits), msg=query)
+
+    def test_search_matches_icontains(self):
+        for query in ['rich', 'RICH AND', 'the mighty', 'ichar', 'lenardon', 'novel', 'nothing here']:
+            self.assertSameHits(query)
+
+    def test_search_short_query(self):
+        self.assertEqual(self.index.search('ri'), None)
+
+    def test_snapshot(self):
+        fd, file_path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            self.index.save(file_path)
+            index = SearchIndex.load(file_path)
+        finally:
+            os.remove(file_path)
+        self.assertEqual(index.search('rich'), self.index.search('rich'))
+
+
+class SearchViewIndexTest(SearchEngineTestMixin, APITestCase):
+
+    def setUp(self):
+        self.path = '/search/'
+        search_cache.clear()
+        self.create_books()
+
+    @override_settings(SEARCH_BACKEND='index', SEARCH_INDEX_AUTOBUILD=False, SEARCH_INDEX_RELOAD_INTERVAL=0)
+    def test_list_falls_back_when_not_ready(self):
+        engine = get_search_engine()
+        engine._index = None
+        response = self.client.get(self.path, {'q': 'rich and'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+    @override_settings(SEARCH_BACKEND='index', SEARCH_INDEX_AUTOBUILD=False)
+    def test_list_from_index(self):
+        engine = get_search_engine()
+        engine.rebuild()
+        # not in index, must not be found
+        models.Book.objects.create(isbn='0000000001', title='Rich Unindexed', cover='')
+        response = self.client.get(self.path, {'q': 'rich'})
+        self.assertEqual(response.status_code, 200)
+        isbns = sorted(_['isbn'] for _ in response.data['books'])
+        self.assertEqual(isbns, ['0002005018', '0380699710', '0553273280'])
+
+
+class IndexReloadTest(SearchEngineTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_books()
+        self.engine = InvertedIndexSearchEngine(snapshot_path=None)
+        self.loads = []
+        self.loaded = threading.Event()
+
+        def load(mtime, version):
+            # runs in the background thread, its connection does not see the test database
+            self.loads.append(mtime)
+            self.engine._loading = False
+            self.loaded.set()
+        self.engine._load = load
+
+    def maybe_load(self):
+        self.loaded.clear()
+        self.engine._maybe_load()
+        self.assertTrue(self.loaded.wait(5))
+
+    @override_settings(SEARCH_INDEX_AUTOBUILD=True, SEARCH_INDEX_RELOAD_INTERVAL=0)
+    def test_autobuilt_index_is_rebuilt(self):
+        self.maybe_load()
+        self.engine.rebuild()
+        # nothing changed, no rebuild
+        self.engine._maybe_load()
+        self.assertEqual(self.loads, [None])
+        models.Book.objects.create(isbn='0000000001', title='Rich Unindexed', cover='')
+        self.maybe_load()
+        self.assertEqual(self.loads, [None, None])
+
+    @override_settings(SEARCH_INDEX_AUTOBUILD=True, SEARCH_INDEX_RELOAD_INTERVAL=0)
+    def test_catalog_version(self):
+        version = self.engine.get_catalog_version()
+        self.assertEqual(version[0], len(self.books))
+        models.Book.objects.filter(isbn='0380699710').get().delete()
+        self.assertNotEqual(self.engine.get_catalog_version(), version)
+        version = self.engine.get_catalog_version()
+        author = models.Author.objects.get(name='Vera Cowie')
+        models.BookAuthors.objects.create(isbn_id='0553273280', author=author)
+        self.assertNotEqual(self.engine.get_catalog_version(), version)
+
+    @override_settings(SEARCH_INDEX_AUTOBUILD=False, SEARCH_INDEX_RELOAD_INTERVAL=0)
+    def test_no_autobuild(self):
+        self.engine._maybe_load()
+        self.assertEqual(self.loads, [])
+
+
+class SuggestIndexTest(SearchEngineTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_books()
+        self.index = SearchIndex.from_db().suggest_index
+
+    def test_suggest_title_start_first(self):
+        found = self.index.suggest('rich', limit=10)
+        texts = [text for text, kind, isbn in found]
+        self.assertEqual(texts, ['Rich And Reckless', 'Richard Bruce Wright', 'The Rich And The Mighty'])
+        self.assertEqual(found[0], ('Rich And Reckless', 'title', '0553273280'))
+        self.assertEqual(found[1][1:], ('author', None))
+
+    def test_suggest_limit(self):
+        self.assertEqual(len(self.index.suggest('rich', limit=1)), 1)
+
+    def test_suggest_word_start(self):
+        texts = [text for text, kind, isbn in self.index.suggest('Mytho')]
+        self.assertEqual(texts, ['Classical Mythology'])
+        self.assertEqual(self.index.suggest('ythology'), [])
+
+
+class SuggestViewTest(SearchEngineTestMixin, APITestCase):
+
+    def setUp(self):
+        self.path = '/search/suggest/'
+        self.create_books()
+
+    @override_settings(SEARCH_INDEX_AUTOBUILD=False)
+    def test_suggest(self):
+        get_search_engine('index').rebuild()
+        response = self.client.get(self.path, {'q': 'rich a'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['suggestions'][0], {'text': 'Rich And Reckless', 'type': 'title', 'isbn': '0553273280'})
+
+    @override_settings(SEARCH_INDEX_AUTOBUILD=False, SEARCH_INDEX_RELOAD_INTERVAL=0)
+    def test_suggest_index_not_ready(self):
+        get_search_engine('index')._index = None
+        response = self.client.get(self.path, {'q': 'rich', 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        texts = [_['text'] for _ in response.data['suggestions']]
+        self.assertEqual(texts, ['Rich And Reckless', 'Richard Bruce Wright'])
+
+    def test_suggest_short(self):
+        response = self.client.get(self.path, {'q': 'r'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FuzzySearchTest(SearchEngineTestMixin, APITestCase):
+
+    def setUp(self):
+        self.path = '/search/'
+        search_cache.clear()
+        self.create_books()
+        models.Book.objects.create(isbn='0450031063', title='The Shining', cover='')
+        author = models.Author.objects.create(name='Stephen King')
+        models.BookAuthors.objects.create(isbn_id='0450031063', author=author)
+        self.index = SearchIndex.from_db()
+
+    def test_fuzzy_search_author(self):
+        ranked = self.index.fuzzy_search('Steven King')
+        self.assertEqual(ranked[0][0], '0450031063')
+        self.assertEqual(self.index.search('steven king'), ([], []))
+
+    def test_fuzzy_search_title(self):
+        ranked = self.index.fuzzy_search('clasical mytology')
+        self.assertEqual(ranked[0][0], '0195153448')
+
+    def test_fuzzy_search_no_match(self):
+        self.assertEqual(self.index.fuzzy_search('zzzzqqqq'), [])
+
+    @override_settings(SEARCH_INDEX_AUTOBUILD=False)
+    def test_list_fuzzy(self):
+        get_search_engine('index').rebuild()
+        response = self.client.get(self.path, {'q': 'Steven King', 'fuzzy': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['books'][0]['isbn'], '0450031063')
+
+        response = self.client.get(self.path, {'q': 'Steven King'})
+        self.assertEqual(response.data['count'], 0)
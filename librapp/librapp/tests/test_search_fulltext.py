@@ -0,0 +1,77 @@
+'''unittests for fulltext search backend
+
+run as:
+    $ python manage.py test librapp.tests.test_search_fulltext
+'''
+
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.search_cache import search_cache
+from librapp.lib.search_engine import FullTextSearchEngine, get_search_engine
+
+
+class FullTextTestMixin(object):
+
+    def create_books(self):
+        for isbn, title, name in [('0380699710', 'The Rich And The Mighty', 'Vera Cowie'),
+                                  ('0553273280', 'Rich And Reckless', 'Barney Leason'),
+                                  ('0002005018', 'Clara Callan', 'Richard Bruce Wright')]:
+            book = models.Book.objects.create(isbn=isbn, title=title, cover='')
+            author = models.Author.objects.create(name=name)
+            models.BookAuthors.objects.create(isbn=book, author=author)
+
+
+@skipUnless(connection.vendor in ('mysql', 'sqlite'), 'needs FULLTEXT or FTS5')
+class FullTextSearchEngineTest(FullTextTestMixin, TestCase):
+
+    def setUp(self):
+        self.create_books()
+        self.engine = FullTextSearchEngine()
+
+    def get_isbns(self, query):
+        title_hits, author_hits = self.engine.search(query)
+        return sorted(_[0] for _ in title_hits), sorted(_[0] for _ in author_hits)
+
+    def test_word_prefix(self):
+        self.assertEqual(self.get_isbns('Rich'), (['0380699710', '0553273280'], ['0002005018']))
+        self.assertEqual(self.get_isbns('rich reck'), (['0553273280'], []))
+        # substring inside a word is not matched
+        self.assertEqual(self.get_isbns('ichard'), ([], []))
+
+    def test_title_and_author_words(self):
+        self.assertEqual(self.get_isbns('mighty cowie'), ([], ['0380699710']))
+
+    def test_short_query_uses_icontains(self):
+        self.assertEqual(self.get_isbns('ri'), (['0380699710', '0553273280'], ['0002005018']))
+
+    def test_document_changes(self):
+        book = models.Book.objects.get(isbn='0553273280')
+        book.title = 'Poor And Reckless'
+        book.save()
+        self.assertEqual(self.get_isbns('reckless'), (['0553273280'], []))
+        self.assertEqual(self.get_isbns('rich')[0], ['0380699710'])
+        book.delete()
+        self.assertEqual(self.get_isbns('reckless'), ([], []))
+
+
+@skipUnless(connection.vendor in ('mysql', 'sqlite'), 'needs FULLTEXT or FTS5')
+class FullTextSearchViewTest(FullTextTestMixin, APITestCase):
+
+    def setUp(self):
+        self.path = '/search/'
+        search_cache.clear()
+        self.create_books()
+
+    @override_settings(SEARCH_BACKEND='fulltext')
+    def test_list(self):
+        self.assertTrue(isinstance(get_search_engine(), FullTextSearchEngine))
+        response = self.client.get(self.path, {'q': 'rich'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+        # author match ranks last
+        self.assertEqual(response.data['books'][2]['isbn'], '0002005018')
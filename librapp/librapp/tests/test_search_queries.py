@@ -0,0 +1,68 @@
+'''query count regression tests for search
+
+run as:
+    $ python manage.py test librapp.tests.test_search_queries
+'''
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.search_cache import search_cache
+
+
+@override_settings(SEARCH_BACKEND='icontains')
+class SearchQueriesTest(APITestCase):
+
+    def setUp(self):
+        self.path = '/search/'
+        search_cache.clear()
+        self.branch = models.LibraryBranch.objects.create(branch_name='Oak Lawn', address='4100 Cedar Springs Road')
+        self.author = models.Author.objects.create(name='Vera Cowie')
+
+    def _create_books(self, start, count):
+        for i in xrange(start, start + count):
+            isbn = '{0:010d}'.format(i)
+            book = models.Book.objects.create(isbn=isbn, title='Rich Book {0}'.format(i), cover='http://foo.com/c.jpg')
+            models.BookAuthors.objects.create(isbn=book, author=self.author)
+            models.BookCopy.objects.create(isbn=book, lib_branch=self.branch, no_of_copies=1)
+
+    def _search(self, query):
+        # measure the uncached path
+        search_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.path, {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        self._create_books(1, 3)
+        response, few = self._search('rich')
+        self.assertEqual(response.data['count'], 3)
+
+        self._create_books(100, 30)
+        response, many = self._search('rich')
+        self.assertEqual(response.data['count'], 33)
+        self.assertEqual(few, many)
+
+    def test_list_author_match_query_count_is_constant(self):
+        self._create_books(1, 3)
+        response, few = self._search('cowie')
+        self.assertEqual(response.data['count'], 3)
+
+        self._create_books(100, 30)
+        response, many = self._search('cowie')
+        self.assertEqual(response.data['count'], 33)
+        self.assertEqual(few, many)
+
+    def test_list_response_shape(self):
+        self._create_books(1, 1)
+        response, _ = self._search('rich book 1')
+        book = response.data['books'][0]
+        self.assertEqual(book['isbn'], '0000000001')
+        self.assertEqual(book['authors'], ['Vera Cowie'])
+        self.assertEqual(len(book['availability']), 1)
+        self.assertEqual(book['availability'][0]['lib_branch_id'], self.branch.id)
+        self.assertEqual(book['availability'][0]['no_of_copies'], 1)
@@ -0,0 +1,89 @@
+'''unittests for search ranking and pagination
+
+run as:
+    $ python manage.py test librapp.tests.test_search_ranking
+'''
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from librapp import models
+from librapp.lib.search_cache import search_cache
+from librapp.lib.search_ranker import SearchRanker
+
+
+class SearchRankerTest(TestCase):
+
+    def setUp(self):
+        self.ranker = SearchRanker()
+
+    def test_rank_order(self):
+        title_hits = [
+            ('4', 'Enriched'),
+            ('3', 'The Rich And The Mighty'),
+            ('2', 'Rich And Reckless'),
+            ]
+        author_hits = [('5', 'Clara Callan'), ('2', 'Rich And Reckless')]
+        ranked = self.ranker.rank('rich', title_hits, author_hits)
+        self.assertEqual([isbn for isbn, score in ranked], ['2', '3', '4', '5'])
+        self.assertEqual(ranked[0][1], SearchRanker.SCORE_TITLE_PREFIX)
+        self.assertEqual(ranked[1][1], SearchRanker.SCORE_TITLE_TOKEN)
+        self.assertEqual(ranked[2][1], SearchRanker.SCORE_TITLE)
+        self.assertEqual(ranked[3][1], SearchRanker.SCORE_AUTHOR)
+
+    def test_rank_isbn_first(self):
+        ranked = self.ranker.rank('0380699710', [('1', '0380699710 Rich')], [], isbn_hits=[('0380699710', 'Rich')])
+        self.assertEqual(ranked[0], ('0380699710', SearchRanker.SCORE_ISBN))
+
+
+@override_settings(SEARCH_BACKEND='icontains')
+class SearchPaginationTest(APITestCase):
+
+    def setUp(self):
+        self.path = '/search/'
+        search_cache.clear()
+        author = models.Author.objects.create(name='Richard Wright')
+        for i in xrange(1, 26):
+            isbn = '{0:010d}'.format(i)
+            book = models.Book.objects.create(isbn=isbn, title='Rich Book {0:02d}'.format(i), cover='')
+            # matches both title and author, listed once
+            models.BookAuthors.objects.create(isbn=book, author=author)
+
+    def test_list_dedupe_and_count(self):
+        response = self.client.get(self.path, {'q': 'rich', 'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['books']), 25)
+        self.assertEqual(response.data['next_cursor'], None)
+
+    def test_list_cursor_pages(self):
+        isbns = []
+        params = {'q': 'rich', 'limit': 10}
+        while True:
+            response = self.client.get(self.path, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(len(response.data['books']) <= 10)
+            isbns.extend(_['isbn'] for _ in response.data['books'])
+            if response.data['next_cursor'] is None:
+                break
+            params['cursor'] = response.data['next_cursor']
+        self.assertEqual(isbns, ['{0:010d}'.format(i) for i in xrange(1, 26)])
+
+    def test_list_offset(self):
+        response = self.client.get(self.path, {'q': 'rich', 'limit': 5, 'offset': 20})
+        self.assertEqual([_['isbn'] for _ in response.data['books']], ['{0:010d}'.format(i) for i in xrange(21, 26)])
+        self.assertEqual(response.data['next_cursor'], None)
+
+    def test_list_default_limit(self):
+        response = self.client.get(self.path, {'q': 'rich'})
+        self.assertEqual(len(response.data['books']), 20)
+
+    def test_list_cursor_other_query(self):
+        response = self.client.get(self.path, {'q': 'rich', 'limit': 5})
+        cursor = response.data['next_cursor']
+        response = self.client.get(self.path, {'q': 'book', 'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_invalid_cursor(self):
+        response = self.client.get(self.path, {'q': 'rich', 'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, 400)
@@ -21,7 +21,7 @@ from rest_framework import routers
 
 from views import search, borrowers
 from views.auth import login
-from views.books import loans, fines
+from views.books import loans, fines, holds
 
 router = routers.DefaultRouter()
 router.register(r'auth/login', login.LoginViewSet, base_name='login')
@@ -29,6 +29,7 @@ router.register(r'search', search.SearchViewSet, base_name='search')
 router.register(r'borrowers', borrowers.BorrowersViewSet, base_name='borrowers')
 router.register(r'books/loans', loans.BooksLoansViewSet, base_name='books_loans')
 router.register(r'books/fines', fines.FinesViewSet, base_name='fines')
+router.register(r'books/holds', holds.HoldsViewSet, base_name='holds')
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
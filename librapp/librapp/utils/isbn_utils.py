@@ -0,0 +1,66 @@
+import re
+
+
+class ISBNUtils(object):
+    ''' ISBN-10 and ISBN-13 normalization, validation and conversion
+
+    **Usage**
+        iutils = ISBNUtils()
+        iutils.parse('0-380-69971-0')   # ('0380699710', '9780380699711')
+        iutils.parse('978-0380699711')  # ('0380699710', '9780380699711')
+        iutils.parse('rich and')        # None, not an ISBN
+    '''
+
+    def clean(self, text=''):
+        '''
+        text : example '0-380-69971-x'
+        returns '038069971X'
+        '''
+        return re.sub(r'[\s-]', '', text).upper()
+
+    def is_isbn10(self, isbn=''):
+        if re.match(r'^\d{9}[\dX]$', isbn) is None:
+            return False
+        total = 0
+        for i, char in enumerate(isbn):
+            digit = 10 if char == 'X' else int(char)
+            total += (10 - i) * digit
+        return total % 11 == 0
+
+    def is_isbn13(self, isbn=''):
+        if re.match(r'^\d{13}$', isbn) is None:
+            return False
+        total = sum(int(char) * (1 if i % 2 == 0 else 3) for i, char in enumerate(isbn))
+        return total % 10 == 0
+
+    def to_isbn13(self, isbn10=''):
+        body = '978' + isbn10[:9]
+        total = sum(int(char) * (1 if i % 2 == 0 else 3) for i, char in enumerate(body))
+        return '{0}{1}'.format(body, (10 - total % 10) % 10)
+
+    def to_isbn10(self, isbn13=''):
+        '''returns None for 979 prefixed ISBN-13, they have no ISBN-10
+        '''
+        if not isbn13.startswith('978'):
+            return None
+        body = isbn13[3:12]
+        total = sum((10 - i) * int(char) for i, char in enumerate(body))
+        check = (11 - total % 11) % 11
+        return '{0}{1}'.format(body, 'X' if check == 10 else check)
+
+    def is_isbn_shaped(self, text=''):
+        '''10 or 13 chars of ISBN after removing hyphens and spaces, valid or not
+        '''
+        isbn = self.clean(text)
+        return re.match(r'^(\d{9}[\dX]|\d{13})$', isbn) is not None
+
+    def parse(self, text=''):
+        '''Returns (isbn10, isbn13) for a valid ISBN-10 or ISBN-13, else None.
+        isbn10 is None for 979 prefixed ISBN-13.
+        '''
+        isbn = self.clean(text)
+        if self.is_isbn10(isbn):
+            return isbn, self.to_isbn13(isbn)
+        if self.is_isbn13(isbn):
+            return self.to_isbn10(isbn), isbn
+        return None
@@ -1,9 +1,14 @@
 import traceback
 from datetime import datetime, timedelta
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
+from rest_framework.decorators import list_route
 from rest_framework.response import Response
 
 from librapp import models
+from librapp.lib.fine_ledger import FineLedger, LedgerError
+from librapp.lib.fine_summary import FineSummary
+from librapp.lib.loan_query import LoanQuery
 from librapp.lib.rbac import RBAC
 from librapp.lib.request_field import RequestField
 from librapp.lib.request_validator import RequestValidation, ValidationError
@@ -21,6 +26,9 @@ class FinesViewSet(viewsets.ViewSet):
     **Methods:**
         - list
         - update
+        - balance
+        - summary
+        - settle
 
     **HTTP Code:**
         - 200 OK
@@ -33,6 +41,11 @@ class FinesViewSet(viewsets.ViewSet):
     dutils = DateUtils()
     rbac = RBAC()
     vh = ViewsHelper()
+    lq = LoanQuery()
+    ledger = FineLedger()
+    fs = FineSummary()
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
 
 
     def list(self, request):
@@ -50,21 +63,51 @@ class FinesViewSet(viewsets.ViewSet):
         card_no            integer     No         borrower card_no
         lib_branch_id      integer     No         library branch id
         fine_type          string      No         Options: paid, unpaid, both (default)
+        order_by           string      No         Options: id (default), due_date
+        limit              integer     No         page size, default: 100, max: 1000
+        cursor             string      No         X-Next-Cursor of the previous page, same order_by
+        export             bool        No         true: all fines as NDJSON, one per line, no paging
         ================== =========== ========== =============================
 
         **Sample Request**
         ::
-            GET http://foo.com/books/fines/?card_no=1
+            GET http://foo.com/books/fines/?card_no=1&fine_type=unpaid
 
         **Sample Response**
         ::
-            {}
+            [
+                {
+                    "id": 12,
+                    "isbn": "0151009376",
+                    "lib_branch_id": 1,
+                    "card_no": 1,
+                    "date_out": "2016-01-07T18:06:21.695000+00:00",
+                    "date_in": null,
+                    "due_date": "2016-01-21T18:06:21.695000+00:00",
+                    "fine": {"id": 3, "fine_amt": "4.50", "paid_amt": "1.25", "unpaid_amt": "3.25", "paid": false}
+                }
+            ]
+
+            One item for each fine, with its loan. Loans without fine are not listed.
+            fine_amt: fine accrued, paid_amt: paid towards it, unpaid_amt: left to pay, fine_amt - paid_amt
+
+        **Response Headers**
+        ::
+            X-Fines-As-Of: 2016-02-07T18:06:21.695000+00:00
+            X-Next-Cursor: eyJpZCI6MTAwLCJvIjoiaWQifQ
+
+            Fines are computed by librapp/bin/accrue_fines.py, this is the time of its last run.
+            X-Next-Cursor is set if there are more fines, pass it as cursor to get the next page.
         '''
 
         fields = [
                 RequestField(name='card_no', required=False, query_param=True, types=(int, str, unicode), checks=[]),
                 RequestField(name='lib_branch_id', required=False, query_param=True, types=(int,), checks=[]),
                 RequestField(name='fine_type', required=False, query_param=True, types=(str, unicode), checks=[]),
+                RequestField(name='order_by', required=False, query_param=True, types=(str, unicode), checks=['is_valid_loan_order']),
+                RequestField(name='limit', required=False, query_param=True, types=(int, long), checks=['is_valid_limit']),
+                RequestField(name='cursor', required=False, query_param=True, types=(str, unicode), checks=['is_valid_cursor']),
+                RequestField(name='export', required=False, query_param=True, types=(bool,), checks=[]),
                 ]
         checks = []
 
@@ -74,35 +117,30 @@ class FinesViewSet(viewsets.ViewSet):
             return Response({'msg': e.message}, status=e.status)
 
         try:
-            loan_filter = {}
             card_no = request.query_params.get('card_no')
-            if card_no is not None:
-                loan_filter['card_no'] = int(card_no)
-
-            b_loans = models.BookLoan.objects.filter(**loan_filter)
-
             lib_branch_id = request.query_params.get('lib_branch_id')
             fine_type = request.query_params.get('fine_type', 'both').lower()
-            result = []
-            for loan in b_loans:
-                append = False
-                if lib_branch_id is not None:
-                    lib_branch_id = int(lib_branch_id)
-                    if lib_branch_id == loan.book.lib_branch.id:
-                        append = True
-                else:
-                    append = True
-
-                loan_data = self.vh.get_loan_data(loan)
-                if fine_type == "paid":
-                    if loan_data['fine']['paid'] is False:
-                        append = False
-                elif fine_type == "unpaid":
-                    if loan_data['fine']['paid'] is True:
-                        append = False
-                if append:
-                    result.append(loan_data)
-            return Response(result)
+            fines = self.lq.get_fines(card_no=card_no, lib_branch_id=lib_branch_id, fine_type=fine_type)
+
+            order = request.query_params.get('order_by', 'id')
+            try:
+                after = self.vh.get_loans_after(request.query_params.get('cursor'), order)
+            except ValueError:
+                msg = 'cursor: not valid for order_by: {0}.'.format(order)
+                return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+            if request.query_params.get('export', '').lower() in ['true', '1']:
+                lines = self.lq.iter_ndjson(fines, order=order, after=after, fines=True)
+                response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+                return self.vh.set_fines_as_of(response)
+
+            limit = min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+            page, after = self.lq.get_page(fines, order=order, after=after, limit=limit, due_date='loan__due_date')
+            response = Response(self.lq.get_fines_data(page))
+            next_cursor = self.vh.get_next_cursor(after, order)
+            if next_cursor is not None:
+                response['X-Next-Cursor'] = next_cursor
+            return self.vh.set_fines_as_of(response)
         except:
             msg = 'Error getting book loan data for card_no: {0}.'.format(card_no)
             return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
@@ -125,7 +163,8 @@ class FinesViewSet(viewsets.ViewSet):
 
 
     def update(self, request, pk=None):
-        '''Updates book loan fine
+        '''Pays towards book loan fine. The payment is added to the fine ledger,
+        the fine is paid when paid_amt reaches fine_amt
 
         **Usage**
         ::
@@ -136,22 +175,34 @@ class FinesViewSet(viewsets.ViewSet):
         ================== =========== ========== =============================
         name               Type        Required   Description
         ================== =========== ========== =============================
-        paid_amt           float       Yes        Amt paid towards fine
+        paid_amt           decimal     Yes        Amt paid towards fine, eg: 2.50
         ================== =========== ========== =============================
 
         **Sample Request**
         ::
             {
+                "paid_amt": "5.00"
             }
 
         **Sample Response**
         ::
-            {}
+            {
+                "id": 3,
+                "fine_amt": "4.50",
+                "paid_amt": "4.50",
+                "paid": true,
+                "change": "0.50",
+                "balance": "0.00"
+            }
+
+            paid_amt: total paid towards the fine
+            change: part of the payment not used
+            balance: unpaid fines of the borrower, all loans
         '''
 
         fields = [
                 RequestField(name='pk', required=True, is_pk=True, types=(int,), checks=[]),
-                RequestField(name='paid_amt', required=True, types=(int, float), checks=['is_valid_amount']),
+                RequestField(name='paid_amt', required=True, types=(int, float, str, unicode), checks=['is_valid_amount']),
                 ]
         checks = []
 
@@ -161,27 +212,235 @@ class FinesViewSet(viewsets.ViewSet):
             return Response({'msg': e.message}, status=e.status)
 
         try:
-            fine = models.Fine.objects.get(id=pk)
-            paid_amt = float(request.data.get('paid_amt', 0))
-            fine_amt = float(fine.fine_amt) # convert from decimal
-            new_fine = fine_amt - paid_amt
-            change = 0
-            if new_fine < 0:
-                change = paid_amt - fine_amt
-                new_fine = 0
-            if new_fine == 0:
-                fine.paid = True
-            fine.fine_amt = new_fine
-            fine.save()
+            fine, change = self.ledger.pay(fine_id=pk, amount=self.vh.get_amount(request.data.get('paid_amt')))
+        except LedgerError as e:
+            return Response({'msg': e.message}, status=e.status)
 
+        try:
             resp_data = {
                     'id': fine.id,
                     'fine_amt': fine.fine_amt,
-                    'paid': fine.paid
+                    'paid_amt': fine.paid_amt,
+                    'paid': fine.paid,
+                    'change': change,
+                    'balance': self.ledger.get_balance(fine.loan.card_no_id),
                     }
-            resp_data['change'] = change
             return Response(resp_data)
         except:
-            raise
             msg = 'Could not update Loan Entry'
             return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    @list_route(methods=['get'], url_path='balance')
+    def balance(self, request):
+        '''Responses with the unpaid fines of a borrower, all loans, from the fine ledger
+
+        **Usage**
+        ::
+            GET http://foo.com/books/fines/balance/
+
+        **Query Parameters**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        card_no            integer     Yes        borrower card_no
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            GET http://foo.com/books/fines/balance/?card_no=1
+
+        **Sample Response**
+        ::
+            {
+                "card_no": 1,
+                "balance": "4.50"
+            }
+        '''
+
+        fields = [
+                RequestField(name='card_no', required=True, query_param=True, types=(int,), checks=[]),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            card_no = int(request.query_params.get('card_no'))
+            return Response({'card_no': card_no, 'balance': self.ledger.get_balance(card_no)})
+        except:
+            msg = 'Error getting balance for card_no: {0}.'.format(card_no)
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    @list_route(methods=['post'], url_path='settle')
+    def settle(self, request):
+        '''Pays an amount towards all unpaid fines of a borrower, oldest due date first,
+        in one transaction, eg: a borrower paying off fines at the desk.
+        Use this instead of PUT /books/fines/<fines ID>/ for each fine
+
+        **Usage**
+        ::
+            POST http://foo.com/books/fines/settle/
+
+        **Request body**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        card_no            integer     Yes        borrower card_no
+        amount             decimal     Yes        Amt paid, eg: 20.00
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            {
+                "card_no": 1,
+                "amount": "5.00"
+            }
+
+        **Sample Response**
+        ::
+            {
+                "card_no": 1,
+                "amount": "5.00",
+                "applied": "4.75",
+                "change": "0.25",
+                "balance": "0.00",
+                "fines": [
+                    {"id": 3, "loan_id": 12, "fine_amt": "4.50", "applied": "4.50", "paid_amt": "4.50", "paid": true},
+                    {"id": 7, "loan_id": 15, "fine_amt": "0.25", "applied": "0.25", "paid_amt": "0.25", "paid": true}
+                ]
+            }
+
+            applied: total paid towards fines, amount - change
+            fines: fines paid in part or in full, oldest due date first
+            balance: unpaid fines of the borrower after the payment
+        '''
+
+        fields = [
+                RequestField(name='card_no', required=True, types=(int,), checks=[]),
+                RequestField(name='amount', required=True, types=(int, float, str, unicode), checks=['is_valid_amount']),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        card_no = request.data.get('card_no')
+        amount = self.vh.get_amount(request.data.get('amount'))
+        try:
+            allocations, change = self.ledger.settle(card_no=card_no, amount=amount)
+        except LedgerError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            resp_data = {
+                    'card_no': card_no,
+                    'amount': amount,
+                    'applied': amount - change,
+                    'change': change,
+                    'balance': self.ledger.get_balance(card_no),
+                    'fines': [{
+                        'id': fine.id,
+                        'loan_id': fine.loan_id,
+                        'fine_amt': fine.fine_amt,
+                        'applied': applied,
+                        'paid_amt': fine.paid_amt,
+                        'paid': fine.paid,
+                        } for fine, applied in allocations],
+                    }
+            return Response(resp_data)
+        except:
+            msg = 'Could not settle fines for card_no: {0}'.format(card_no)
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    @list_route(methods=['get'], url_path='summary')
+    def summary(self, request):
+        '''Responses with fine totals, by branch and by overdue days, computed by the database.
+        Use this instead of totaling GET /books/fines/
+
+        **Usage**
+        ::
+            GET http://foo.com/books/fines/summary/
+
+        **Query Parameters**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        lib_branch_id      integer     No         library branch id
+        cache              bool        No         false: compute now, default: true
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            GET http://foo.com/books/fines/summary/?lib_branch_id=1
+
+        **Sample Response**
+        ::
+            {
+                "totals": {
+                    "count": 3,
+                    "fine_amt": "4.50",
+                    "paid_count": 1,
+                    "paid_amt": "1.25",
+                    "unpaid_count": 2,
+                    "unpaid_amt": "3.25"
+                },
+                "branches": [
+                    {
+                        "lib_branch_id": 1,
+                        "count": 3,
+                        "fine_amt": "4.50",
+                        "paid_count": 1,
+                        "paid_amt": "1.25",
+                        "unpaid_count": 2,
+                        "unpaid_amt": "3.25"
+                    }
+                ],
+                "overdue_days": [
+                    {"days": "1-7", "count": 2, "fine_amt": "1.50", "unpaid_amt": "1.50"},
+                    {"days": "8-30", "count": 1, "fine_amt": "3.00", "unpaid_amt": "1.75"},
+                    {"days": "31-90", "count": 0, "fine_amt": "0.00", "unpaid_amt": "0.00"},
+                    {"days": "91+", "count": 0, "fine_amt": "0.00", "unpaid_amt": "0.00"}
+                ]
+            }
+
+            unpaid_amt: what is left of unpaid fines, fine_amt - paid_amt
+            overdue_days: days since the due date of the loan, checked in or not
+            Totals are cached for FINE_SUMMARY_CACHE_TTL seconds, per process.
+
+        **Response Headers**
+        ::
+            X-Fines-As-Of: 2016-02-07T18:06:21.695000+00:00
+        '''
+
+        fields = [
+                RequestField(name='lib_branch_id', required=False, query_param=True, types=(int,), checks=[]),
+                RequestField(name='cache', required=False, query_param=True, types=(bool,), checks=[]),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            lib_branch_id = request.query_params.get('lib_branch_id')
+            if request.query_params.get('cache', '').lower() in ['false', '0']:
+                summary = self.fs.get_summary(lib_branch_id=lib_branch_id)
+            else:
+                summary = self.fs.get_cached_summary(lib_branch_id=lib_branch_id)
+            return self.vh.set_fines_as_of(Response(summary))
+        except:
+            msg = 'Error getting fine summary for lib_branch_id: {0}.'.format(lib_branch_id)
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
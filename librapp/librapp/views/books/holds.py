@@ -0,0 +1,257 @@
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+
+from librapp.lib.hold_queue import HoldError, HoldQueue
+from librapp.lib.request_field import RequestField
+from librapp.lib.request_validator import RequestValidation, ValidationError
+
+
+class HoldsViewSet(viewsets.ViewSet):
+    '''API Endpoint to place, query and cancel holds on books not available at a branch.
+    Checkin hands the copy to the oldest waiting hold, its status becomes ready, and
+    the borrower checks it out with POST /books/loans/ before expires_at.
+
+    **API Endpoint**
+    ::
+        http://foo.com/books/holds/
+
+    **Methods:**
+        - retrieve
+        - list
+        - create
+        - delete
+
+    **HTTP Code:**
+        - 200 OK
+        - 400 Bad Request
+        - 401 Unauthorized
+        - 403 Forbidden
+        - 405 Method Not Allowed
+    '''
+
+    hq = HoldQueue()
+
+
+    def list(self, request):
+        '''Responses with a list of holds, in queue order
+
+        **Usage**
+        ::
+            GET http://foo.com/books/holds/
+
+        **Query Parameters**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        card_no            integer     No         borrower card_no
+        lib_branch_id      integer     No         library branch id
+        isbn               string      No         book isbn
+        active             bool        No         true: waiting and ready holds only
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            GET http://foo.com/books/holds/?card_no=1&active=true
+
+        **Sample Response**
+        ::
+            {
+                "holds": [
+                    {
+                        "id": 3,
+                        "isbn": "0151009376",
+                        "lib_branch_id": 1,
+                        "book_copy_id": 12,
+                        "card_no": 1,
+                        "status": "waiting",
+                        "position": 2,
+                        "created_at": "2016-02-07T18:06:21.695000+00:00",
+                        "expires_at": null
+                    }
+                ]
+            }
+
+            status: waiting, ready, fulfilled, cancelled or expired
+            position: place in the queue, 1 is next, null if not waiting
+            expires_at: ready holds only, the copy goes to the next hold after
+        '''
+
+        fields = [
+                RequestField(name='card_no', required=False, query_param=True, types=(int, str, unicode), checks=[]),
+                RequestField(name='lib_branch_id', required=False, query_param=True, types=(int,), checks=[]),
+                RequestField(name='isbn', required=False, query_param=True, types=(str, unicode), checks=[]),
+                RequestField(name='active', required=False, query_param=True, types=(bool,), checks=[]),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            card_no = request.query_params.get('card_no')
+            holds = self.hq.get_holds(
+                    card_no=card_no,
+                    lib_branch_id=request.query_params.get('lib_branch_id'),
+                    isbn=request.query_params.get('isbn'),
+                    active=request.query_params.get('active', '').lower() in ['true', '1'])
+            return Response({'holds': self.hq.get_holds_data(holds)})
+        except:
+            msg = 'Error getting holds for card_no: {0}.'.format(card_no)
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    def retrieve(self, request, pk=None):
+        '''Responses with the hold and its place in the queue
+
+        **Usage**
+        ::
+            GET http://foo.com/books/holds/<hold ID>/
+
+        **Sample Response**
+        ::
+            {
+                "id": 3,
+                "isbn": "0151009376",
+                "lib_branch_id": 1,
+                "book_copy_id": 12,
+                "card_no": 1,
+                "status": "waiting",
+                "position": 2,
+                "created_at": "2016-02-07T18:06:21.695000+00:00",
+                "expires_at": null
+            }
+        '''
+
+        fields = [
+                RequestField(name='pk', required=True, is_pk=True, types=(int,), checks=[]),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields, pk=pk)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            hold = self.hq.get_holds().get(id=pk)
+            return Response(self.hq.get_hold_data(hold, self.hq.get_position(hold)))
+        except:
+            msg = 'Hold: {0} does not exist'.format(pk)
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    def create(self, request):
+        '''Places a hold on a book at a branch, when no copy is available
+
+        **Usage**
+        ::
+            POST http://foo.com/books/holds/
+
+        **Request body**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        lib_branch_id      integer     Yes        library branch id
+        isbn               string      Yes        book isbn
+        card_no            integer     Yes        borrower card_no
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            {
+                "lib_branch_id": 1,
+                "isbn": "0151009376",
+                "card_no": 1
+            }
+
+        **Sample Response**
+        ::
+            {
+                "id": 3,
+                "isbn": "0151009376",
+                "lib_branch_id": 1,
+                "book_copy_id": 12,
+                "card_no": 1,
+                "status": "waiting",
+                "position": 2,
+                "created_at": "2016-02-07T18:06:21.695000+00:00",
+                "expires_at": null
+            }
+        '''
+
+        fields = [
+                RequestField(name='lib_branch_id', required=True, types=(int,), checks=[]),
+                RequestField(name='isbn', required=True, types=(str, unicode), checks=[]),
+                RequestField(name='card_no', required=True, types=(int,), checks=[]),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            hold = self.hq.place(
+                    lib_branch_id=request.data.get('lib_branch_id'),
+                    isbn=request.data.get('isbn'),
+                    card_no=request.data.get('card_no'))
+        except HoldError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            return Response(self.hq.get_hold_data(hold, self.hq.get_position(hold)))
+        except:
+            msg = 'Could not create Hold'
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    def update(self, request, pk=None):
+        '''Method Not Allowed
+        '''
+
+        msg = 'Method Not Allowed'
+        return Response({'msg': msg}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+    def destroy(self, request, pk=None):
+        '''Cancels a waiting or ready hold. The copy of a ready hold goes to the next hold
+
+        **Usage**
+        ::
+            DELETE http://foo.com/books/holds/<hold ID>/
+
+        **Sample Response**
+        ::
+            {
+                "id": 3,
+                ...
+                "status": "cancelled",
+                "position": null
+            }
+        '''
+
+        fields = [
+                RequestField(name='pk', required=True, is_pk=True, types=(int,), checks=[]),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields, pk=pk)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            hold = self.hq.cancel(hold_id=pk)
+        except HoldError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            return Response(self.hq.get_hold_data(hold))
+        except:
+            msg = 'Could not cancel Hold'
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
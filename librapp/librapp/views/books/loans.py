@@ -1,9 +1,13 @@
 import traceback
-from datetime import datetime, timedelta
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
+from rest_framework.decorators import list_route
 from rest_framework.response import Response
 
 from librapp import models
+from librapp.lib.loan_archive import LoanArchive
+from librapp.lib.loan_query import LoanQuery
+from librapp.lib.loan_service import LoanError, LoanService
 from librapp.lib.rbac import RBAC
 from librapp.lib.request_field import RequestField
 from librapp.lib.request_validator import RequestValidation, ValidationError
@@ -24,6 +28,9 @@ class BooksLoansViewSet(viewsets.ViewSet):
         - create
         - update
         - delete
+        - bulk-checkout
+        - bulk-checkin
+        - history
 
     **HTTP Code:**
         - 200 OK
@@ -36,6 +43,11 @@ class BooksLoansViewSet(viewsets.ViewSet):
     dutils = DateUtils()
     rbac = RBAC()
     vh = ViewsHelper()
+    lq = LoanQuery()
+    ls = LoanService()
+    la = LoanArchive()
+    DEFAULT_LIMIT = 100
+    MAX_LIMIT = 1000
 
 
     def list(self, request):
@@ -54,21 +66,44 @@ class BooksLoansViewSet(viewsets.ViewSet):
         lib_branch_id      integer     No         library branch id
         active             bool        No         true: get active loans only
         overdue            bool        No         true: get overdue loans only (subset of active)
+        order_by           string      No         Options: id (default), due_date
+        limit              integer     No         page size, default: 100, max: 1000
+        cursor             string      No         X-Next-Cursor of the previous page, same order_by
+        export             bool        No         true: all loans as NDJSON, one per line, no paging
         ================== =========== ========== =============================
 
         **Sample Request**
         ::
-            GET http://foo.com/books/loans/?card_no=1
+            GET http://foo.com/books/loans/?card_no=1&order_by=due_date&limit=20
 
         **Sample Response**
         ::
-            {}
+            {
+                "books_loans": [...],
+                "next_cursor": "eyJkIjoiMjAxNi0wMi0wN1QxODowNjoyMS42OTUwMDArMDA6MDAiLCJpZCI6MTIsIm8iOiJkdWVfZGF0ZSJ9"
+            }
+
+            fine of each loan, as in GET /books/fines/:
+                {"id": 3, "fine_amt": "4.50", "paid_amt": "1.25", "unpaid_amt": "3.25", "paid": false}
+                {"id": 0, "amount": 0, "paid": "NA"} for loans without fine
+
+        **Response Headers**
+        ::
+            X-Fines-As-Of: 2016-02-07T18:06:21.695000+00:00
+            X-Next-Cursor: eyJpZCI6MTAwLCJvIjoiaWQifQ
+
+            Fines are computed by librapp/bin/accrue_fines.py, this is the time of its last run.
+            X-Next-Cursor is set if there are more loans, pass it as cursor to get the next page.
         '''
 
         fields = [
                 RequestField(name='card_no', required=False, query_param=True, types=(int, str, unicode), checks=[]),
                 RequestField(name='lib_branch_id', required=False, query_param=True, types=(int,), checks=[]),
                 RequestField(name='active', required=False, query_param=True, types=(bool,), checks=[]),
+                RequestField(name='order_by', required=False, query_param=True, types=(str, unicode), checks=['is_valid_loan_order']),
+                RequestField(name='limit', required=False, query_param=True, types=(int, long), checks=['is_valid_limit']),
+                RequestField(name='cursor', required=False, query_param=True, types=(str, unicode), checks=['is_valid_cursor']),
+                RequestField(name='export', required=False, query_param=True, types=(bool,), checks=[]),
                 ]
         checks = []
 
@@ -78,37 +113,32 @@ class BooksLoansViewSet(viewsets.ViewSet):
             return Response({'msg': e.message}, status=e.status)
 
         try:
-            loan_filter = {}
-
             card_no = request.query_params.get('card_no')
-            if card_no is not None:
-                loan_filter['card_no'] = int(card_no)
-
-            active = request.query_params.get('active', '')
-            if active.lower() in ['true', '1']:
-                loan_filter['date_in'] = None
-
-            overdue = request.query_params.get('overdue', '')
-            if overdue.lower() in ['true', '1']:
-                loan_filter['date_in'] = None
-                loan_filter['due_date__lt'] = datetime.now()
+            active = request.query_params.get('active', '').lower() in ['true', '1']
+            overdue = request.query_params.get('overdue', '').lower() in ['true', '1']
+            lib_branch_id = request.query_params.get('lib_branch_id')
+            b_loans = self.lq.get_loans(card_no=card_no, lib_branch_id=lib_branch_id, active=active, overdue=overdue)
 
-            b_loans = models.BookLoan.objects.filter(**loan_filter)
+            order = request.query_params.get('order_by', 'id')
+            try:
+                after = self.vh.get_loans_after(request.query_params.get('cursor'), order)
+            except ValueError:
+                msg = 'cursor: not valid for order_by: {0}.'.format(order)
+                return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
 
-            lib_branch_id = request.query_params.get('lib_branch_id')
-            result = []
-            for loan in b_loans:
-                append = False
-                if lib_branch_id is not None:
-                    lib_branch_id = int(lib_branch_id)
-                    if lib_branch_id == loan.book.lib_branch.id:
-                        append = True
-                else:
-                    append = True
-                if append:
-                    loan_data = self.vh.get_loan_data(loan)
-                    result.append(loan_data)
-            return Response({'books_loans': result})
+            if request.query_params.get('export', '').lower() in ['true', '1']:
+                lines = self.lq.iter_ndjson(b_loans, order=order, after=after)
+                response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+                return self.vh.set_fines_as_of(response)
+
+            limit = min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+            page, after = self.lq.get_page(b_loans, order=order, after=after, limit=limit)
+            result = self.lq.get_loans_data(page)
+            next_cursor = self.vh.get_next_cursor(after, order)
+            response = Response({'books_loans': result, 'next_cursor': next_cursor})
+            if next_cursor is not None:
+                response['X-Next-Cursor'] = next_cursor
+            return self.vh.set_fines_as_of(response)
         except:
             msg = 'Error getting book loan data for card_no: {0}.'.format(card_no)
             return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
@@ -165,65 +195,19 @@ class BooksLoansViewSet(viewsets.ViewSet):
             return Response({'msg': e.message}, status=e.status)
 
         try:
-            # data
-            lib_branch_id = request.data.get('lib_branch_id')
-            isbn = request.data.get('isbn')
-            card_no = request.data.get('card_no')
-
-            # book copy in that library
-            book_copy = models.BookCopy.objects.get(isbn=isbn, lib_branch_id=lib_branch_id)
-
-            # Check if active loan for the book_copy (book in the library) already exists
-            try:
-                existing_loan = models.BookLoan.objects.get(card_no=card_no, book_id=book_copy.id)
-                if existing_loan.date_in is None:
-                    msg = 'Cannot loan the same book twice'
-                    return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
-            except models.BookLoan.DoesNotExist:
-                pass
-            except:
-                raise
-
-            b_loans = models.BookLoan.objects.filter(card_no=card_no)
-            # Check fine
-            if b_loans:
-                for loan in b_loans:
-                    try:
-                        fine = models.Fine.objects.get(loan_id=loan.id)
-                        if fine.fine_amt and not fine.paid:
-                            msg = 'Unpaid fines. Cannot borrow any books at this time'
-                            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
-                    except models.Fine.DoesNotExist:
-                        pass # no problem
-
-            # Check borrow limit (max 3 books)
-            # Active loan count, ie no date_in set yet
-            loan_count = models.BookLoan.objects.filter(card_no=card_no, date_in=None).count()
-            if loan_count >= 3:
-                msg = 'Cannot borrow more that 3 books at a time'
-                return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Check if available
-            if book_copy.no_of_copies == 0:
-                msg = 'Book is not available'
-                return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
-
-            # create a new record in book loan table
-            book_loan_row = {
-                    'book_id': book_copy.id,
-                    'card_no_id': card_no,
-                    'due_date': datetime.now() + timedelta(14)
-                    }
-            book_loan_obj = models.BookLoan.objects.create(**book_loan_row)
+            loan = self.ls.checkout(
+                    lib_branch_id=request.data.get('lib_branch_id'),
+                    isbn=request.data.get('isbn'),
+                    card_no=request.data.get('card_no'))
+        except LoanError as e:
+            return Response({'msg': e.message}, status=e.status)
 
-            # update available copies
-            book_copy.no_of_copies -= 1
-            book_copy.save()
+        try:
             response_data = {
-                    'id': book_loan_obj.id,
-                    'book_copy_id': book_loan_obj.book_id,
-                    'card_no': book_loan_obj.card_no.card_no,
-                    'isbn': book_loan_obj.book.isbn.isbn,
+                    'id': loan.id,
+                    'book_copy_id': loan.book_id,
+                    'card_no': loan.card_no_id,
+                    'isbn': loan.book.isbn_id,
                     }
             return Response(response_data)
         except:
@@ -265,29 +249,221 @@ class BooksLoansViewSet(viewsets.ViewSet):
             return Response({'msg': e.message}, status=e.status)
 
         try:
-            book_loan_obj = models.BookLoan.objects.get(id=pk)
-
-            # Check: no check in twice
-            if book_loan_obj.date_in is not None:
-                msg = 'Book is already checked in.'
-                return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Available copies increases by 1 upon checkin
-            book_copy = book_loan_obj.book
-            book_copy.no_of_copies += 1
-            book_copy.save()
-
-            # Save date in
-            book_loan_obj.date_in = datetime.now()
-            book_loan_obj.save()
+            loan = self.ls.checkin(loan_id=pk)
+        except LoanError as e:
+            return Response({'msg': e.message}, status=e.status)
 
+        try:
             response_data = {
-                    'id': book_loan_obj.id,
-                    'book_copy_id': book_loan_obj.book_id,
-                    'card_no': book_loan_obj.card_no.card_no,
-                    'isbn': book_loan_obj.book.isbn.isbn,
+                    'id': loan.id,
+                    'book_copy_id': loan.book_id,
+                    'card_no': loan.card_no_id,
+                    'isbn': loan.book.isbn_id,
                     }
             return Response(response_data)
         except:
             msg = 'Could not update Loan Entry'
             return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    @list_route(methods=['post'], url_path='bulk-checkout')
+    def bulk_checkout(self, request):
+        '''Checks out many books at a library branch in one transaction.
+        Each item gets a result, in request order. Failed items do not stop the others.
+
+        **Usage**
+        ::
+            POST http://foo.com/books/loans/bulk-checkout/
+
+        **Request body**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        lib_branch_id      integer     Yes        library branch id
+        items              list        Yes        [{"isbn": string, "card_no": integer}], max: 500
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            {
+                "lib_branch_id": 1,
+                "items": [
+                    {"isbn": "0151009376", "card_no": 1},
+                    {"isbn": "0380699710", "card_no": 2}
+                ]
+            }
+
+        **Sample Response**
+        ::
+            {
+                "results": [
+                    {"status": 200, "id": 12, "book_copy_id": 3, "card_no": 1, "isbn": "0151009376"},
+                    {"status": 400, "isbn": "0380699710", "card_no": 2, "msg": "Book is not available"}
+                ],
+                "count": 1
+            }
+        '''
+
+        fields = [
+                RequestField(name='lib_branch_id', required=True, types=(int,), checks=[]),
+                RequestField(name='items', required=True, types=(list,), checks=['is_valid_checkout_list']),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            results = self.ls.bulk_checkout(
+                    lib_branch_id=request.data.get('lib_branch_id'),
+                    items=request.data.get('items'))
+            count = len([_ for _ in results if _['status'] == 200])
+            return Response({'results': results, 'count': count})
+        except:
+            msg = 'Could not create Loan Entries'
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    @list_route(methods=['post'], url_path='bulk-checkin')
+    def bulk_checkin(self, request):
+        '''Checks in many book loans in one transaction, eg: emptying a returns bin.
+        Each loan id gets a result, in request order. Failed items do not stop the others.
+
+        **Usage**
+        ::
+            POST http://foo.com/books/loans/bulk-checkin/
+
+        **Request body**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        loan_ids           list        Yes        book loan IDs, max: 500
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            {
+                "loan_ids": [12, 13]
+            }
+
+        **Sample Response**
+        ::
+            {
+                "results": [
+                    {"status": 200, "id": 12, "book_copy_id": 3, "card_no": 1, "isbn": "0151009376"},
+                    {"status": 400, "id": 13, "msg": "Book is already checked in."}
+                ],
+                "count": 1
+            }
+        '''
+
+        fields = [
+                RequestField(name='loan_ids', required=True, types=(list,), checks=['is_valid_loan_id_list']),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            results = self.ls.bulk_checkin(loan_ids=request.data.get('loan_ids'))
+            count = len([_ for _ in results if _['status'] == 200])
+            return Response({'results': results, 'count': count})
+        except:
+            msg = 'Could not update Loan Entries'
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+
+    @list_route(methods=['get'], url_path='history')
+    def history(self, request):
+        '''Responses with a list of archived book loans, checked in and fines paid.
+        Loans are archived by librapp/bin/archive_loans.py, and are no longer in GET /books/loans/
+
+        **Usage**
+        ::
+            GET http://foo.com/books/loans/history/
+
+        **Query Parameters**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        card_no            integer     No         borrower card_no
+        lib_branch_id      integer     No         library branch id
+        order_by           string      No         Options: id (default), due_date
+        limit              integer     No         page size, default: 100, max: 1000
+        cursor             string      No         X-Next-Cursor of the previous page, same order_by
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            GET http://foo.com/books/loans/history/?card_no=1
+
+        **Sample Response**
+        ::
+            {
+                "books_loans": [
+                    {
+                        "id": 12,
+                        "isbn": "0151009376",
+                        "lib_branch_id": 1,
+                        "card_no": 1,
+                        "date_out": "2016-01-07T18:06:21.695000+00:00",
+                        "date_in": "2016-01-20T10:12:01.102000+00:00",
+                        "due_date": "2016-01-21T18:06:21.695000+00:00",
+                        "fine": {"id": 0, "amount": 0, "paid": "NA"}
+                    }
+                ],
+                "next_cursor": null
+            }
+
+        **Response Headers**
+        ::
+            X-Next-Cursor: eyJpZCI6MTAwLCJvIjoiaWQifQ
+
+            X-Next-Cursor is set if there are more loans, pass it as cursor to get the next page.
+        '''
+
+        fields = [
+                RequestField(name='card_no', required=False, query_param=True, types=(int, str, unicode), checks=[]),
+                RequestField(name='lib_branch_id', required=False, query_param=True, types=(int,), checks=[]),
+                RequestField(name='order_by', required=False, query_param=True, types=(str, unicode), checks=['is_valid_loan_order']),
+                RequestField(name='limit', required=False, query_param=True, types=(int, long), checks=['is_valid_limit']),
+                RequestField(name='cursor', required=False, query_param=True, types=(str, unicode), checks=['is_valid_cursor']),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        try:
+            card_no = request.query_params.get('card_no')
+            lib_branch_id = request.query_params.get('lib_branch_id')
+            a_loans = self.la.get_archived_loans(card_no=card_no, lib_branch_id=lib_branch_id)
+
+            order = request.query_params.get('order_by', 'id')
+            try:
+                after = self.vh.get_loans_after(request.query_params.get('cursor'), order)
+            except ValueError:
+                msg = 'cursor: not valid for order_by: {0}.'.format(order)
+                return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+            limit = min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+            page, after = self.lq.get_page(a_loans, order=order, after=after, limit=limit)
+            result = self.lq.get_loans_data(page)
+            next_cursor = self.vh.get_next_cursor(after, order)
+            response = Response({'books_loans': result, 'next_cursor': next_cursor})
+            if next_cursor is not None:
+                response['X-Next-Cursor'] = next_cursor
+            return response
+        except:
+            msg = 'Error getting book loan history for card_no: {0}.'.format(card_no)
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
@@ -1,14 +1,26 @@
+import hashlib
+import json
 import traceback
-from itertools import chain
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
+from rest_framework.decorators import list_route
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 from librapp import models
+from librapp.lib.cursor import decode_cursor, encode_cursor
 from librapp.lib.rbac import RBAC
 from librapp.lib.request_field import RequestField
 from librapp.lib.request_validator import RequestValidation, ValidationError
+from librapp.lib.search_cache import search_cache
+from librapp.lib.search_engine import get_search_engine, normalize
+from librapp.lib.search_ranker import SearchRanker
 from librapp.lib.views_helper import ViewsHelper
 from librapp.utils.date_utils import DateUtils
+from librapp.utils.isbn_utils import ISBNUtils
 
 
 class SearchViewSet(viewsets.ViewSet):
@@ -20,6 +32,8 @@ class SearchViewSet(viewsets.ViewSet):
 
     **Methods:**
         - list
+        - suggest : GET http://foo.com/search/suggest/
+        - bulk : POST http://foo.com/search/bulk/
 
     **HTTP Code:**
         - 200 OK
@@ -30,12 +44,20 @@ class SearchViewSet(viewsets.ViewSet):
     '''
 
     dutils = DateUtils()
+    iutils = ISBNUtils()
     rbac = RBAC()
     vh = ViewsHelper()
+    ranker = SearchRanker()
+
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+    DEFAULT_SUGGEST_LIMIT = 10
+    MAX_SUGGEST_LIMIT = 50
+    BULK_CHUNK_SIZE = 100
 
 
     def list(self, request):
-        '''Responds with list of search events matches. Searches against ISBN, Title, Author.
+        '''Responds with a page of matching books, best match first. Searches against ISBN, Title, Author.
 
         **Usage**
         ::
@@ -47,48 +69,57 @@ class SearchViewSet(viewsets.ViewSet):
         ================== =========== ========== =============================
         name               Type        Required   Description
         ================== =========== ========== =============================
-        q                  string      Yes        Search string, min length: 4, for search by ISBN provide full ISBN
+        q                  string      Yes        Search string, min length: 4, for search by ISBN provide full ISBN-10 or ISBN-13, hyphens are ignored
         lib_branch_id      integer     No         library branch id
+        limit              integer     No         page size, default: 20, max: 100
+        offset             integer     No         number of results to skip, default: 0
+        cursor             string      No         next_cursor from previous page, overrides offset
+        fuzzy              bool        No         true: typo tolerant search, default: false
         ================== =========== ========== =============================
 
+        Results are ordered by: exact ISBN, title prefix, title word, title, author match.
+        With fuzzy=true, results are ordered by trigram similarity to title or author name.
+        A book is listed once. count is the total number of matching books.
+
         **Sample Request**
         ::
-            http://foo.com/search/?q=rich+and&lib_branch_id=1
+            http://foo.com/search/?q=rich+and&lib_branch_id=1&limit=2
 
         **Sample Response**
         ::
             {
-                "count": 2,
+                "count": 3,
+                "next_cursor": "eyJvIjoyLCJxIjoiNmU0ZDUxMzYifQ",
                 "books": [
                     {
-                        "isbn": "0380699710",
-                        "title": "The Rich And The Mighty",
-                        "cover": "http://www.openisbn.com/cover/0380699710_72.jpg",
+                        "isbn": "0553273280",
+                        "title": "Rich And Reckless",
+                        "cover": "http://www.openisbn.com/cover/0553273280_72.jpg",
                         "authors": [
-                            "Vera Cowie"
+                            "Barney Leason"
                         ],
                         "availability": [
                             {
                                 "lib_branch_id": 1,
                                 "no_of_copies": 1,
-                                "id": 246431,
-                                "isbn_id": "0380699710"
+                                "id": 177796,
+                                "isbn_id": "0553273280"
                             }
                         ]
                     },
                     {
-                        "isbn": "0553273280",
-                        "title": "Rich And Reckless",
-                        "cover": "http://www.openisbn.com/cover/0553273280_72.jpg",
+                        "isbn": "0380699710",
+                        "title": "The Rich And The Mighty",
+                        "cover": "http://www.openisbn.com/cover/0380699710_72.jpg",
                         "authors": [
-                            "Barney Leason"
+                            "Vera Cowie"
                         ],
                         "availability": [
                             {
                                 "lib_branch_id": 1,
                                 "no_of_copies": 1,
-                                "id": 177796,
-                                "isbn_id": "0553273280"
+                                "id": 246431,
+                                "isbn_id": "0380699710"
                             }
                         ]
                     }
@@ -109,6 +140,10 @@ class SearchViewSet(viewsets.ViewSet):
                     required=False,
                     types=(int, long),
                     checks=[]),
+                RequestField(name='limit', query_param=True, required=False, types=(int, long), checks=['is_valid_limit']),
+                RequestField(name='offset', query_param=True, required=False, types=(int, long), checks=['is_valid_offset']),
+                RequestField(name='cursor', query_param=True, required=False, types=(str, unicode), checks=['is_valid_cursor']),
+                RequestField(name='fuzzy', query_param=True, required=False, types=(bool,), checks=[]),
                 ]
         #checks = ['login']
         checks = []
@@ -118,50 +153,367 @@ class SearchViewSet(viewsets.ViewSet):
         except ValidationError as e:
             return Response({'msg': e.message}, status=e.status)
 
-        query = request.query_params.get('q')
+        query = request.query_params.get('q').strip()
         lib_branch_id = request.query_params.get('lib_branch_id', 0)
+        limit = min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+        offset = int(request.query_params.get('offset', 0))
+        fuzzy = request.query_params.get('fuzzy', '').lower() == 'true'
+        query_key = self._get_query_key(query, lib_branch_id, fuzzy)
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            values = decode_cursor(cursor)
+            if values.get('q') != query_key or not isinstance(values.get('o'), int):
+                msg = 'cursor does not belong to this search.'
+                return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+            offset = values['o']
 
         try:
-            # Searches against ISBN, Title, Author's name.
-            books = models.Book.objects.filter(isbn=query)
-            # this happens by default: query = query.replace('+', ' ')
-            if not books:
-                # Filter Can have only one __icontains
-                book_filter = {'title__icontains': query}
-                books1 = models.Book.objects.filter(**book_filter)
-                author_filter = {'name__icontains': query}
-                authors = models.Author.objects.filter(**author_filter)
-                books2 = []
-                if authors:
-                    author_ids = [_.id for _ in authors]
-                    author_book = models.BookAuthors.objects.filter(author_id__in=author_ids)
-                    books2 = [_.isbn for _ in author_book]
-                books = list(chain(books1, books2))
-            books_data = self._get_books_data(books, lib_branch_id=lib_branch_id)
+            ranked = search_cache.get_ranked(query, lib_branch_id, fuzzy=fuzzy)
+            if ranked is None:
+                ranked = self._get_ranked(query, fuzzy=fuzzy)
+                search_cache.set_ranked(query, lib_branch_id, ranked, fuzzy=fuzzy)
+            page = [isbn for isbn, score in ranked[offset:offset + limit]]
+            books_data = self._get_cached_books_data(page, lib_branch_id=lib_branch_id)
+            next_cursor = None
+            if offset + limit < len(ranked):
+                next_cursor = encode_cursor({'o': offset + limit, 'q': query_key})
             result = {
                 'books': books_data,
-                'count': len(books_data)
+                'count': len(ranked),
+                'next_cursor': next_cursor,
                 }
             return Response(result)
         except:
             msg = 'Error getting Books.'
             return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
 
+    @list_route(methods=['get'])
+    def suggest(self, request):
+        '''Responds with typeahead suggestions, titles and author names starting with q.
+        Served from the in-process search index.
+
+        **Usage**
+        ::
+            GET http://foo.com/search/suggest/?q=<prefix>
+
+        **Query Parameters**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        q                  string      Yes        prefix, min length: 2, matches start of title, name or any of their words
+        limit              integer     No         max suggestions, default: 10, max: 50
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            http://foo.com/search/suggest/?q=rich+a
+
+        **Sample Response**
+        ::
+            {
+                "count": 2,
+                "suggestions": [
+                    {
+                        "text": "Rich And Reckless",
+                        "type": "title",
+                        "isbn": "0553273280"
+                    },
+                    {
+                        "text": "The Rich And The Mighty",
+                        "type": "title",
+                        "isbn": "0380699710"
+                    }
+                ]
+            }
+        '''
+
+        fields = [
+                RequestField(name='q', query_param=True, required=True, types=(str, unicode), checks=['check_suggest_string']),
+                RequestField(name='limit', query_param=True, required=False, types=(int, long), checks=['is_valid_limit']),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        prefix = request.query_params.get('q')
+        limit = min(int(request.query_params.get('limit', self.DEFAULT_SUGGEST_LIMIT)), self.MAX_SUGGEST_LIMIT)
+
+        try:
+            index = get_search_engine('index').get_index()
+            if index is not None:
+                found = index.suggest_index.suggest(prefix, limit=limit)
+            else:
+                found = self._get_db_suggestions(prefix, limit)
+            suggestions = []
+            for text, kind, isbn in found:
+                suggestion = {'text': text, 'type': kind}
+                if isbn is not None:
+                    suggestion['isbn'] = isbn
+                suggestions.append(suggestion)
+            return Response({'suggestions': suggestions, 'count': len(suggestions)})
+        except:
+            msg = 'Error getting suggestions.'
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
     @staticmethod
-    def _get_books_data(db_objs, lib_branch_id=0):
+    def _get_db_suggestions(prefix, limit):
+        '''Until the search index is ready: titles, then names, starting with prefix
+        '''
+        prefix = prefix.strip()
+        titles = models.Book.objects.filter(title__istartswith=prefix).order_by('title')[:limit]
+        found = [(title, 'title', isbn) for isbn, title in titles.values_list('isbn', 'title')]
+        if len(found) < limit:
+            names = models.Author.objects.filter(name__istartswith=prefix).order_by('name')[:limit - len(found)]
+            found.extend((name, 'author', None) for name in names.values_list('name', flat=True))
+        return found
+
+    @list_route(methods=['post'])
+    def bulk(self, request):
+        '''Looks up many ISBNs at once, eg: barcodes scanned from a shelf.
+        Responds with book data, same as search, for each ISBN found, in request order.
+        More than SEARCH_BULK_STREAM_THRESHOLD ISBNs are streamed in chunks.
+
+        **Usage**
+        ::
+            POST http://foo.com/search/bulk/
+
+        **Request body**
+
+        ================== =========== ========== =============================
+        name               Type        Required   Description
+        ================== =========== ========== =============================
+        isbns              list        Yes        ISBN-10 or ISBN-13 strings, max: 1000
+        lib_branch_id      integer     No         library branch id
+        ================== =========== ========== =============================
+
+        **Sample Request**
+        ::
+            {
+                "isbns": ["0380699710", "978-0553273281", "0000000000"],
+                "lib_branch_id": 1
+            }
+
+        **Sample Response**
+        ::
+            {
+                "books": [
+                    {
+                        "isbn": "0380699710",
+                        "title": "The Rich And The Mighty",
+                        "cover": "http://www.openisbn.com/cover/0380699710_72.jpg",
+                        "authors": ["Vera Cowie"],
+                        "availability": [
+                            {"lib_branch_id": 1, "no_of_copies": 1, "id": 246431, "isbn_id": "0380699710"}
+                        ]
+                    },
+                    ...
+                ],
+                "not_found": ["0000000000"],
+                "count": 2
+            }
+        '''
+
+        fields = [
+                RequestField(name='isbns', required=True, types=(list,), checks=['is_valid_isbn_list']),
+                RequestField(name='lib_branch_id', required=False, types=(int, long), checks=[]),
+                ]
+        checks = []
+
+        try:
+            vres = RequestValidation(request=request, checks=checks, fields=fields)
+        except ValidationError as e:
+            return Response({'msg': e.message}, status=e.status)
+
+        isbns = []
+        for isbn in request.data.get('isbns'):
+            if isbn not in isbns:
+                isbns.append(isbn)
+        lib_branch_id = int(request.data.get('lib_branch_id') or 0)
+
+        try:
+            threshold = getattr(settings, 'SEARCH_BULK_STREAM_THRESHOLD', 200)
+            if len(isbns) > threshold:
+                chunks = self._get_bulk_chunks(isbns, lib_branch_id, self.BULK_CHUNK_SIZE)
+                response = StreamingHttpResponse(self._stream_bulk(chunks), content_type='application/json')
+                return response
+            books_data, not_found = self._get_bulk_data(isbns, lib_branch_id)
+            return Response({'books': books_data, 'not_found': not_found, 'count': len(books_data)})
+        except:
+            msg = 'Error getting Books.'
+            return Response({'msg': msg}, status=status.HTTP_400_BAD_REQUEST)
+
+    def _get_bulk_data(self, isbns, lib_branch_id=0):
+        '''Returns (books data, isbns not found) for ISBN-10 or ISBN-13 strings.
+        Runs 3 queries, however many isbns.
+        '''
+        lookups = [(_, self._get_isbn_lookup(_)) for _ in isbns]
+        isbn10s = [lookup['isbn'] for text, lookup in lookups if 'isbn' in lookup]
+        isbn13s = [lookup['isbn13'] for text, lookup in lookups if 'isbn13' in lookup]
+        db_objs = models.Book.objects.filter(Q(isbn__in=isbn10s) | Q(isbn13__in=isbn13s))
+        by_isbn = {}
+        for book in db_objs:
+            by_isbn[book.isbn] = book
+            by_isbn[book.isbn13] = book
+
+        books, not_found, seen = [], [], set()
+        for text, lookup in lookups:
+            book = by_isbn.get(lookup.values()[0])
+            if book is None:
+                not_found.append(text)
+            elif book.isbn not in seen:
+                seen.add(book.isbn)
+                books.append(book)
+        return self._get_books_data(books, lib_branch_id=lib_branch_id), not_found
+
+    def _get_bulk_chunks(self, isbns, lib_branch_id, chunk_size):
+        for i in xrange(0, len(isbns), chunk_size):
+            yield self._get_bulk_data(isbns[i:i + chunk_size], lib_branch_id)
+
+    @staticmethod
+    def _stream_bulk(chunks):
+        '''Yields the bulk response json, one chunk of books at a time
+        '''
+        yield '{"books": ['
+        count = 0
+        not_found = []
+        for books_data, chunk_not_found in chunks:
+            for booki in books_data:
+                prefix = ', ' if count else ''
+                yield prefix + json.dumps(booki, cls=JSONEncoder)
+                count += 1
+            not_found.extend(chunk_not_found)
+        yield '], "not_found": {0}, "count": {1}}}'.format(json.dumps(not_found, cls=JSONEncoder), count)
+
+    @staticmethod
+    def _get_query_key(query, lib_branch_id, fuzzy=False):
+        key = u'{0}|{1}|{2}'.format(normalize(query), lib_branch_id, fuzzy)
+        return hashlib.md5(key.encode('utf-8')).hexdigest()[:8]
+
+    def _get_ranked(self, query, fuzzy=False):
+        '''Returns list of (isbn, score), best first
+        '''
+        # Searches against ISBN, Title, Author's name.
+        # this happens by default: query = query.replace('+', ' ')
+        # ISBN shaped query is a single indexed lookup, it never reaches the title, author scan
+        if self.iutils.is_isbn_shaped(query):
+            isbn_hits = models.Book.objects.filter(**self._get_isbn_lookup(query)).values_list('isbn', 'title')
+            return self.ranker.rank(query, [], [], isbn_hits=list(isbn_hits))
+        if fuzzy:
+            # needs the trigram index, until it is ready do the exact search
+            index = get_search_engine('index').get_index()
+            if index is not None:
+                return index.fuzzy_search(query)
+        title_hits, author_hits = get_search_engine().search(query)
+        return self.ranker.rank(query, title_hits, author_hits)
+
+    def _get_isbn_lookup(self, text):
+        '''Book filter for ISBN-10 or ISBN-13 text, with or without hyphens.
+        ISBN-13 with an ISBN-10 is looked up by primary key, others by isbn13.
+        '''
+        isbns = self.iutils.parse(text)
+        if isbns is None:
+            # check digit does not match, look for it as it is
+            isbn = self.iutils.clean(text)
+            if len(isbn) == 10:
+                return {'isbn': isbn}
+            return {'isbn13': isbn}
+        if isbns[0] is not None:
+            return {'isbn': isbns[0]}
+        return {'isbn13': isbns[1]}
+
+    @staticmethod
+    def _get_authors(isbns):
+        '''Returns {isbn: [author name, ...]}, from BookSearchDocument with one query
+        '''
+        authors = defaultdict(list)
+        if not isbns:
+            return authors
+        docs = models.BookSearchDocument.objects.filter(book_id__in=isbns)
+        for doc in docs.only('book_id', 'authors'):
+            authors[doc.book_id] = doc.get_authors()
+        missing = [_ for _ in isbns if _ not in authors]
+        if missing:
+            # document not built yet
+            book_author = models.BookAuthors.objects.filter(isbn_id__in=missing).order_by('id')
+            for isbn, name in book_author.values_list('isbn_id', 'author__name'):
+                authors[isbn].append(name)
+        return authors
+
+    @staticmethod
+    def _get_availability(isbns, lib_branch_id=0):
+        '''Returns {isbn: [BookCopy row, ...]}, with one query
+        '''
+        availability = defaultdict(list)
+        if isbns:
+            copy_filter = {'isbn_id__in': isbns}
+            if lib_branch_id:
+                copy_filter['lib_branch_id'] = lib_branch_id
+            book_copy = models.BookCopy.objects.filter(**copy_filter).order_by('id').values()
+            for copy in book_copy:
+                availability[copy['isbn_id']].append(copy)
+        return availability
+
+    @classmethod
+    def _get_books_data(cls, db_objs, lib_branch_id=0):
+        '''Builds response data for books.
+        Authors and copies for all the books are fetched with one query each,
+        and grouped by isbn in memory.
+        '''
+        db_objs = list(db_objs)
+        isbns = list(set(book.isbn for book in db_objs))
+        authors = cls._get_authors(isbns)
+        availability = cls._get_availability(isbns, lib_branch_id=lib_branch_id)
+
         books_data = []
         for book in db_objs:
             booki = {
                 'isbn': book.isbn,
                 'title': book.title,
-                'cover': book.cover
+                'cover': book.cover,
+                'authors': list(authors[book.isbn]),
+                'availability': list(availability[book.isbn]),
                 }
-            book_author = models.BookAuthors.objects.filter(isbn=book.isbn)
-            booki['authors'] = [_.author.name for _ in book_author]
             books_data.append(booki)
-            copy_filter = {'isbn': book.isbn}
-            if lib_branch_id:
-                copy_filter['lib_branch_id'] = lib_branch_id
-            book_copy = models.BookCopy.objects.filter(**copy_filter).values()
-            booki['availability'] = book_copy
+        return books_data
+
+    @classmethod
+    def _get_cached_books_data(cls, isbns, lib_branch_id=0):
+        '''Same as _get_books_data, for isbns.
+        Book data and availability come from search_cache, only the missing ones are fetched.
+        '''
+        books = search_cache.get_books(isbns)
+        missing = [_ for _ in isbns if _ not in books]
+        if missing:
+            db_objs = models.Book.objects.in_bulk(missing)
+            authors = cls._get_authors(missing)
+            for isbn, book in db_objs.iteritems():
+                books[isbn] = {
+                    'isbn': book.isbn,
+                    'title': book.title,
+                    'cover': book.cover,
+                    'authors': authors[isbn],
+                    }
+                search_cache.set_book(isbn, books[isbn])
+
+        availability = search_cache.get_availability(isbns, lib_branch_id=lib_branch_id)
+        missing = [_ for _ in isbns if _ not in availability]
+        if missing:
+            loaded = cls._get_availability(missing, lib_branch_id=lib_branch_id)
+            for isbn in missing:
+                availability[isbn] = loaded[isbn]
+                search_cache.set_availability(isbn, lib_branch_id, loaded[isbn])
+
+        books_data = []
+        for isbn in isbns:
+            if isbn not in books:
+                continue
+            booki = dict(books[isbn])
+            booki['authors'] = list(booki['authors'])
+            booki['availability'] = [dict(_) for _ in availability[isbn]]
+            books_data.append(booki)
         return books_data